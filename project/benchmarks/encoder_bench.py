@@ -0,0 +1,59 @@
+"""
+encoder_bench.py
+    - compares the JSON encoders available to encoder.py on payloads shaped like
+      the biggest route responses
+
+Usage:
+    python3 benchmarks/encoder_bench.py [repeats]
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'src')))
+
+import timeit
+from encoder    import ENCODERS, ENCODER
+
+def message(message_id):
+    return {
+        'message_id': message_id,
+        'u_id': message_id % 100,
+        'message': f"Message {message_id} about the quarterly report, see the shared drive",
+        'time_created': 1603000000 + message_id,
+        'reacts': [
+            {
+                'react_id': 1,
+                'u_ids': list(range(message_id % 5)),
+                'is_this_user_reacted': False,
+            }
+        ],
+        'is_pinned': message_id % 20 == 0,
+    }
+
+def user(u_id):
+    return {
+        'u_id': u_id,
+        'email': f"employee{u_id}@company.com",
+        'name_first': 'Firstname',
+        'name_last': f"Lastname{u_id}",
+        'handle_str': f"firstnamelastname{u_id}"[:20],
+        'profile_img_url': f"http://localhost:5000/profile_pictures/{u_id:032x}.jpg",
+    }
+
+# Shaped like channel_messages, users_all and search responses
+PAYLOADS = {
+    'channel_messages (50)': {'messages': [message(i) for i in range(50)], 'start': 0, 'end': 50},
+    'users_all (10k)': {'users': [user(i) for i in range(10000)]},
+    'search (2k)': {'messages': [message(i) for i in range(2000)]},
+}
+
+def main(repeats=5):
+    print(f"encoder in use: {ENCODER}")
+    print(f"{'payload':<24}{'encoder':<10}{'size (bytes)':>14}{'best (ms)':>12}")
+    for payload_name, payload in PAYLOADS.items():
+        for encoder_name, encode in ENCODERS.items():
+            timer = timeit.Timer(lambda: encode(payload))
+            number, _ = timer.autorange()
+            best = min(timer.repeat(repeat=repeats, number=number)) / number
+            print(f"{payload_name:<24}{encoder_name:<10}{len(encode(payload)):>14}{best * 1000:>12.3f}")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,584 @@
+"""
+implement_bench.py
+    - times each implement/ function on its own, called directly, against
+      generated workspaces (workspace.py) of increasing size, and reports how
+      each one's time grows with the number of users and with the number of
+      messages, so a function which scans every user or message shows up
+      before it is deployed rather than after
+
+Usage:
+    python3 benchmarks/implement_bench.py [--users N ...] [--messages N ...]
+        [--channels M] [--seconds S] [--limit L] [--only NAME ...]
+        [--save FILE] [--baseline FILE]
+
+    The users series loads a workspace for each of --users (1000 10000 100000
+    by default) with the first of --messages, the messages series one for each
+    of --messages (10000 1000000 by default) with the first of --users. Each
+    function is called for up to S seconds on each workspace and its median
+    time per call reported, with the exponent k of time ~ size ** k fitted
+    over the series: around 0 the function doesn't depend on the size, around
+    1 it goes through every user or message. A function which took more than
+    L seconds a call isn't called on the larger workspaces, it is reported
+    as over the limit
+
+    --save writes the exponents to a JSON file, --baseline compares them with
+    a saved file and exits with status 1 when a function's exponent has grown
+    by more than TOLERANCE, e.g. in CI against a file saved from main
+
+Helper Modules:
+    case: registers a function's benchmark in CASES
+    Bench: the loaded workspace the cases are set up in
+    measure: the median time of a call
+    exponent: the fitted exponent of a series of times
+    report: prints a series
+
+Main Modules:
+    CASES: the benchmark of each implement/ function, by function name
+    run: loads each workspace and times every case on it
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'src')))
+
+# Set before anything reads them, hashing isn't what is being measured
+os.environ.setdefault('FLOCKR_SCRYPT_N', '16')
+os.environ.setdefault('FLOCKR_KDF_WORKERS', '0')
+
+import io
+import json
+import math
+import time
+import argparse
+import statistics
+import contextlib
+from itertools              import count
+from types                  import SimpleNamespace
+from workspace              import generate, load
+from load_bench             import InProcess
+from data                   import data
+from versions               import bump
+from routes                 import ROUTES
+import implement.auth
+import implement.user
+import implement.standup
+from implement.auth         import auth_login, auth_logout, auth_register, auth_register_bulk, \
+                                   auth_passwordreset_request, auth_passwordreset_reset
+from implement.channel      import channel_invite, channel_invite_bulk, channel_details, channel_messages, \
+                                   channel_messages_since, channel_leave, channel_join, channel_addowner, \
+                                   channel_removeowner
+from implement.channels     import channels_list, channels_listall, channels_create
+from implement.message      import message_send, message_remove, message_edit, message_pin, message_unpin, \
+                                   message_react, message_unreact, message_sendlater, message_import_bulk
+from implement.other        import users_all, admin_userpermission_change, admin_check, search
+from implement.user         import user_profile, user_profile_setname, user_profile_setemail, \
+                                   user_profile_sethandle, user_profile_uploadphoto_status
+from implement.standup      import standup_start, standup_active, standup_send, get_timestamp
+
+# Calls of a case on each workspace, the case stops at MAX_CALLS or after --seconds
+MIN_CALLS = 1
+MAX_CALLS = 1000
+
+# Users or messages in each call to the bulk functions
+BULK = 10
+
+# An exponent at least this is reported as growing with the size
+GROWS = 0.5
+
+# In place of a time, for a case which raised or was too slow to be timed
+FAILED = 'failed'
+OVER_LIMIT = 'over limit'
+
+# How much an exponent can grow over the baseline before it is a regression
+TOLERANCE = 0.3
+
+# Functions which aren't timed, and why
+SKIPPED = {
+    'clear': "empties the workspace being measured",
+    'user_profile_uploadphoto': "fetches the image over the network, which doesn't depend on the workspace",
+    'user_profile_uploadphoto_async': "queues the same fetch for the photo workers",
+    'batch': "runs other routes, which are measured on their own",
+}
+
+CASES = {}
+
+def case(function):
+    '''
+    Registers a benchmark, a context manager which sets up on a Bench and
+    yields (call, undo): call is timed, undo (or None) runs untimed after
+    each call to put the workspace back as it was
+    '''
+    def register(setup):
+        CASES[function] = contextlib.contextmanager(setup)
+        return setup
+    return register
+
+class Bench:
+    '''
+    Bench
+
+    Args:
+        workspace: from generate
+        context: what load returned for it
+    '''
+    def __init__(self, workspace, context):
+        self.workspace = workspace
+        self.tokens = context['tokens']
+        self.u_ids = context['u_ids']
+        self.channel_ids = context['channel_ids']
+        self.unique = count()
+
+        # User 0 owns the workspace and is in every channel, channel 0 has
+        # every user and the most messages
+        self.owner = self.tokens[0]
+        self.member = 1
+        self.general = self.channel_ids[0]
+
+        # A non-owner member of the largest public channel, and users who
+        # aren't in the smallest channel
+        channels = workspace['channels']
+        public = next((index for index, channel in enumerate(channels) if channel['is_public']), 0)
+        self.public = self.channel_ids[public]
+        self.public_member = channels[public]['members'][1]
+        members = set(channels[-1]['members'])
+        self.small = self.channel_ids[-1]
+        self.outsiders = [user for user in range(len(self.tokens)) if user not in members][:BULK + 1]
+
+    def email(self, user):
+        return self.workspace['users'][user]['email']
+
+    def password(self, user):
+        return self.workspace['users'][user]['password']
+
+    def channel(self, channel_id):
+        return next(channel for channel in data['channels'] if channel['channel_id'] == channel_id)
+
+    def new_user(self):
+        number = next(self.unique)
+        return {
+            'email': f"bench{number}@implement.com",
+            'password': 'password123',
+            'name_first': 'Bench',
+            'name_last': f"Number{number}",
+        }
+
+def forget_users(number):
+    # No route removes a user, so the ones a case registered are dropped from data
+    del data['users'][-number:]
+    bump('users')
+
+@case('auth_login')
+def auth_login_case(bench):
+    email, password = bench.email(1), bench.password(1)
+    yield lambda: auth_login(email, password), None
+
+@case('auth_logout')
+def auth_logout_case(bench):
+    yield lambda: auth_logout(bench.owner), None
+
+@case('auth_register')
+def auth_register_case(bench):
+    def call():
+        user = bench.new_user()
+        auth_register(user['email'], user['password'], user['name_first'], user['name_last'])
+    yield call, lambda: forget_users(1)
+
+@case('auth_register_bulk')
+def auth_register_bulk_case(bench):
+    yield (lambda: auth_register_bulk(bench.owner, [bench.new_user() for _ in range(BULK)]),
+           lambda: forget_users(BULK))
+
+@case('auth_passwordreset_request')
+def auth_passwordreset_request_case(bench):
+    # The emails would be queued to be sent to the SMTP server, they are dropped instead
+    outbox = implement.auth.outbox
+    implement.auth.outbox = SimpleNamespace(send=lambda receiver, message: None)
+    try:
+        email = bench.email(2)
+        yield lambda: auth_passwordreset_request(email), None
+    finally:
+        implement.auth.outbox = outbox
+
+@case('auth_passwordreset_reset')
+def auth_passwordreset_reset_case(bench):
+    code = implement.auth.reset_codes.sign({'email': bench.email(2)})
+    yield lambda: auth_passwordreset_reset(code, bench.password(2)), None
+
+@case('channel_invite')
+def channel_invite_case(bench):
+    user = bench.outsiders[0]
+    yield (lambda: channel_invite(bench.owner, bench.small, bench.u_ids[user]),
+           lambda: channel_leave(bench.tokens[user], bench.small))
+
+@case('channel_invite_bulk')
+def channel_invite_bulk_case(bench):
+    users = bench.outsiders[1:]
+    def undo():
+        for user in users:
+            channel_leave(bench.tokens[user], bench.small)
+    yield lambda: channel_invite_bulk(bench.owner, bench.small, [bench.u_ids[user] for user in users]), undo
+
+@case('channel_details')
+def channel_details_case(bench):
+    yield lambda: channel_details(bench.owner, bench.general), None
+
+@case('channel_messages')
+def channel_messages_case(bench):
+    yield lambda: channel_messages(bench.owner, bench.general, 0), None
+
+@case('channel_messages_since')
+def channel_messages_since_case(bench):
+    # A client which has seen all but the last page of messages
+    messages = bench.channel(bench.general)['messages']
+    seen = messages[max(0, len(messages) - 50)]['message_id']
+    yield lambda: channel_messages_since(bench.owner, bench.general, seen, 0), None
+
+@case('channel_leave')
+def channel_leave_case(bench):
+    token = bench.tokens[bench.public_member]
+    yield lambda: channel_leave(token, bench.public), lambda: channel_join(token, bench.public)
+
+@case('channel_join')
+def channel_join_case(bench):
+    token = bench.tokens[bench.public_member]
+    channel_leave(token, bench.public)
+    try:
+        yield lambda: channel_join(token, bench.public), lambda: channel_leave(token, bench.public)
+    finally:
+        channel_join(token, bench.public)
+
+@case('channel_addowner')
+def channel_addowner_case(bench):
+    u_id = bench.u_ids[bench.member]
+    yield (lambda: channel_addowner(bench.owner, bench.general, u_id),
+           lambda: channel_removeowner(bench.owner, bench.general, u_id))
+
+@case('channel_removeowner')
+def channel_removeowner_case(bench):
+    u_id = bench.u_ids[bench.member]
+    channel_addowner(bench.owner, bench.general, u_id)
+    try:
+        yield (lambda: channel_removeowner(bench.owner, bench.general, u_id),
+               lambda: channel_addowner(bench.owner, bench.general, u_id))
+    finally:
+        channel_removeowner(bench.owner, bench.general, u_id)
+
+@case('channels_list')
+def channels_list_case(bench):
+    yield lambda: channels_list(bench.owner), None
+
+@case('channels_listall')
+def channels_listall_case(bench):
+    yield lambda: channels_listall(bench.owner), None
+
+@case('channels_create')
+def channels_create_case(bench):
+    def undo():
+        # No route removes a channel, so the one created is dropped from data
+        data['channels'].pop()
+        bump('channels')
+    yield lambda: channels_create(bench.owner, 'bench', True), undo
+
+@case('message_send')
+def message_send_case(bench):
+    channel = bench.channel(bench.general)
+    def undo():
+        # Dropped from data rather than with message_remove, so this is only message_send's time
+        channel['messages'].pop()
+        bump('channels', 'messages')
+    yield lambda: message_send(bench.owner, bench.general, 'deploy the release'), undo
+
+@case('message_remove')
+def message_remove_case(bench):
+    sent = [message_send(bench.owner, bench.general, 'deploy the release')['message_id']]
+    yield (lambda: message_remove(bench.owner, sent.pop()),
+           lambda: sent.append(message_send(bench.owner, bench.general, 'deploy the release')['message_id']))
+    for message_id in sent:
+        message_remove(bench.owner, message_id)
+
+@case('message_edit')
+def message_edit_case(bench):
+    message_id = bench.channel(bench.general)['messages'][-1]['message_id']
+    yield lambda: message_edit(bench.owner, message_id, 'review the roadmap'), None
+
+@case('message_pin')
+def message_pin_case(bench):
+    message_id = bench.channel(bench.general)['messages'][-1]['message_id']
+    yield lambda: message_pin(bench.owner, message_id), lambda: message_unpin(bench.owner, message_id)
+
+@case('message_unpin')
+def message_unpin_case(bench):
+    message_id = bench.channel(bench.general)['messages'][-1]['message_id']
+    message_pin(bench.owner, message_id)
+    try:
+        yield lambda: message_unpin(bench.owner, message_id), lambda: message_pin(bench.owner, message_id)
+    finally:
+        message_unpin(bench.owner, message_id)
+
+@case('message_react')
+def message_react_case(bench):
+    message_id = bench.channel(bench.general)['messages'][-1]['message_id']
+    yield lambda: message_react(bench.owner, message_id, 1), lambda: message_unreact(bench.owner, message_id, 1)
+
+@case('message_unreact')
+def message_unreact_case(bench):
+    message_id = bench.channel(bench.general)['messages'][-1]['message_id']
+    message_react(bench.owner, message_id, 1)
+    try:
+        yield lambda: message_unreact(bench.owner, message_id, 1), lambda: message_react(bench.owner, message_id, 1)
+    finally:
+        message_unreact(bench.owner, message_id, 1)
+
+@case('message_sendlater')
+def message_sendlater_case(bench):
+    # Sent a second later by their timers, which is after this case has finished
+    yield lambda: message_sendlater(bench.owner, bench.general, 'deploy the release', get_timestamp(1)), None
+
+@case('message_import_bulk')
+def message_import_bulk_case(bench):
+    channel = bench.channel(bench.general)
+    def undo():
+        # They are the newest, so at the end of the channel
+        del channel['messages'][-BULK:]
+        bump('channels', 'messages')
+    yield lambda: message_import_bulk(bench.owner, [{
+        'channel_id': bench.general,
+        'u_id': bench.u_ids[0],
+        'message': 'deploy the release',
+        'time_created': int(time.time()),
+    } for _ in range(BULK)]), undo
+
+@case('user_profile')
+def user_profile_case(bench):
+    yield lambda: user_profile(bench.owner, bench.u_ids[bench.member]), None
+
+@case('user_profile_setname')
+def user_profile_setname_case(bench):
+    yield lambda: user_profile_setname(bench.owner, 'User', 'Number0'), None
+
+@case('user_profile_setemail')
+def user_profile_setemail_case(bench):
+    yield lambda: user_profile_setemail(bench.owner, f"bench{next(bench.unique)}@implement.com"), None
+    user_profile_setemail(bench.owner, bench.email(0))
+
+@case('user_profile_sethandle')
+def user_profile_sethandle_case(bench):
+    yield lambda: user_profile_sethandle(bench.owner, f"bench{next(bench.unique)}"), None
+
+@case('user_profile_uploadphoto_status')
+def user_profile_uploadphoto_status_case(bench):
+    # A finished job, without fetching a photo for it
+    job_id = next(implement.user.photo_job_ids)
+    with implement.user.photo_jobs_lock:
+        implement.user.photo_jobs[job_id] = {'job_id': job_id, 'u_id': bench.u_ids[0], 'status': 'done', 'error': None}
+    try:
+        yield lambda: user_profile_uploadphoto_status(bench.owner, job_id), None
+    finally:
+        with implement.user.photo_jobs_lock:
+            del implement.user.photo_jobs[job_id]
+
+@case('users_all')
+def users_all_case(bench):
+    yield lambda: users_all(bench.owner), None
+
+@case('admin_userpermission_change')
+def admin_userpermission_change_case(bench):
+    yield lambda: admin_userpermission_change(bench.owner, bench.u_ids[bench.member], 2), None
+
+@case('admin_check')
+def admin_check_case(bench):
+    yield lambda: admin_check(bench.owner), None
+
+@case('search')
+def search_case(bench):
+    yield lambda: search(bench.owner, 'deploy'), None
+
+@case('standup_start')
+def standup_start_case(bench):
+    channel = bench.channel(bench.general)
+    def undo():
+        # The standup's thread ends it straight away as well, this doesn't wait for it
+        channel['time_finish'] = None
+    yield lambda: standup_start(bench.owner, bench.general, 0), undo
+
+@case('standup_active')
+def standup_active_case(bench):
+    yield lambda: standup_active(bench.owner, bench.general), None
+
+@case('standup_send')
+def standup_send_case(bench):
+    # An active standup, without a thread waiting to send it
+    channel = bench.channel(bench.general)
+    channel['time_finish'] = get_timestamp(3600)
+    try:
+        yield lambda: standup_send(bench.owner, bench.general, 'deploy the release'), None
+    finally:
+        channel['time_finish'] = None
+        implement.standup.standup.reset_standup_queue()
+
+def measure(setup, seconds):
+    '''
+    measure
+
+    Args:
+        setup: a case from CASES, set up on a Bench
+        seconds: how long to keep calling for, after MIN_CALLS
+
+    Returns:
+        the median seconds per call
+    '''
+    times = []
+    with setup as (call, undo):
+        end = time.perf_counter() + seconds
+        while len(times) < MIN_CALLS or (len(times) < MAX_CALLS and time.perf_counter() < end):
+            start = time.perf_counter()
+            call()
+            times.append(time.perf_counter() - start)
+            if undo is not None:
+                undo()
+    return statistics.median(times)
+
+def exponent(sizes, times):
+    '''
+    Returns:
+        k from a least squares fit of log(time) = k * log(size) + c
+    '''
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(seconds, 1e-9)) for seconds in times]
+    mean_x, mean_y = statistics.mean(xs), statistics.mean(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+
+def duration(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.2f}s"
+
+def run(datasets, channels, seconds, limit, names):
+    '''
+    run
+
+    Args:
+        datasets: (users, messages) of each workspace
+        channels: channels in each workspace
+        seconds: how long each case is timed for on each workspace
+        limit: a case slower than this (in seconds a call) isn't timed on
+            workspaces with at least as many users and messages
+        names: the cases to time
+
+    Returns:
+        {(users, messages): {name: median seconds per call}}, or FAILED when
+        the case raised and OVER_LIMIT when it wasn't timed
+    '''
+    driver = InProcess()
+    results = {}
+    # The workspaces each case was too slow on
+    slow = {name: [] for name in names}
+    for users, messages in datasets:
+        start = time.perf_counter()
+        workspace = generate(users, channels, messages)
+        bench = Bench(workspace, load(workspace, driver.call))
+        print(f"{users} users, {channels} channels, {messages} messages loaded in "
+              f"{time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        timings = results[users, messages] = {}
+        for name in names:
+            if any(users >= smaller[0] and messages >= smaller[1] for smaller in slow[name]):
+                timings[name] = OVER_LIMIT
+                continue
+            try:
+                # standup_send prints every message it is sent
+                with contextlib.redirect_stdout(io.StringIO()):
+                    timings[name] = measure(CASES[name](bench), seconds)
+            except Exception as err:
+                print(f"{name} failed: {type(err).__name__}: {err}", file=sys.stderr)
+                timings[name] = FAILED
+                continue
+            if timings[name] > limit:
+                slow[name].append((users, messages))
+    return results
+
+def report(title, sizes, timings, names):
+    '''
+    Prints each function's time at each size and its exponent
+
+    Returns:
+        {name: exponent} of the functions timed on at least two sizes
+    '''
+    print(title)
+    print(f"{'function':<34}" + ''.join(f"{size:>12}" for size in sizes) + f"{'exponent':>10}")
+    exponents = {}
+    for name in names:
+        times = [timing[name] for timing in timings]
+        line = f"{name:<34}" + ''.join(f"{seconds if isinstance(seconds, str) else duration(seconds):>12}"
+                                       for seconds in times)
+        timed = [(size, seconds) for size, seconds in zip(sizes, times) if not isinstance(seconds, str)]
+        if len(timed) >= 2:
+            exponents[name] = exponent(*zip(*timed))
+            line += f"{exponents[name]:>10.2f}"
+        if exponents.get(name, 0) >= GROWS or OVER_LIMIT in times:
+            line += ' *'
+        print(line)
+    print()
+    return exponents
+
+def main():
+    parser = argparse.ArgumentParser(description="Times every implement/ function on workspaces of increasing size")
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--messages', type=int, nargs='+', default=[10000, 1000000])
+    parser.add_argument('--channels', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=0.5, help="how long each function is timed for on each workspace")
+    parser.add_argument('--limit', type=float, default=1, help="seconds a call after which a function isn't timed on larger workspaces")
+    parser.add_argument('--only', nargs='+', help="only time these functions")
+    parser.add_argument('--save', help="write the exponents to this file")
+    parser.add_argument('--baseline', help="compare the exponents with this file")
+    args = parser.parse_args()
+
+    # Every route's function is either timed or skipped for a reason
+    functions = {function for _, function, _, _ in ROUTES.values()} | {'admin_check'}
+    missing = functions - set(CASES) - set(SKIPPED)
+    if missing:
+        parser.error(f"no benchmark for {', '.join(sorted(missing))}")
+    names = args.only or sorted(CASES)
+    unknown = set(names) - set(CASES)
+    if unknown:
+        parser.error(f"unknown functions {', '.join(sorted(unknown))}")
+
+    datasets = list(dict.fromkeys([(users, args.messages[0]) for users in args.users] +
+                                  [(args.users[0], messages) for messages in args.messages]))
+    results = run(datasets, args.channels, args.seconds, args.limit, names)
+
+    exponents = {}
+    for series, sizes, keys in (
+        ('users', args.users, [(users, args.messages[0]) for users in args.users]),
+        ('messages', args.messages, [(args.users[0], messages) for messages in args.messages]),
+    ):
+        if len(sizes) < 2:
+            continue
+        other = f"{args.messages[0]} messages" if series == 'users' else f"{args.users[0]} users"
+        exponents[series] = report(f"By {series} ({other}, {args.channels} channels), median time per call",
+                                   sizes, [results[key] for key in keys], names)
+    print(f"* time grows at least as fast as the size ** {GROWS}, or went over the limit")
+    for name, reason in SKIPPED.items():
+        print(f"{name} isn't timed: {reason}")
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(exponents, file, indent=4, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = [
+            f"{name} by {series}: exponent {baseline[series][name]:.2f} -> {value:.2f}"
+            for series, values in exponents.items()
+            for name, value in values.items()
+            if name in baseline.get(series, {}) and value > baseline[series][name] + TOLERANCE
+        ]
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+load_bench.py
+    - generates a workspace (workspace.py), loads it, then replays a mix of
+      the calls clients make most (sending, listing channels, reading
+      messages and searching) from several threads, and reports each route's
+      throughput and p50/p99 latency, failed calls included. It exits with an
+      error when more than MAX_ERROR_RATE of a route's calls failed, since
+      then it measured something other than the route
+
+Usage:
+    python3 benchmarks/load_bench.py [--users N] [--channels M] [--messages K]
+        [--seconds S] [--threads T] [--http | --url URL] [--workers W]
+
+    By default the calls run in this process through routes.py, which
+    measures implement/ on its own. --http starts src/server.py (or
+    src/serve.py with --workers) and sends the calls over HTTP, --url sends
+    them to a server which is already running. A server started here has
+    its rate limits turned off and a low password hashing cost, since the
+    load comes from one address and hashing isn't what is being measured
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'src')))
+
+# Set before anything reads them, for the in process run
+os.environ.setdefault('FLOCKR_SCRYPT_N', '16')
+os.environ.setdefault('FLOCKR_KDF_WORKERS', '0')
+
+import re
+import math
+import time
+import random
+import argparse
+import threading
+import subprocess
+from itertools      import accumulate
+from collections    import defaultdict
+from workspace      import generate, load, sentence
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+# How often each call is made, roughly how often a client makes them.
+# Reacting isn't here: message_react only finds messages in the last channel
+# created, so almost every react would fail
+MIX = {
+    'send': 20,
+    'list': 15,
+    'messages': 55,
+    'search': 10,
+}
+
+# The most of a route's calls which can fail before the run is an error
+MAX_ERROR_RATE = 0.01
+
+class CallFailed(Exception):
+    def __init__(self, path, message):
+        super().__init__(f"{path}: {message}")
+        self.path = path
+        self.message = message
+
+class InProcess:
+    '''
+    Runs routes through routes.py, as batch.py does, without HTTP or Flask
+    '''
+    def __init__(self):
+        import routes
+        from werkzeug.exceptions import HTTPException
+        self.routes = routes
+        self.errors = (HTTPException,)
+
+    def call(self, method, path, params):
+        try:
+            return self.routes.call_route(self.routes.find_route(method, path), params, 'localhost')
+        except self.errors as err:
+            raise CallFailed(path, f"{err.code} {err.description}")
+
+class OverHttp:
+    '''
+    Sends routes to a server, with a connection kept open for each thread
+    '''
+    def __init__(self, url):
+        import requests
+        self.url = url.rstrip('/')
+        self.requests = requests
+        self.local = threading.local()
+
+    def call(self, method, path, params):
+        if not hasattr(self.local, 'session'):
+            self.local.session = self.requests.Session()
+        if method in ('GET', 'DELETE'):
+            response = self.local.session.request(method, self.url + path, params=params)
+        else:
+            response = self.local.session.request(method, self.url + path, json=params)
+        if response.status_code != 200:
+            raise CallFailed(path, f"{response.status_code} {response.text[:200]}")
+        return response.json()
+
+def start_server(workers):
+    env = dict(os.environ, FLOCKR_RATE_LIMIT='0', FLOCKR_IP_RATE_LIMIT='0', FLOCKR_MAX_CONCURRENT='0')
+    command = [sys.executable, 'src/serve.py', '0', str(workers)] if workers else [sys.executable, 'src/server.py']
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    # Same as the url fixture in the http tests
+    url = re.search(r' \* Running on ([^ ]*)', server.stderr.readline().decode())
+    if not url:
+        server.kill()
+        raise Exception("Couldn't get URL from local server")
+    # Flask keeps logging each request, which would block the server once the pipe filled
+    threading.Thread(target=server.stderr.read, daemon=True).start()
+    return server, url.group(1)
+
+def percentile(latencies, fraction):
+    ordered = sorted(latencies)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+class Client:
+    '''
+    One user of the workspace, making calls from MIX in the channels they are in
+
+    Args:
+        driver: InProcess or OverHttp
+        context: what workspace.load returned
+        user: the user's index
+        generator: random.Random for this thread
+    '''
+    def __init__(self, driver, context, user, generator):
+        self.driver = driver
+        self.token = context['tokens'][user]
+        self.channel_ids = context['memberships'][user]
+        self.generator = generator
+        # search refuses a user who isn't in every channel, the workspace's
+        # first user is in all of them, which is also the slowest search
+        self.search_token = context['tokens'][0]
+
+    def channel(self):
+        return self.generator.choice(self.channel_ids)
+
+    def send(self):
+        self.driver.call('POST', '/message/send', {
+            'token': self.token,
+            'channel_id': self.channel(),
+            'message': sentence(self.generator, self.generator.randint(3, 12)),
+        })
+        return '/message/send'
+
+    def list(self):
+        self.driver.call('GET', '/channels/list', {'token': self.token})
+        return '/channels/list'
+
+    def messages(self):
+        self.driver.call('GET', '/channel/messages', {
+            'token': self.token,
+            'channel_id': self.channel(),
+            'start': 0,
+        })
+        return '/channel/messages'
+
+    def search(self):
+        self.driver.call('GET', '/search', {'token': self.search_token, 'query_str': sentence(self.generator, 1)})
+        return '/search'
+
+def run(driver, context, workspace, seconds, threads, seed=0):
+    '''
+    Returns:
+        {route: {'latencies': [...], 'errors': n, 'first_error': message}},
+        latencies including the failed calls, and how long the run took
+    '''
+    users = range(len(workspace['users']))
+    activity = list(accumulate(user['activity'] for user in workspace['users']))
+    calls, weights = zip(*MIX.items())
+
+    results = defaultdict(lambda: {'latencies': [], 'errors': 0, 'first_error': None})
+    lock = threading.Lock()
+    end = time.perf_counter() + seconds
+
+    def worker(thread):
+        generator = random.Random(seed + thread)
+        # Active users make more calls
+        clients = {}
+        latencies = defaultdict(list)
+        errors = defaultdict(list)
+        while time.perf_counter() < end:
+            user = generator.choices(users, cum_weights=activity)[0]
+            if user not in clients:
+                clients[user] = Client(driver, context, user, generator)
+            call = getattr(clients[user], generator.choices(calls, weights=weights)[0])
+
+            start = time.perf_counter()
+            try:
+                path = call()
+            except CallFailed as err:
+                path = err.path
+                errors[path].append(err.message)
+            latencies[path].append(time.perf_counter() - start)
+
+        with lock:
+            for path, values in latencies.items():
+                results[path]['latencies'].extend(values)
+            for path, messages in errors.items():
+                results[path]['errors'] += len(messages)
+                if results[path]['first_error'] is None:
+                    results[path]['first_error'] = messages[0]
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(thread,)) for thread in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return results, time.perf_counter() - started
+
+def report(results, elapsed):
+    '''
+    Prints each route's results and the first error of each route which had any
+
+    Returns:
+        the routes with more than MAX_ERROR_RATE of their calls failed
+    '''
+    print(f"{'route':<20}{'calls':>8}{'errors':>8}{'rps':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+    total = 0
+    for path, result in sorted(results.items()):
+        latencies = result['latencies']
+        total += len(latencies)
+        p50 = f"{percentile(latencies, 0.5) * 1000:.2f}" if latencies else '-'
+        p99 = f"{percentile(latencies, 0.99) * 1000:.2f}" if latencies else '-'
+        print(f"{path:<20}{len(latencies):>8}{result['errors']:>8}{len(latencies) / elapsed:>10.1f}{p50:>10}{p99:>10}")
+    print(f"{'total':<20}{total:>8}{'':>8}{total / elapsed:>10.1f}")
+
+    failing = []
+    for path, result in sorted(results.items()):
+        if result['errors']:
+            print(f"{path} first error: {result['first_error']}")
+            if result['errors'] > MAX_ERROR_RATE * len(result['latencies']):
+                failing.append(path)
+    return failing
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays a mix of calls against a generated workspace")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--channels', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--http', action='store_true', help="start a server and send the calls over HTTP")
+    parser.add_argument('--workers', type=int, default=0, help="with --http, start serve.py with this many workers")
+    parser.add_argument('--url', help="send the calls to this server")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        driver, where = OverHttp(args.url), args.url
+    elif args.http:
+        server, url = start_server(args.workers)
+        driver, where = OverHttp(url), url
+    else:
+        driver, where = InProcess(), 'in process'
+
+    try:
+        workspace = generate(args.users, args.channels, args.messages, seed=args.seed)
+        start = time.perf_counter()
+        context = load(workspace, driver.call)
+        print(f"{args.users} users, {args.channels} channels, {args.messages} messages "
+              f"loaded in {time.perf_counter() - start:.1f}s ({where})")
+        print(f"{args.threads} threads for {args.seconds}s")
+
+        results, elapsed = run(driver, context, workspace, args.seconds, args.threads, args.seed)
+        failing = report(results, elapsed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if failing:
+        sys.exit(f"More than {MAX_ERROR_RATE:.0%} of the calls failed for {', '.join(failing)}")
+
+if __name__ == "__main__":
+    main()
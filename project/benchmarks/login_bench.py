@@ -0,0 +1,82 @@
+"""
+login_bench.py
+    - measures how many logins a second auth_login handles for each key
+      derivation function and number of KDF workers, with several threads
+      logging in at once like the server's request threads
+
+Usage:
+    python3 benchmarks/login_bench.py [seconds]
+
+    The cost of each function is read from the environment like the server
+    does, e.g. FLOCKR_SCRYPT_N=32768 python3 benchmarks/login_bench.py
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'src')))
+
+import time
+import threading
+import passwords
+import implement.auth
+from data               import data
+from passwords          import legacy_hash
+from implement.auth     import auth_register, auth_login
+from implement.other    import clear
+
+USERS = 50
+THREADS = 8
+
+def setup(kdf):
+    clear()
+    passwords.KDF = 'scrypt' if kdf == 'legacy' else kdf
+    for i in range(USERS):
+        auth_register(f"user{i}@company.com", 'password123', 'First', f"Last{i}")
+    if kdf == 'legacy':
+        for user in data['users']:
+            user['password'] = legacy_hash('password123')
+
+def logins(seconds):
+    count = [0] * THREADS
+    end = time.perf_counter() + seconds
+
+    def login(thread):
+        i = thread
+        while time.perf_counter() < end:
+            auth_login(f"user{i % USERS}@company.com", 'password123')
+            count[thread] += 1
+            i += THREADS
+
+    threads = [threading.Thread(target=login, args=(thread,)) for thread in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(count) / (time.perf_counter() - start)
+
+def main(seconds=3):
+    cpus = os.cpu_count() or 1
+    print(f"{cpus} cpus, {THREADS} threads logging in")
+    print(f"{'kdf':<10}{'workers':>8}{'logins/s':>12}{'logins/s/core':>15}")
+
+    # Legacy hashes would be replaced by the first login
+    rehash = implement.auth.needs_rehash
+    for kdf in ('legacy', 'pbkdf2', 'scrypt'):
+        for workers in sorted({0, 1, cpus}):
+            if kdf == 'legacy' and workers:
+                continue
+            passwords.KDF_WORKERS = workers
+            passwords.pool = None
+            setup(kdf)
+            implement.auth.needs_rehash = (lambda stored: False) if kdf == 'legacy' else rehash
+
+            # Started before timing, so the pool's start up isn't counted
+            passwords.hash_password('warmup')
+            rate = logins(seconds)
+            print(f"{kdf:<10}{workers:>8}{rate:>12.1f}{rate / max(1, min(workers, cpus)):>15.1f}")
+
+            if passwords.pool is not None:
+                passwords.pool.shutdown()
+    implement.auth.needs_rehash = rehash
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,51 @@
+"""
+token_bench.py
+    - compares signing and verifying session tokens with PyJWT and with
+      tokens.py, the first verify of a token and a remembered one
+
+Usage:
+    python3 benchmarks/token_bench.py [repeats]
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'src')))
+
+import timeit
+import itertools
+import jwt
+from tokens     import TokenSigner
+
+SECRET = 'shenpai'
+
+def cases():
+    signer = TokenSigner(SECRET)
+    token = signer.sign({'u_id': 12345})
+    u_ids = itertools.count()
+
+    def verify_first():
+        # Forgotten each time, so the signature is checked
+        signer.verified.clear()
+        signer.verify(token)
+
+    return {
+        'sign': {
+            'pyjwt': lambda: jwt.encode({'u_id': next(u_ids)}, SECRET, algorithm='HS256').decode(),
+            'tokens': lambda: signer.sign({'u_id': next(u_ids)}),
+        },
+        'verify': {
+            'pyjwt': lambda: jwt.decode(token.encode(), SECRET, algorithms=['HS256']),
+            'tokens': verify_first,
+            'tokens (remembered)': lambda: signer.verify(token),
+        },
+    }
+
+def main(repeats=5):
+    print(f"{'operation':<10}{'implementation':<22}{'best (us)':>12}{'per second':>14}")
+    for operation, implementations in cases().items():
+        for name, function in implementations.items():
+            timer = timeit.Timer(function)
+            number, _ = timer.autorange()
+            best = min(timer.repeat(repeat=repeats, number=number)) / number
+            print(f"{operation:<10}{name:<22}{best * 1e6:>12.2f}{1 / best:>14.0f}")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
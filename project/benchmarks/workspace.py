@@ -0,0 +1,197 @@
+"""
+workspace.py
+    - generates a synthetic workspace for load_bench.py and loads it through
+      the bulk routes. Like a real workspace a few channels have most of the
+      members and messages, and a few users send most of the messages: channel
+      sizes, message volume and user activity follow a power law
+
+Usage:
+    python3 benchmarks/workspace.py [users] [channels] [messages]
+        prints how the generated workspace is distributed
+
+Helper Modules:
+    zipf_weights: power law weights for ranks 1 to n
+    sentence: a random message or search query from VOCABULARY
+
+Main Modules:
+    generate: the users, channels (with their members) and messages of a workspace
+    load: registers, creates, invites and imports a workspace through a call function
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'src')))
+
+import heapq
+import random
+import time
+from itertools  import accumulate
+
+VOCABULARY = (
+    'deploy', 'review', 'meeting', 'lunch', 'report', 'release', 'bug', 'fix',
+    'standup', 'design', 'customer', 'invoice', 'budget', 'roadmap', 'sprint',
+    'test', 'server', 'database', 'latency', 'coffee', 'weekend', 'holiday',
+    'launch', 'metrics', 'dashboard', 'incident', 'ticket', 'merge', 'branch',
+    'docs', 'onboarding', 'hiring', 'quarterly', 'planning', 'feedback',
+)
+
+# Registered, invited and imported this many at a time
+USERS_PER_REQUEST = 1000
+MESSAGES_PER_REQUEST = 10000
+
+# Imported messages are spread over this many seconds before now
+HISTORY = 30 * 24 * 60 * 60
+
+def zipf_weights(n, exponent):
+    return [1 / rank ** exponent for rank in range(1, n + 1)]
+
+def sentence(generator, words):
+    return ' '.join(generator.choice(VOCABULARY) for _ in range(words))
+
+def generate(users=1000, channels=50, messages=20000, exponent=1.1, seed=0):
+    '''
+    generate
+
+    Args:
+        users, channels, messages: the size of the workspace
+        exponent: of the power law, higher gives more skewed workspaces
+        seed: the same seed generates the same workspace
+
+    Returns:
+        users: a list of {'email', 'password', 'name_first', 'name_last', 'activity'}
+        channels: a list of {'name', 'is_public', 'members'}, members being
+            indexes into users, the first user is in every channel
+        messages: a list of {'channel', 'user', 'message', 'time_created'} by
+            index, oldest first
+    '''
+    generator = random.Random(seed)
+
+    # A user's activity decides how many channels they are in and how much they send
+    activity = zipf_weights(users, exponent)
+    generator.shuffle(activity)
+    workspace_users = [{
+        'email': f"user{i}@workspace.com",
+        'password': f"password{i}",
+        'name_first': 'User',
+        'name_last': f"Number{i}",
+        'activity': activity[i],
+    } for i in range(users)]
+
+    # The first channel has everyone, the rest fewer the lower they rank
+    channel_weights = zipf_weights(channels, exponent)
+    workspace_channels = []
+    for rank, weight in enumerate(channel_weights):
+        size = max(2, min(users, round(users * weight)))
+        # Weighted sampling without replacement, more active users are more likely to be members
+        members = set(heapq.nlargest(size - 1, range(1, users),
+                                     key=lambda user: generator.random() ** (1 / activity[user])))
+        members.add(0)
+        workspace_channels.append({
+            'name': f"channel{rank}"[:20],
+            'is_public': generator.random() < 0.8,
+            'members': sorted(members),
+        })
+
+    # Messages go to channels by rank, and are sent by their more active members
+    now = int(time.time())
+    senders = [list(accumulate(activity[member] for member in channel['members']))
+               for channel in workspace_channels]
+    workspace_messages = []
+    for channel in generator.choices(range(channels), weights=channel_weights, k=messages):
+        members = workspace_channels[channel]['members']
+        workspace_messages.append({
+            'channel': channel,
+            'user': generator.choices(members, cum_weights=senders[channel])[0],
+            'message': sentence(generator, generator.randint(3, 12)),
+            'time_created': now - generator.randint(1, HISTORY),
+        })
+    workspace_messages.sort(key=lambda message: message['time_created'])
+
+    return {
+        'users': workspace_users,
+        'channels': workspace_channels,
+        'messages': workspace_messages,
+    }
+
+def load(workspace, call):
+    '''
+    load
+
+    Args:
+        workspace: from generate
+        call: call(method, path, params) runs a route and returns its result,
+            raising an exception when the route fails
+
+    Returns:
+        tokens and u_ids: of each user, by index
+        channel_ids: of each channel, by index
+        memberships: the channel_ids of each user's channels, by index
+    '''
+    call('DELETE', '/clear', {})
+
+    users = workspace['users']
+    owner = call('POST', '/auth/register', {
+        key: users[0][key] for key in ('email', 'password', 'name_first', 'name_last')
+    })
+    tokens, u_ids = [owner['token']], [owner['u_id']]
+    for start in range(1, len(users), USERS_PER_REQUEST):
+        registered = call('POST', '/auth/register/bulk', {
+            'token': owner['token'],
+            'users': [{key: user[key] for key in ('email', 'password', 'name_first', 'name_last')}
+                      for user in users[start:start + USERS_PER_REQUEST]],
+        })['users']
+        tokens.extend(user['token'] for user in registered)
+        u_ids.extend(user['u_id'] for user in registered)
+
+    channel_ids = []
+    memberships = [[] for _ in users]
+    for channel in workspace['channels']:
+        channel_id = call('POST', '/channels/create', {
+            'token': owner['token'],
+            'name': channel['name'],
+            'is_public': channel['is_public'],
+        })['channel_id']
+        channel_ids.append(channel_id)
+
+        invited = [u_ids[member] for member in channel['members'] if member != 0]
+        for start in range(0, len(invited), USERS_PER_REQUEST):
+            call('POST', '/channel/invite/bulk', {
+                'token': owner['token'],
+                'channel_id': channel_id,
+                'u_ids': invited[start:start + USERS_PER_REQUEST],
+            })
+        for member in channel['members']:
+            memberships[member].append(channel_id)
+
+    messages = workspace['messages']
+    for start in range(0, len(messages), MESSAGES_PER_REQUEST):
+        call('POST', '/admin/message/import', {
+            'token': owner['token'],
+            'messages': [{
+                'channel_id': channel_ids[message['channel']],
+                'u_id': u_ids[message['user']],
+                'message': message['message'],
+                'time_created': message['time_created'],
+            } for message in messages[start:start + MESSAGES_PER_REQUEST]],
+        })
+
+    return {
+        'tokens': tokens,
+        'u_ids': u_ids,
+        'channel_ids': channel_ids,
+        'memberships': memberships,
+    }
+
+def main(users=1000, channels=50, messages=20000):
+    workspace = generate(users, channels, messages)
+    sizes = [len(channel['members']) for channel in workspace['channels']]
+    volume = [0] * channels
+    for message in workspace['messages']:
+        volume[message['channel']] += 1
+
+    print(f"{users} users, {channels} channels, {messages} messages")
+    print(f"{'channel':<12}{'members':>10}{'messages':>10}")
+    for rank in sorted({0, 1, 2, 4, 9, channels // 2, channels - 1}):
+        if rank < channels:
+            print(f"{workspace['channels'][rank]['name']:<12}{sizes[rank]:>10}{volume[rank]:>10}")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:4]])
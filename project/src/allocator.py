@@ -0,0 +1,76 @@
+"""
+allocator.py
+
+Main Modules:
+    IdAllocator: hands out unique ids from a counter in data, one at a time or leased in blocks
+    message_ids: the allocator used for every message_id in the flockr, a locked counter
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import threading
+from data   import data
+
+class IdAllocator:
+    """
+    IdAllocator
+
+    Ids are leased from the counter in blocks of block_size and then handed out
+    from an iterator over the block. With the default block_size of 1 this is a
+    counter behind a lock, every id takes the lock and the counter is always
+    the next id. With bigger blocks only the thread which exhausts a block
+    takes the lock (next() on a range iterator is a single bytecode call, so
+    under the GIL it is atomic), but the counter runs up to a block ahead of
+    the ids handed out and lease_block skips past the rest of the block.
+
+    Args:
+        counter: the key in data which holds the next unleased id
+        block_size: how many ids to lease at a time
+        lease: optional function lease(size) returning the first id of a
+               reserved block, e.g. a call to a shared state process, so a
+               worker only has to talk to shared state once per block
+    """
+    def __init__(self, counter, block_size=1, lease=None):
+        self.counter = counter
+        self.block_size = block_size
+        self.lease = lease if lease else self.lease_local
+        self.lock = threading.Lock()
+        self.block = iter(())
+
+    # Reserves size ids from the counter in data, the caller holds self.lock
+    def lease_local(self, size):
+        start = data[self.counter]
+        data[self.counter] += size
+        return start
+
+    def next_id(self):
+        # No lock is needed while the current block lasts, with blocks of 1
+        # there is never anything left and every id takes the lock
+        try:
+            return next(self.block)
+        except StopIteration:
+            pass
+
+        with self.lock:
+            # Another thread may have leased a new block while we waited
+            try:
+                return next(self.block)
+            except StopIteration:
+                start = self.lease(self.block_size)
+                self.block = iter(range(start, start + self.block_size))
+                return next(self.block)
+
+    # For bulk operations which need size contiguous ids at once
+    def lease_block(self, size):
+        with self.lock:
+            start = self.lease(size)
+        return range(start, start + size)
+
+    # Forgets any partially used block, for when the counter is cleared
+    def reset(self):
+        with self.lock:
+            self.block = iter(())
+
+# One id at a time: message_ids are handed out in order and
+# data['message_counter'] is the next one, which clear() resets
+message_ids = IdAllocator('message_counter')
@@ -0,0 +1,456 @@
+"""
+asgi.py
+    - an asyncio (ASGI) entry point for the server. Every request is served by
+      server.py's WSGI app, with all of its middleware (rate limits,
+      compression, ETags and 304s, metrics, the users/all cache, picture
+      caching and Range requests), on a thread pool so the event loop can keep
+      serving other connections. The routes which wait for a publish (long
+      polls and event streams) wait on the loop instead of holding a thread
+
+Usage:
+    python3 src/asgi.py [port]
+    uvicorn asgi:app (from src/) to run it under uvicorn or any other ASGI server
+
+Helper Modules:
+    wsgi_environ: the WSGI environ for a request
+    send_wsgi: runs a WSGI app on the thread pool and sends its response
+    waiting: an asyncio.Event set when something is published in a channel or to a subscriber
+    WAITING_ROUTES: the routes served on the loop, rather than by server.py's WSGI app
+    serve: a minimal asyncio HTTP/1.1 server for the app, so it runs without extra dependencies
+
+Main Modules:
+    app: the ASGI application
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import io
+import time
+import types
+import random
+import asyncio
+import threading
+import contextlib
+from concurrent.futures     import ThreadPoolExecutor
+from http                   import HTTPStatus
+from urllib.parse           import parse_qsl, urlencode, unquote
+from werkzeug.exceptions    import HTTPException
+from werkzeug.wsgi          import FileWrapper
+from ratelimit              import refuse, cors_headers
+from routes                 import MODULES, find_route, call_route
+from encoder                import encode
+from passwords              import stop_on_sigterm
+from server                 import APP, METRICS, RATE_LIMIT, EVENTS_KEEPALIVE, sse_event
+
+# The WSGI app runs on these threads, as it blocks, instead of on the event loop
+EXECUTOR = ThreadPoolExecutor(max_workers=int(os.environ.get('FLOCKR_ASGI_THREADS', 32)))
+
+# Each chunk of a file (a profile picture) is read on a thread, so the chunks
+# are bigger than werkzeug's default to take fewer trips to the pool
+FILE_CHUNK_SIZE = 256 * 1024
+
+# Under serve.py the modules forward calls to the state process, which can't
+# call back into this one on a publish, so waiting holds a thread there
+LOCAL_EVENTS = isinstance(MODULES['events'], types.ModuleType)
+
+# The requests waiting on the loop for a publish, as (loop, asyncio.Event), by
+# ('channel', channel_id) or ('subscriber', subscriber_id)
+WAITERS = {}
+WAITERS_LOCK = threading.Lock()
+
+def optional_number(params, name, cast):
+    # None when missing or not a number, like request.args.get(name, type=cast) in server.py
+    try:
+        return cast(params[name]) if name in params else None
+    except ValueError:
+        return None
+
+def wsgi_environ(scope, body, query=None):
+    '''
+    wsgi_environ
+
+    Args:
+        scope: the ASGI scope of the request
+        body: the request's body
+        query: the query string to use instead of the request's
+
+    Returns:
+        the WSGI environ for the request
+    '''
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('127.0.0.1', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': '',
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope['query_string'].decode('latin-1') if query is None else query,
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'wsgi.file_wrapper': lambda file, buffer_size=None: FileWrapper(file, FILE_CHUNK_SIZE),
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = 'HTTP_' + name
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def send_wsgi(loop, send, wsgi_app, environ):
+    '''
+    Runs wsgi_app on the thread pool and sends its response, a chunk at a time
+    '''
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = headers
+
+    def next_chunk(chunks, body):
+        chunk = next(chunks, None)
+        if chunk is None and hasattr(body, 'close'):
+            body.close()
+        return chunk
+
+    def start():
+        # Some middleware only calls start_response once the body is iterated
+        body = wsgi_app(environ, start_response)
+        chunks = iter(body)
+        return body, chunks, next_chunk(chunks, body)
+
+    body, chunks, chunk = await loop.run_in_executor(EXECUTOR, start)
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': response['status'],
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response['headers']],
+        })
+        if chunk is None:
+            await send({'type': 'http.response.body', 'body': b''})
+        while chunk is not None:
+            following = await loop.run_in_executor(EXECUTOR, next_chunk, chunks, body)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': following is not None})
+            chunk = following
+    except BaseException:
+        # e.g. the client went away, the body is closed so the route's
+        # resources (an open picture, a concurrency slot) are given back
+        if chunk is not None and hasattr(body, 'close'):
+            await loop.run_in_executor(EXECUTOR, body.close)
+        raise
+
+def published(channel_id, subscriber_ids):
+    # Called on the thread which published, so the events are set on their loops
+    keys = [('channel', channel_id)] + [('subscriber', subscriber_id) for subscriber_id in subscriber_ids]
+    with WAITERS_LOCK:
+        waiters = [waiter for key in keys for waiter in WAITERS.get(key, ())]
+    for loop, event in waiters:
+        loop.call_soon_threadsafe(event.set)
+
+@contextlib.contextmanager
+def waiting(key):
+    '''
+    Yields an asyncio.Event which is set when something is published for key,
+    published is only a listener of events.py while a request is waiting
+    '''
+    waiter = (asyncio.get_running_loop(), asyncio.Event())
+    with WAITERS_LOCK:
+        if not WAITERS:
+            MODULES['events'].add_listener(published)
+        WAITERS.setdefault(key, set()).add(waiter)
+    try:
+        yield waiter[1]
+    finally:
+        with WAITERS_LOCK:
+            WAITERS[key].discard(waiter)
+            if not WAITERS[key]:
+                del WAITERS[key]
+            if not WAITERS:
+                MODULES['events'].remove_listener(published)
+
+async def messages_since(request, send):
+    '''
+    channel/messages/since without holding a thread while it waits: the
+    channel is checked with a timeout of 0, and between checks the request
+    waits on the loop for a publish in the channel. Once there are messages
+    or the timeout is up, the response is the WSGI app's for a timeout of 0
+    '''
+    loop = request['loop']
+    params = dict(parse_qsl(request['environ']['QUERY_STRING']))
+    channel_id = optional_number(params, 'channel_id', int)
+    timeout = optional_number(params, 'timeout', float)
+    if not LOCAL_EVENTS or channel_id is None or timeout is None or not 0 < timeout:
+        # Nothing to wait for, or only the WSGI app can wait for it
+        await send_wsgi(loop, send, RATE_LIMIT.app, request['environ'])
+        return
+
+    route = find_route('GET', '/channel/messages/since')
+    deadline = loop.time() + min(timeout, MODULES['implement.channel'].MAX_WAIT)
+    with waiting(('channel', channel_id)) as publish:
+        while True:
+            # Cleared before checking, so a publish during the check is checked next time
+            publish.clear()
+            try:
+                result = await loop.run_in_executor(
+                    EXECUTOR, call_route, route, dict(params, timeout=0), request['environ'].get('HTTP_HOST'))
+            except HTTPException:
+                # The WSGI app answers with the error
+                break
+            remaining = deadline - loop.time()
+            if result['messages'] or remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(publish.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    environ = wsgi_environ(request['scope'], request['body'], urlencode(dict(params, timeout=0)))
+    await send_wsgi(loop, send, RATE_LIMIT.app, environ)
+
+async def next_events(loop, subscriber_id, disconnected):
+    '''
+    events_next for an event stream, waiting on the loop for a publish to the
+    subscriber, or for the client to disconnect, rather than on a thread
+    '''
+    events = MODULES['events']
+    if not LOCAL_EVENTS:
+        return (await loop.run_in_executor(EXECUTOR, events.events_next, subscriber_id, EVENTS_KEEPALIVE))['events']
+
+    with waiting(('subscriber', subscriber_id)) as publish:
+        pending = (await loop.run_in_executor(EXECUTOR, events.events_next, subscriber_id, 0))['events']
+        if pending:
+            return pending
+        published_event = asyncio.ensure_future(publish.wait())
+        await asyncio.wait([published_event, disconnected], timeout=EVENTS_KEEPALIVE, return_when=asyncio.FIRST_COMPLETED)
+        published_event.cancel()
+    return (await loop.run_in_executor(EXECUTOR, events.events_next, subscriber_id, 0))['events']
+
+async def events_stream(request, send):
+    '''
+    The same stream as server.py's /events/stream, waiting on the loop
+    '''
+    loop = request['loop']
+    environ = request['environ']
+    events = MODULES['events']
+    token = dict(parse_qsl(environ['QUERY_STRING'])).get('token')
+    try:
+        subscriber_id = (await loop.run_in_executor(EXECUTOR, events.events_subscribe, token))['subscriber_id']
+    except HTTPException:
+        # The WSGI app answers an invalid token with the same error
+        await send_wsgi(loop, send, RATE_LIMIT.app, environ)
+        return
+
+    # Recorded for /metrics as Instrumentation records server.py's streams
+    record = {
+        'start': time.perf_counter(),
+        'end': None,
+        'method': 'GET',
+        'route': '/events/stream',
+        'status': '200',
+        'view': None,
+        'serialize': 0,
+        'request_bytes': len(request['body']),
+        'response_bytes': 0,
+    }
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect(request['receive']))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ] + [(name.lower().encode(), value.encode('latin-1')) for name, value in cors_headers(environ)],
+        })
+        await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+        while not disconnected.done():
+            pending = await next_events(loop, subscriber_id, disconnected)
+            chunk = (''.join(sse_event(event) for event in pending) or ': keep-alive\n\n').encode()
+            record['response_bytes'] += len(chunk)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        disconnected.cancel()
+        await loop.run_in_executor(EXECUTOR, events.events_unsubscribe, subscriber_id)
+        record['end'] = time.perf_counter()
+        sample_rate = METRICS.sample_rate
+        if sample_rate and (sample_rate >= 1 or random.random() < sample_rate):
+            METRICS.observe(record)
+
+# Served on the loop, after the same rate limit as the WSGI app's
+WAITING_ROUTES = {
+    ('GET', '/channel/messages/since'): messages_since,
+    ('GET', '/events/stream'): events_stream,
+}
+
+async def read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def serve_waiting(request, send, handler):
+    environ = request['environ']
+    wait = RATE_LIMIT.limit(environ)
+    if wait:
+        await send_wsgi(request['loop'], send, lambda environ, start_response: refuse(
+            environ, start_response, 429, '429 TOO MANY REQUESTS', "Too many requests, slow down", wait), environ)
+        return
+    await handler(request, send)
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    loop = asyncio.get_running_loop()
+    body = await read_body(receive)
+    environ = wsgi_environ(scope, body)
+
+    handler = WAITING_ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        await send_wsgi(loop, send, APP.wsgi_app, environ)
+        return
+
+    await serve_waiting({
+        'loop': loop,
+        'scope': scope,
+        'body': body,
+        'environ': environ,
+        'receive': receive,
+    }, send, handler)
+
+# ========================================================================
+# A minimal HTTP/1.1 server so the app runs without installing an ASGI server
+
+async def read_request(reader):
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    method, target, version = request_line.decode('latin-1').split()
+
+    headers = []
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, value = line.decode('latin-1').split(':', 1)
+        headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+
+    length = int(dict(headers).get(b'content-length', b'0'))
+    body = await reader.readexactly(length) if length else b''
+
+    path, _, query = target.partition('?')
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': version.split('/')[-1],
+        'method': method.upper(),
+        'scheme': 'http',
+        'path': unquote(path),
+        'raw_path': path.encode('latin-1'),
+        'query_string': query.encode('latin-1'),
+        'headers': headers,
+    }, body
+
+async def handle_connection(application, reader, writer):
+    try:
+        while True:
+            request = await read_request(reader)
+            if request is None:
+                break
+            scope, body = request
+            scope['server'] = writer.get_extra_info('sockname')[:2]
+            scope['client'] = writer.get_extra_info('peername')[:2]
+
+            received = []
+
+            # After the body, all that's left to receive is http.disconnect, which
+            # this server doesn't report, a stream ends when writing to it fails
+            async def receive():
+                if received:
+                    await asyncio.Future()
+                received.append(True)
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+
+            # A response without a content-length is streamed in chunks
+            response = {'chunked': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status = message['status']
+                    headers = message.get('headers', [])
+                    writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n".encode())
+                    for name, value in headers:
+                        writer.write(name + b': ' + value + b'\r\n')
+                    if b'content-length' not in dict(headers):
+                        writer.write(b'transfer-encoding: chunked\r\n')
+                        response['chunked'] = True
+                    writer.write(b'\r\n')
+                elif message['type'] == 'http.response.body':
+                    chunk = message.get('body', b'')
+                    if not response['chunked']:
+                        writer.write(chunk)
+                    else:
+                        if chunk:
+                            writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b'\r\n')
+                        if not message.get('more_body', False):
+                            writer.write(b'0\r\n\r\n')
+                    await writer.drain()
+
+            await application(scope, receive, send)
+
+            if dict(scope['headers']).get(b'connection', b'').lower() == b'close':
+                break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(application, host='127.0.0.1', port=0):
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(application, reader, writer), host, port)
+    port = server.sockets[0].getsockname()[1]
+
+    # The url fixtures read the first line on stderr with the werkzeug pattern,
+    # " * Running on <url>", so python3 src/asgi.py can be started like server.py
+    print(f" * Running on http://{host}:{port}/ (asyncio)", file=sys.stderr, flush=True)
+
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    stop_on_sigterm()
+    try:
+        asyncio.run(serve(app, port=port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,108 @@
+'''
+auth_register_bulk_test.py
+
+Fixtures:
+    flockr_owner: registers the flockr owner and a member
+
+Test Modules:
+    test_invalid_token: tests when token is invalid
+    test_not_flockr_owner: tests when the authorised user is not a flockr owner
+    test_invalid_user: tests when any of the users could not be registered, no users are added
+    test_duplicate_email: tests two new users with the same email
+    test_register_success: tests the new users can log in and get unique u_ids and handles
+    test_concurrent_bulk: tests bulk registrations at the same time get different blocks of u_ids
+'''
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import pytest
+import threading
+import implement.auth
+from implement.other          import clear, users_all
+from error          import InputError, AccessError
+from implement.auth import auth_register, auth_register_bulk, auth_login
+from helper         import token_hash
+
+@pytest.fixture
+def flockr_owner():
+    clear()
+    owner = auth_register("owner@email.com", "password", "First", "Last")
+    member = auth_register("member@email.com", "password", "Member", "Last")
+    return owner, member
+
+def new_user(number, **changes):
+    return dict({
+        'email': f"user{number}@email.com",
+        'password': "password",
+        'name_first': "First",
+        'name_last': "Last",
+    }, **changes)
+
+def test_invalid_token(flockr_owner):
+    with pytest.raises(AccessError):
+        auth_register_bulk(token_hash(5), [new_user(1)])
+
+def test_not_flockr_owner(flockr_owner):
+    _, member = flockr_owner
+    with pytest.raises(AccessError):
+        auth_register_bulk(member['token'], [new_user(1)])
+
+def test_invalid_user(flockr_owner):
+    owner, _ = flockr_owner
+    for invalid in [
+        new_user(2, email="not an email"),
+        new_user(2, email="owner@email.com"),
+        new_user(2, password="short"),
+        new_user(2, name_first=""),
+        new_user(2, name_last="a" * 51),
+        {'email': "user2@email.com"},
+    ]:
+        with pytest.raises(InputError):
+            auth_register_bulk(owner['token'], [new_user(1), invalid])
+
+    assert len(users_all(owner['token'])['users']) == 2
+
+def test_duplicate_email(flockr_owner):
+    owner, _ = flockr_owner
+    with pytest.raises(InputError):
+        auth_register_bulk(owner['token'], [new_user(1), new_user(1)])
+
+def test_register_success(flockr_owner):
+    owner, _ = flockr_owner
+    registered = auth_register_bulk(owner['token'], [new_user(number) for number in range(3)])['users']
+
+    assert [user['u_id'] for user in registered] == [2, 3, 4]
+    assert [user['token'] for user in registered] == [token_hash(u_id) for u_id in [2, 3, 4]]
+    assert auth_login("user1@email.com", "password") == registered[1]
+
+    users = users_all(owner['token'])['users']
+    handles = [user['handle_str'] for user in users]
+    assert handles == ['firstlast', 'memberlast', '2firstlast', '3firstlast', '4firstlast']
+
+    # Registering one at a time afterwards carries on from the block
+    assert auth_register("next@email.com", "password", "Next", "User")['u_id'] == 5
+
+def test_concurrent_bulk(flockr_owner, monkeypatch):
+    owner, _ = flockr_owner
+
+    # Both registrations wait in password hashing until the other is hashing too
+    barrier = threading.Barrier(2, timeout=10)
+    hash_passwords = implement.auth.hash_passwords
+    def waiting_hash(passwords):
+        barrier.wait()
+        return hash_passwords(passwords)
+    monkeypatch.setattr(implement.auth, 'hash_passwords', waiting_hash)
+
+    results = [None, None]
+    def register(index):
+        users = [new_user(number) for number in range(index * 3, index * 3 + 3)]
+        results[index] = auth_register_bulk(owner['token'], users)['users']
+    threads = [threading.Thread(target=register, args=(index,)) for index in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    u_ids = sorted(user['u_id'] for result in results for user in result)
+    assert u_ids == [2, 3, 4, 5, 6, 7]
+    assert len(users_all(owner['token'])['users']) == 8
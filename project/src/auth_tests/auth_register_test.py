@@ -13,11 +13,15 @@ Test Modules:
     test_invalid_lastname_long: test when lastname over 50 characters
     test_valid_lastname_onechar: test lastname entered as one character
     test_invalid_lastname: test when lastname entered is one character
+    test_concurrent_register: test users registering at the same time get different u_ids
+    test_concurrent_same_email: test the same email registered twice at the same time
 """
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
 
 import pytest
+import threading
+import implement.auth
 from implement.auth     import auth_register
 from error              import InputError
 from implement.other              import clear
@@ -100,3 +104,39 @@ def test_invalid_lastname():
     clear()
     with pytest.raises(InputError):
         auth_register("test@email.com", "password", "Angus", "")
+
+# Every registration waits in password hashing until all of them are hashing
+def hash_together(monkeypatch, count):
+    barrier = threading.Barrier(count, timeout=10)
+    password_hash = implement.auth.password_hash
+    def waiting_hash(password):
+        barrier.wait()
+        return password_hash(password)
+    monkeypatch.setattr(implement.auth, 'password_hash', waiting_hash)
+
+def register_together(users):
+    results = [None] * len(users)
+    def register(index, email):
+        try:
+            results[index] = auth_register(email, "password", "Angus", "Doe")
+        except InputError as err:
+            results[index] = err
+    threads = [threading.Thread(target=register, args=(index, email)) for index, email in enumerate(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_register(monkeypatch):
+    clear()
+    hash_together(monkeypatch, 6)
+    results = register_together([f"test{i}@email.com" for i in range(6)])
+    assert sorted(result['u_id'] for result in results) == [0, 1, 2, 3, 4, 5]
+
+def test_concurrent_same_email(monkeypatch):
+    clear()
+    hash_together(monkeypatch, 2)
+    results = register_together(["test@email.com", "test@email.com"])
+    assert len([result for result in results if isinstance(result, InputError)]) == 1
+    assert len([result for result in results if isinstance(result, dict)]) == 1
@@ -0,0 +1,159 @@
+"""
+outbox_test.py
+
+Fixtures:
+    smtp_sink: a local SMTP server which keeps the emails it receives
+    sink_outbox: an Outbox sending to smtp_sink
+
+Test Modules:
+    test_batch: success case for queued emails being sent on one connection
+    test_reconnect: success case for an email being retried on a new connection after a disconnect
+    test_refused: fail case for a refused recipient not being retried
+    test_give_up: fail case for an email being given up on after max_attempts
+    test_failed_bounded: fail case for only the last max_failed emails given up on being kept
+    test_passwordreset_request: success case for the reset code being sent through the outbox
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import re
+import socket
+import socketserver
+import threading
+import pytest
+import implement.auth
+from outbox             import Outbox
+from implement.auth     import auth_register, auth_login, auth_passwordreset_request, auth_passwordreset_reset
+from implement.other    import clear
+
+class SmtpSink(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        sink = self.server
+        sink.connections += 1
+        self.reply('220 sink')
+        receivers = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+
+            if command.upper().startswith(('EHLO', 'HELO')):
+                self.reply('250 sink')
+            elif command.upper().startswith('MAIL'):
+                receivers = []
+                self.reply('250 OK')
+            elif command.upper().startswith('RCPT'):
+                receiver = re.search(r'<(.*)>', command).group(1)
+                if receiver in sink.refused:
+                    self.reply('550 No such user')
+                else:
+                    receivers.append(receiver)
+                    self.reply('250 OK')
+            elif command.upper() == 'DATA':
+                # Hangs up instead of taking the email, like a server going away
+                if sink.disconnects:
+                    sink.disconnects -= 1
+                    return
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                message = b''
+                while True:
+                    line = self.rfile.readline()
+                    if line in (b'.\r\n', b''):
+                        break
+                    message += line
+                sink.emails.append((receivers, message.decode()))
+                self.reply('250 OK')
+            elif command.upper() == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+@pytest.fixture
+def smtp_sink():
+    sink = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SmtpSink)
+    sink.daemon_threads = True
+    sink.connections = 0
+    sink.disconnects = 0
+    sink.refused = set()
+    sink.emails = []
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    yield sink
+    sink.shutdown()
+    sink.server_close()
+
+@pytest.fixture
+def sink_outbox(smtp_sink):
+    return Outbox('127.0.0.1', smtp_sink.server_address[1], use_ssl=False,
+                  sender='flockr@email.com', retry_delay=0, max_attempts=3)
+
+def test_batch(smtp_sink, sink_outbox):
+    for number in range(10):
+        sink_outbox.send(f"user{number}@email.com", f"Subject: {number}\n\nBody {number}")
+    sink_outbox.flush()
+
+    assert sink_outbox.sent == 10
+    assert smtp_sink.connections == 1
+    assert [receivers for receivers, _ in smtp_sink.emails] == [[f"user{number}@email.com"] for number in range(10)]
+    assert 'Body 3' in smtp_sink.emails[3][1]
+
+def test_reconnect(smtp_sink, sink_outbox):
+    smtp_sink.disconnects = 2
+    sink_outbox.send("user@email.com", "Subject: Hello\n\nHello")
+    sink_outbox.flush()
+
+    assert not sink_outbox.failed
+    assert len(smtp_sink.emails) == 1
+    assert sink_outbox.connections == 3
+
+def test_refused(smtp_sink, sink_outbox):
+    smtp_sink.refused.add("missing@email.com")
+    sink_outbox.send("missing@email.com", "Subject: Hello\n\nHello")
+    sink_outbox.send("user@email.com", "Subject: Hello\n\nHello")
+    sink_outbox.flush()
+
+    assert [email['receiver'] for email in sink_outbox.failed] == ["missing@email.com"]
+    assert sink_outbox.failed[0]['attempts'] == 1
+    assert len(smtp_sink.emails) == 1
+
+def test_give_up():
+    # Nothing is listening on this port
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    port = listener.getsockname()[1]
+    listener.close()
+
+    closed_outbox = Outbox('127.0.0.1', port, use_ssl=False, retry_delay=0, max_attempts=3)
+    closed_outbox.send("user@email.com", "Subject: Hello\n\nHello")
+    closed_outbox.flush()
+
+    assert closed_outbox.failed[0]['attempts'] == 3
+
+def test_failed_bounded(smtp_sink):
+    bounded_outbox = Outbox('127.0.0.1', smtp_sink.server_address[1], use_ssl=False,
+                            sender='flockr@email.com', retry_delay=0, max_failed=2)
+    for number in range(5):
+        smtp_sink.refused.add(f"missing{number}@email.com")
+        bounded_outbox.send(f"missing{number}@email.com", "Subject: Hello\n\nHello")
+    bounded_outbox.flush()
+
+    assert bounded_outbox.failed_count == 5
+    assert [email['receiver'] for email in bounded_outbox.failed] == ["missing3@email.com", "missing4@email.com"]
+
+def test_passwordreset_request(smtp_sink, sink_outbox, monkeypatch):
+    monkeypatch.setattr(implement.auth, 'outbox', sink_outbox)
+    clear()
+    auth_register("user@email.com", "password", "First", "Last")
+
+    assert auth_passwordreset_request("user@email.com") == {}
+    sink_outbox.flush()
+
+    receivers, message = smtp_sink.emails[0]
+    assert receivers == ["user@email.com"]
+    code = message.strip().splitlines()[-1]
+    auth_passwordreset_reset(code, "newpassword")
+    assert auth_login("user@email.com", "newpassword")['u_id'] == 0
@@ -0,0 +1,104 @@
+"""
+passwords_http_test.py
+
+Fixtures:
+    url: starts server.py with KDF worker processes, unlike the other tests
+        which hash on the test's thread
+
+Test Modules:
+    test_register_and_login: success case for registering and logging in through the workers
+    test_sigterm_stops_workers: success case for the workers exiting with the server
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import pytest
+import re
+import signal
+import requests
+from subprocess     import Popen, PIPE
+from time           import sleep, monotonic
+
+def children(pid):
+    '''
+    Returns:
+        the pids of the processes whose parent is pid
+    '''
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                # The command name is in brackets and can contain spaces
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            pids.append(int(entry))
+    return pids
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+@pytest.fixture
+def server():
+    url_re = re.compile(r' \* Running on ([^ ]*)')
+    server = Popen(["python3", "src/server.py"], stderr=PIPE, stdout=PIPE,
+                   env=dict(os.environ, FLOCKR_KDF_WORKERS='2'))
+    line = server.stderr.readline()
+    local_url = url_re.match(line.decode())
+    if not local_url:
+        server.kill()
+        raise Exception("Couldn't get URL from local server")
+    server.url = local_url.group(1).rstrip('/')
+    yield server
+    server.send_signal(signal.SIGINT)
+    waited = 0
+    while server.poll() is None and waited < 5:
+        sleep(0.1)
+        waited += 0.1
+    if server.poll() is None:
+        server.kill()
+
+def register_and_login(url):
+    requests.delete(f"{url}/clear")
+    registered = requests.post(f"{url}/auth/register", json={
+        'email': 'user@email.com',
+        'password': 'password',
+        'name_first': 'First',
+        'name_last': 'Last',
+    })
+    assert registered.status_code == 200
+    logged_in = requests.post(f"{url}/auth/login", json={
+        'email': 'user@email.com',
+        'password': 'password',
+    })
+    assert logged_in.status_code == 200
+    assert logged_in.json()['u_id'] == registered.json()['u_id']
+
+    wrong = requests.post(f"{url}/auth/login", json={
+        'email': 'user@email.com',
+        'password': 'not the password',
+    })
+    assert wrong.status_code == 400
+
+def test_register_and_login(server):
+    register_and_login(server.url)
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason="finds the workers through /proc")
+def test_sigterm_stops_workers(server):
+    register_and_login(server.url)
+    workers = children(server.pid)
+    assert workers
+
+    server.send_signal(signal.SIGTERM)
+    server.wait(10)
+    deadline = monotonic() + 10
+    while any(alive(worker) for worker in workers) and monotonic() < deadline:
+        sleep(0.1)
+    assert not any(alive(worker) for worker in workers)
@@ -0,0 +1,115 @@
+"""
+passwords_test.py
+
+Test Modules:
+    test_round_trip: success case for a password checked against its scrypt and pbkdf2 hashes
+    test_salted: success case for the same password hashing differently each time
+    test_hash_passwords: success case for many passwords hashed by a pool of workers
+    test_worker_killed: success case for a killed worker being replaced
+    test_needs_rehash: success case for legacy hashes and old costs needing a rehash
+    test_login_upgrades_legacy: success case for a legacy sha256 hash being replaced at login
+    test_login_upgrades_cost: success case for a hash being replaced at login after the cost changes
+    test_login_wrong_password: fail case for a wrong password against a legacy hash
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import pytest
+import passwords
+from data               import data
+from error              import InputError
+from passwords          import hash_password, hash_passwords, verify_password, needs_rehash, legacy_hash
+from implement.auth     import auth_register, auth_login
+from implement.other    import clear
+
+@pytest.mark.parametrize('kdf', ['scrypt', 'pbkdf2'])
+def test_round_trip(monkeypatch, kdf):
+    monkeypatch.setattr(passwords, 'KDF', kdf)
+    monkeypatch.setattr(passwords, 'PBKDF2_ITERATIONS', 10)
+
+    stored = hash_password('password123')
+    assert stored.startswith('scrypt$16$8$1$' if kdf == 'scrypt' else 'pbkdf2_sha256$10$')
+    assert verify_password('password123', stored)
+    assert not verify_password('password124', stored)
+
+def test_salted():
+    first = hash_password('password123')
+    second = hash_password('password123')
+    assert first != second
+    assert verify_password('password123', first)
+    assert verify_password('password123', second)
+
+def test_hash_passwords(monkeypatch):
+    # Run by real worker processes, rather than inline like the rest of the tests
+    monkeypatch.setattr(passwords, 'KDF_WORKERS', 2)
+    monkeypatch.setattr(passwords, 'pool', None)
+
+    stored = hash_passwords([f"password{i}" for i in range(10)])
+    assert len(stored) == 10
+    assert all(verify_password(f"password{i}", hashed) for i, hashed in enumerate(stored))
+    assert not verify_password('password1', stored[0])
+
+    passwords.shutdown()
+    assert passwords.pool is None
+
+def test_worker_killed(monkeypatch):
+    monkeypatch.setattr(passwords, 'KDF_WORKERS', 1)
+    monkeypatch.setattr(passwords, 'pool', None)
+    stored = hash_password('password123')
+
+    worker, = passwords.pool.workers
+    worker.process.kill()
+    worker.process.wait()
+    # Checked inline, and the next hash starts a new worker
+    assert verify_password('password123', stored)
+    assert verify_password('password123', hash_password('password123'))
+    assert passwords.pool.workers[0] is not worker
+
+    passwords.shutdown()
+    assert worker.process.poll() is not None
+
+def test_needs_rehash(monkeypatch):
+    stored = hash_password('password123')
+    assert not needs_rehash(stored)
+    assert needs_rehash(legacy_hash('password123'))
+
+    monkeypatch.setattr(passwords, 'SCRYPT_COST', (32, 8, 1))
+    assert needs_rehash(stored)
+    # Still checked with the cost it was made with
+    assert verify_password('password123', stored)
+
+    monkeypatch.setattr(passwords, 'KDF', 'pbkdf2')
+    assert needs_rehash(stored)
+
+def test_login_upgrades_legacy():
+    clear()
+    user = auth_register('validemail@gmail.com', 'password123', 'Jayden', 'Leung')
+    # As stored before passwords were salted
+    data['users'][0]['password'] = legacy_hash('password123')
+
+    assert auth_login('validemail@gmail.com', 'password123')['u_id'] == user['u_id']
+    stored = data['users'][0]['password']
+    assert stored.startswith('scrypt$')
+    assert not needs_rehash(stored)
+
+    # And the new hash is what the next login is checked against
+    assert auth_login('validemail@gmail.com', 'password123')['u_id'] == user['u_id']
+    assert data['users'][0]['password'] == stored
+
+def test_login_upgrades_cost(monkeypatch):
+    clear()
+    auth_register('validemail@gmail.com', 'password123', 'Jayden', 'Leung')
+
+    monkeypatch.setattr(passwords, 'SCRYPT_COST', (32, 8, 1))
+    auth_login('validemail@gmail.com', 'password123')
+    assert data['users'][0]['password'].startswith('scrypt$32$8$1$')
+
+def test_login_wrong_password():
+    clear()
+    auth_register('validemail@gmail.com', 'password123', 'Jayden', 'Leung')
+    data['users'][0]['password'] = legacy_hash('password123')
+
+    with pytest.raises(InputError):
+        auth_login('validemail@gmail.com', 'password124')
+    # Only upgraded once the password has been checked
+    assert data['users'][0]['password'] == legacy_hash('password123')
@@ -0,0 +1,79 @@
+"""
+batch.py
+    - runs several routes from routes.py for one user in a single request, so a
+      screen which needs channel details, profiles and messages is one round trip
+
+Helper Modules:
+    run_operation: runs one operation of a batch and returns its outcome
+
+Main Modules:
+    batch: validates the token once and runs each operation in order
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+from werkzeug.exceptions    import HTTPException
+from error                  import InputError
+from helper                 import trusted_token
+
+# routes.py imports this module through implement_modules, so its functions
+# are looked up when a batch runs rather than when this is imported
+import routes
+
+MAX_OPERATIONS = 100
+
+def run_operation(operation, token, host):
+    '''
+    Returns:
+        {'status': 200, 'result': ...} when the operation succeeds, otherwise
+        {'status': code, 'name': 'System Error', 'message': ...}
+    '''
+    try:
+        if not isinstance(operation, dict) or 'path' not in operation:
+            raise InputError("Operation must have a path")
+
+        route = routes.find_route(operation.get('method', 'GET').upper(), operation['path'])
+        # Only routes run as the batch's user, logging in or clearing the data
+        # can't be batched, and neither can another batch
+        if route is None or 'token' not in route[2] or route[1] == 'batch':
+            raise InputError(f"{operation['path']} cannot be run in a batch")
+
+        params = dict(operation.get('params') or {})
+        params['token'] = token
+        return {
+            'status': 200,
+            'result': routes.call_route(route, params, host),
+        }
+    except HTTPException as err:
+        return {
+            'status': err.code,
+            'name': "System Error",
+            'message': err.description,
+        }
+
+def batch(token, operations, host):
+    '''
+    batch
+
+    Args:
+        token: authorises user, used for every operation
+        operations: a list of {'method', 'path', 'params'}, params without the token
+        host: the host the request was sent to, for profile picture urls
+
+    Returns:
+        results: the outcome of each operation, in the same order, one failing
+        does not stop the rest
+
+    Raises:
+        InputError when operations is not a list or has more than MAX_OPERATIONS
+        AccessError when token is not valid
+    '''
+    if not isinstance(operations, list):
+        raise InputError("operations must be a list")
+    if len(operations) > MAX_OPERATIONS:
+        raise InputError(f"A batch can have at most {MAX_OPERATIONS} operations")
+
+    with trusted_token(token):
+        return {
+            'results': [run_operation(operation, token, host) for operation in operations]
+        }
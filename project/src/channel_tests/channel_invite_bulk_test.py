@@ -0,0 +1,67 @@
+'''
+channel_invite_bulk_test.py
+
+Fixtures:
+    channel_and_users: registers a channel owner who creates a private channel, and three other users
+
+Test Modules:
+    test_invalid_token: tests when token is invalid
+    test_invalid_channel_id: tests when channel_id is not a channel
+    test_invalid_u_id: tests when one of the u_ids is not a user, nobody is invited
+    test_invalid_reinvite: tests when one of the users is already in the channel
+    test_duplicate_u_id: tests when a u_id is in u_ids twice
+    test_invite_success: tests every user is added to the channel
+'''
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import pytest
+from implement.other          import clear
+from error          import InputError, AccessError
+from implement.channel        import channel_invite_bulk, channel_details
+from implement.auth import auth_register
+from implement.channels       import channels_create
+from helper         import token_hash
+
+@pytest.fixture
+def channel_and_users():
+    clear()
+    owner = auth_register("owner@email.com", "password", "First", "Last")
+    c_id = channels_create(owner['token'], "Channel", False)['channel_id']
+    u_ids = [auth_register(f"user{number}@email.com", "password", "First", "Last")['u_id']
+             for number in range(3)]
+    return owner, c_id, u_ids
+
+def test_invalid_token(channel_and_users):
+    _, c_id, u_ids = channel_and_users
+    with pytest.raises(AccessError):
+        channel_invite_bulk(token_hash(10), c_id, u_ids)
+
+def test_invalid_channel_id(channel_and_users):
+    owner, _, u_ids = channel_and_users
+    with pytest.raises(InputError):
+        channel_invite_bulk(owner['token'], 5, u_ids)
+
+def test_invalid_u_id(channel_and_users):
+    owner, c_id, u_ids = channel_and_users
+    with pytest.raises(InputError):
+        channel_invite_bulk(owner['token'], c_id, u_ids + [10])
+
+    assert len(channel_details(owner['token'], c_id)['all_members']) == 1
+
+def test_invalid_reinvite(channel_and_users):
+    owner, c_id, u_ids = channel_and_users
+    with pytest.raises(AccessError):
+        channel_invite_bulk(owner['token'], c_id, u_ids + [owner['u_id']])
+
+def test_duplicate_u_id(channel_and_users):
+    owner, c_id, u_ids = channel_and_users
+    with pytest.raises(InputError):
+        channel_invite_bulk(owner['token'], c_id, u_ids + u_ids[:1])
+
+def test_invite_success(channel_and_users):
+    owner, c_id, u_ids = channel_and_users
+    assert channel_invite_bulk(owner['token'], c_id, u_ids) == {}
+
+    members = channel_details(owner['token'], c_id)['all_members']
+    assert [member['u_id'] for member in members] == [owner['u_id']] + u_ids
@@ -2,6 +2,7 @@
 channel_messages_http_test.py
 
 Fixtures:
+    url: starts the server, without rate limits since 60 messages are sent at once
     register_login_channels_messages: creates a user and login to the user, also creates 60 dummy messages, in order to have a comparison to the actual function
 
 Test Modules:
@@ -24,7 +25,7 @@ from time           import sleep
 from helper         import token_hash
 
 @pytest.fixture
-def url():
+def url(no_rate_limits):
     url_re = re.compile(r' \* Running on ([^ ]*)')
     server = Popen(["python3", "src/server.py"], stderr=PIPE, stdout=PIPE)
     line = server.stderr.readline()
@@ -0,0 +1,98 @@
+"""
+channel_messages_since_http_test.py
+
+Fixtures:
+    url: starts the server
+    channel_with_user: registers and logs in a user, and then creates a public channel
+
+Test Modules:
+    test_invalid_token: fail case for invalid token
+    test_newer_messages: success case for only returning messages after message_id
+    test_timeout: success case for no new messages within the timeout
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import pytest
+import re
+import signal
+import requests
+from subprocess     import Popen, PIPE
+from time           import sleep
+from helper         import token_hash
+
+@pytest.fixture
+def url():
+    url_re = re.compile(r' \* Running on ([^ ]*)')
+    server = Popen(["python3", "src/server.py"], stderr=PIPE, stdout=PIPE)
+    line = server.stderr.readline()
+    local_url = url_re.match(line.decode())
+    if local_url:
+        yield local_url.group(1)
+        # Terminate the server
+        server.send_signal(signal.SIGINT)
+        waited = 0
+        while server.poll() is None and waited < 5:
+            sleep(0.1)
+            waited += 0.1
+        if server.poll() is None:
+            server.kill()
+    else:
+        server.kill()
+        raise Exception("Couldn't get URL from local server")
+
+@pytest.fixture
+def channel_with_user(url):
+    requests.delete(f"{url}/clear")
+    user = requests.post(f"{url}/auth/register", json={
+        'email': 'owner@email.com',
+        'password': 'password',
+        'name_first': 'Firstname',
+        'name_last': 'Lastname',
+    }).json()
+
+    c_id = requests.post(f"{url}/channels/create", json={
+        'token': user['token'],
+        'name': 'Channel',
+        'is_public': True,
+    }).json()['channel_id']
+
+    for i in range(3):
+        requests.post(f"{url}/message/send", json={
+            'token': user['token'],
+            'channel_id': c_id,
+            'message': f"Message {i}",
+        })
+
+    return {
+        'token': user['token'],
+        'c_id': c_id,
+    }
+
+def test_invalid_token(url, channel_with_user):
+    result = requests.get(f"{url}/channel/messages/since", params={
+        'token': token_hash(1),
+        'channel_id': channel_with_user['c_id'],
+        'message_id': -1,
+    })
+    assert result.status_code == 400
+
+def test_newer_messages(url, channel_with_user):
+    result = requests.get(f"{url}/channel/messages/since", params={
+        'token': channel_with_user['token'],
+        'channel_id': channel_with_user['c_id'],
+        'message_id': 0,
+    }).json()
+
+    assert [message['message'] for message in result['messages']] == ["Message 1", "Message 2"]
+    assert result['last_message_id'] == 2
+
+def test_timeout(url, channel_with_user):
+    result = requests.get(f"{url}/channel/messages/since", params={
+        'token': channel_with_user['token'],
+        'channel_id': channel_with_user['c_id'],
+        'message_id': 2,
+        'timeout': 0.2,
+    }).json()
+
+    assert result == {'messages': [], 'last_message_id': 2}
@@ -0,0 +1,111 @@
+"""
+channel_messages_since_test.py
+
+Fixtures:
+    channel_with_user: registers and logs in a user, and then creates a public channel
+
+Test Modules:
+    test_invalid_token: fail case for invalid token
+    test_invalid_channel_id: fail case for invalid channel id
+    test_unauthorised_user: fail case for a user who is not a member of the channel
+    test_all_messages: success case for message_id -1 returning every message
+    test_newer_messages: success case for only returning messages after message_id
+    test_timeout: success case for no new messages within the timeout
+    test_wakes_on_send: success case for a waiting call returning when a message is sent
+    test_sendlater_order: success case for a message_sendlater message with a smaller id
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import pytest
+import threading
+import time
+from implement.other          import clear
+from error          import AccessError, InputError
+from implement.auth           import auth_register
+from implement.channel        import channel_messages_since
+from implement.channels       import channels_create
+from implement.message        import message_send, message_sendlater
+from helper         import token_hash
+
+@pytest.fixture
+def channel_with_user():
+    clear()
+    user = auth_register("owner@email.com", "password", "Firstname", "Lastname")
+    c_id = channels_create(user['token'], "Channel", True)
+
+    return {
+        'u_id': user['u_id'],
+        'token': user['token'],
+        'c_id': c_id['channel_id'],
+    }
+
+def test_invalid_token(channel_with_user):
+    owner = channel_with_user
+    with pytest.raises(AccessError):
+        channel_messages_since(token_hash(1), owner['c_id'], -1, 0)
+
+def test_invalid_channel_id(channel_with_user):
+    owner = channel_with_user
+    with pytest.raises(InputError):
+        channel_messages_since(owner['token'], -1, -1, 0)
+
+def test_unauthorised_user(channel_with_user):
+    owner = channel_with_user
+    other = auth_register("other@email.com", "password", "Other", "User")
+    with pytest.raises(AccessError):
+        channel_messages_since(other['token'], owner['c_id'], -1, 0)
+
+def test_all_messages(channel_with_user):
+    owner = channel_with_user
+    message_send(owner['token'], owner['c_id'], "First")
+    message_send(owner['token'], owner['c_id'], "Second")
+
+    result = channel_messages_since(owner['token'], owner['c_id'], -1, 0)
+    assert [message['message'] for message in result['messages']] == ["First", "Second"]
+    assert result['last_message_id'] == 1
+
+def test_newer_messages(channel_with_user):
+    owner = channel_with_user
+    for i in range(5):
+        message_send(owner['token'], owner['c_id'], f"Message {i}")
+
+    result = channel_messages_since(owner['token'], owner['c_id'], 2, 0)
+    assert [message['message_id'] for message in result['messages']] == [3, 4]
+    assert result['last_message_id'] == 4
+
+def test_timeout(channel_with_user):
+    owner = channel_with_user
+    message_send(owner['token'], owner['c_id'], "First")
+
+    started = time.time()
+    result = channel_messages_since(owner['token'], owner['c_id'], 0, 0.2)
+    assert time.time() - started >= 0.2
+    assert result == {'messages': [], 'last_message_id': 0}
+
+def test_wakes_on_send(channel_with_user):
+    owner = channel_with_user
+    result = {}
+
+    def wait():
+        result.update(channel_messages_since(owner['token'], owner['c_id'], -1, 10))
+
+    waiting = threading.Thread(target=wait)
+    started = time.time()
+    waiting.start()
+    time.sleep(0.1)
+    message_send(owner['token'], owner['c_id'], "Hello")
+    waiting.join()
+
+    assert time.time() - started < 5
+    assert [message['message'] for message in result['messages']] == ["Hello"]
+
+def test_sendlater_order(channel_with_user):
+    owner = channel_with_user
+    later = int(time.time()) + 1
+    message_sendlater(owner['token'], owner['c_id'], "Later", later)
+    message_send(owner['token'], owner['c_id'], "Now")
+
+    # The sendlater message has id 0 but arrives after message 1
+    result = channel_messages_since(owner['token'], owner['c_id'], 1, 5)
+    assert [message['message'] for message in result['messages']] == ["Later"]
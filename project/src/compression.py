@@ -0,0 +1,144 @@
+"""
+compression.py
+    - WSGI middleware which compresses large responses with brotli (when it is
+      installed), gzip or deflate, whichever the client accepts
+
+Helper Modules:
+    negotiate: picks an encoding from an Accept-Encoding header
+    encoded_etag: the ETag of a compressed response
+    cached_etag: the ETag of a 304, the one of the copy the client has
+
+Main Modules:
+    Compression: the middleware, wraps APP.wsgi_app in server.py
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import re
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred first, brotli is only offered when it is installed
+ENCODINGS = ('br', 'gzip', 'deflate') if brotli else ('gzip', 'deflate')
+
+# Images are already compressed and event streams can't wait for a full buffer
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript')
+
+# The body is fed to the compressor in slices this size, so the compressed
+# copy is sent as it is made rather than held in memory next to the original
+SLICE_SIZE = 64 * 1024
+
+def negotiate(accept_encoding):
+    '''
+    Returns:
+        the most preferred encoding the client accepts, or None
+    '''
+    accepted = {}
+    for part in accept_encoding.lower().split(','):
+        name, _, params = part.strip().partition(';')
+        quality = re.search(r'q=([0-9.]+)', params)
+        accepted[name.strip()] = float(quality.group(1)) if quality else 1.0
+
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get('*', 0))
+        if quality > 0:
+            return encoding
+    return None
+
+def compressor(encoding, level):
+    if encoding == 'br':
+        return brotli.Compressor(quality=min(level, 11))
+
+    # wbits 31 writes a gzip header and trailer, 15 a zlib one for deflate
+    wbits = 31 if encoding == 'gzip' else 15
+    return zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+def compress_chunks(body, encoding, level):
+    stream = compressor(encoding, level)
+    compress = stream.process if encoding == 'br' else stream.compress
+    finish = stream.finish if encoding == 'br' else stream.flush
+
+    try:
+        for chunk in body:
+            for start in range(0, len(chunk), SLICE_SIZE):
+                compressed = compress(chunk[start:start + SLICE_SIZE])
+                if compressed:
+                    yield compressed
+        yield finish()
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+# A compressed response has a different ETag to the uncompressed one
+def encoded_etag(etag, encoding):
+    return re.sub(r'"$', f'-{encoding}"', etag)
+
+def decoded_etags(if_none_match):
+    return re.sub(r'-(br|gzip|deflate)"', '"', if_none_match)
+
+# A 304 confirms the copy the client has, which was compressed or not when
+# it was sent, so its ETag is the one the client sent in If-None-Match
+def cached_etag(etag, if_none_match):
+    cached = re.search(re.escape(etag[:-1]) + r'-(br|gzip|deflate)"', if_none_match)
+    return cached.group(0) if cached else etag
+
+class Compression:
+    '''
+    Compression
+
+    Args:
+        app: the WSGI application to wrap
+        min_size: responses smaller than this (in bytes) are sent as they are
+        level: the compression level, 1 (fastest) to 9 (smallest)
+    '''
+    def __init__(self, app, min_size=1024, level=6):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+
+    def __call__(self, environ, start_response):
+        encoding = negotiate(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None or environ['REQUEST_METHOD'] == 'HEAD':
+            return self.app(environ, start_response)
+
+        # The app only knows the ETags of its uncompressed responses
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH', '')
+        if if_none_match:
+            environ['HTTP_IF_NONE_MATCH'] = decoded_etags(if_none_match)
+
+        response = {}
+        def capture(status, headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = headers
+            response['exc_info'] = exc_info
+
+        body = self.app(environ, capture)
+        status = response['status']
+        headers = response['headers']
+        header_names = {name.lower(): value for name, value in headers}
+
+        content_type = header_names.get('content-type', '').split(';')[0].strip()
+        length = int(header_names.get('content-length', -1))
+
+        if status.startswith('304'):
+            headers = [(name, cached_etag(value, if_none_match) if name.lower() == 'etag' else value)
+                       for name, value in headers]
+
+        if (not status.startswith('200')
+                or content_type not in COMPRESSIBLE_TYPES
+                or 'content-encoding' in header_names
+                or length < self.min_size):
+            start_response(status, headers, response['exc_info'])
+            return body
+
+        headers = [(name, encoded_etag(value, encoding) if name.lower() == 'etag' else value)
+                   for name, value in headers if name.lower() != 'content-length']
+        headers.append(('Content-Encoding', encoding))
+        headers.append(('Vary', 'Accept-Encoding'))
+        start_response(status, headers, response['exc_info'])
+
+        return compress_chunks(body, encoding, self.level)
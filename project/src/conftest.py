@@ -0,0 +1,65 @@
+"""
+conftest.py
+    - settings for the test run, set before any module reads them. The
+      servers started by the http tests inherit them from the environment
+
+    The key derivation function runs at a low cost, and on the test's own
+    thread, since tests register and log in users thousands of times. The
+    rate limits are the shipped ones, a test which sends requests faster
+    than a client would turns them off with no_rate_limits
+
+Fixtures:
+    fresh_rate_limits: gives each test empty buckets in server.py's app
+    no_rate_limits: turns the rate limits off for one test
+    owner: clears the data, then registers a user who owns a public channel
+    client: a Flask test client for server.py's app, with owner's token and channel
+"""
+import os
+import sys
+import pytest
+
+os.environ.setdefault('FLOCKR_SCRYPT_N', '16')
+os.environ.setdefault('FLOCKR_KDF_WORKERS', '0')
+
+# The http tests start a server each, the tests using server.py's app in this
+# process would otherwise share the buckets of 127.0.0.1 and its tokens
+@pytest.fixture(autouse=True)
+def fresh_rate_limits(monkeypatch):
+    server = sys.modules.get('server')
+    if server is not None:
+        monkeypatch.setattr(server.RATE_LIMIT, 'buckets', {})
+
+@pytest.fixture
+def no_rate_limits(monkeypatch):
+    # Both for server.py's app in this process, if it has been imported, and
+    # for the servers started after this, which read them from the environment
+    monkeypatch.setenv('FLOCKR_RATE_LIMIT', '0')
+    monkeypatch.setenv('FLOCKR_IP_RATE_LIMIT', '0')
+    server = sys.modules.get('server')
+    if server is not None:
+        monkeypatch.setattr(server.RATE_LIMIT, 'limits', {'token': (0, 0), 'ip': (0, 0)})
+
+@pytest.fixture
+def owner():
+    # Imported here, the tests which don't use it shouldn't load implement/
+    from implement.other    import clear
+    from implement.auth     import auth_register
+    from implement.channels import channels_create
+
+    clear()
+    user = auth_register("owner@email.com", "password", "Firstname", "Lastname")
+    return {
+        'u_id': user['u_id'],
+        'token': user['token'],
+        'c_id': channels_create(user['token'], "Channel", True)['channel_id'],
+    }
+
+@pytest.fixture
+def client(owner):
+    from server import APP
+
+    client = APP.test_client()
+    client.u_id = owner['u_id']
+    client.token = owner['token']
+    client.c_id = owner['c_id']
+    return client
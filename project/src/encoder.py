@@ -0,0 +1,46 @@
+"""
+encoder.py
+    - encodes route results as JSON bytes, using orjson or ujson when they are
+      installed and the standard library json otherwise
+
+Main Modules:
+    ENCODERS: every available encoder by name, for benchmarking
+    ENCODER: the name of the encoder in use, can be picked with FLOCKR_JSON_ENCODER
+    encode: encodes a result as UTF-8 JSON bytes
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import json
+
+def json_encode(result):
+    return json.dumps(result, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+ENCODERS = {
+    'json': json_encode,
+}
+
+try:
+    import ujson
+
+    def ujson_encode(result):
+        return ujson.dumps(result, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+
+    ENCODERS['ujson'] = ujson_encode
+except ImportError:
+    pass
+
+try:
+    import orjson
+    ENCODERS['orjson'] = orjson.dumps
+except ImportError:
+    pass
+
+# Fastest first
+PREFERENCE = ('orjson', 'ujson', 'json')
+
+ENCODER = os.environ.get('FLOCKR_JSON_ENCODER')
+if ENCODER not in ENCODERS:
+    ENCODER = next(name for name in PREFERENCE if name in ENCODERS)
+
+encode = ENCODERS[ENCODER]
@@ -0,0 +1,181 @@
+"""
+events.py
+    - an in-process event bus which implement/message.py and implement/standup.py
+      publish to, so clients can be pushed changes instead of polling
+
+Helper Modules:
+    publish: sends an event about a channel to the subscribers who are members of it
+    wait_for_channel: blocks until something is published in a channel or a timeout
+    add_listener: calls a function after every publish, instead of blocking a thread
+    remove_listener: stops calling a function added by add_listener
+
+Main Modules:
+    events_subscribe: starts buffering the events a user can see, returns a subscriber_id
+    events_next: waits for and returns the events buffered for a subscriber
+    events_unsubscribe: stops buffering events for a subscriber
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import copy
+import itertools
+import threading
+from collections    import deque, Counter
+from error          import InputError
+from helper         import token_validator
+
+# A subscriber that stops reading only keeps its most recent events
+MAX_BUFFERED_EVENTS = 1000
+
+class Subscriber:
+    def __init__(self, u_id):
+        self.u_id = u_id
+        self.events = deque(maxlen=MAX_BUFFERED_EVENTS)
+        self.condition = threading.Condition()
+
+    def push(self, event):
+        with self.condition:
+            self.events.append(event)
+            self.condition.notify_all()
+
+    def pop_all(self, timeout):
+        with self.condition:
+            if not self.events:
+                self.condition.wait(timeout)
+            events = list(self.events)
+            self.events.clear()
+        return events
+
+subscribers = {}
+subscriber_ids = itertools.count()
+event_ids = itertools.count()
+
+# One condition per channel, notified on every publish, for long polling
+channel_conditions = {}
+channel_conditions_lock = threading.Lock()
+
+# How many threads are in wait_for_channel for each channel, changed while
+# holding the channel's condition
+channel_waiters = Counter()
+
+def channel_condition(channel_id):
+    with channel_conditions_lock:
+        if channel_id not in channel_conditions:
+            channel_conditions[channel_id] = threading.Condition()
+        return channel_conditions[channel_id]
+
+# Called with (channel_id, subscriber_ids pushed to) after every publish, for
+# waiting without a thread, e.g. on asyncio in asgi.py
+listeners = []
+
+def add_listener(listener):
+    listeners.append(listener)
+
+def remove_listener(listener):
+    listeners.remove(listener)
+
+def wait_for_channel(channel_id, predicate, timeout):
+    '''
+    wait_for_channel
+
+    Args:
+        channel_id: the channel to wait on
+        predicate: checked each time something is published in the channel
+        timeout: the longest time to wait (in seconds)
+
+    Returns:
+        the last result of predicate, which is falsy if it timed out
+    '''
+    condition = channel_condition(channel_id)
+    with condition:
+        channel_waiters[channel_id] += 1
+        try:
+            return condition.wait_for(predicate, timeout)
+        finally:
+            channel_waiters[channel_id] -= 1
+            if not channel_waiters[channel_id]:
+                del channel_waiters[channel_id]
+
+def publish(channel, event_type, **fields):
+    '''
+    publish
+
+    Args:
+        channel: the channel in data the event happened in
+        event_type: e.g. 'message_sent', 'message_edited', 'standup_finished'
+        fields: the rest of the event, e.g. message=the message in data
+    '''
+    channel_id = channel['channel_id']
+    members = channel['all_members']
+    pushed = [
+        (subscriber_id, subscriber) for subscriber_id, subscriber in list(subscribers.items())
+        if subscriber.u_id in members
+    ]
+
+    # Most publishes have no one listening, so they cost no copy or lock. A
+    # thread that starts waiting after this check sees the change the publish
+    # is for when it first checks its predicate
+    if pushed:
+        # Copied now so later changes to the message don't leak into this event
+        event = copy.deepcopy(fields)
+        event['type'] = event_type
+        event['channel_id'] = channel_id
+        event['event_id'] = next(event_ids)
+        for _, subscriber in pushed:
+            subscriber.push(event)
+
+    if channel_waiters[channel_id]:
+        condition = channel_condition(channel_id)
+        with condition:
+            condition.notify_all()
+
+    for listener in list(listeners):
+        listener(channel_id, [subscriber_id for subscriber_id, _ in pushed])
+
+def events_subscribe(token):
+    '''
+    events_subscribe
+
+    Args:
+        token: authorises user
+
+    Returns:
+        subscriber_id: used to fetch the events from the user's channels
+
+    Raises:
+        AccessError when token is not valid
+    '''
+    u_id = token_validator(token)['u_id']
+
+    subscriber_id = next(subscriber_ids)
+    subscribers[subscriber_id] = Subscriber(u_id)
+
+    return {
+        'subscriber_id': subscriber_id
+    }
+
+def events_next(subscriber_id, timeout):
+    '''
+    events_next
+
+    Args:
+        subscriber_id: from events_subscribe
+        timeout: how long to wait (in seconds) when there are no events yet
+
+    Returns:
+        events: every event buffered since the last call, oldest first
+
+    Raises:
+        InputError when subscriber_id does not refer to a subscriber
+    '''
+    subscriber = subscribers.get(subscriber_id)
+    if subscriber is None:
+        raise InputError("subscriber_id is not a valid subscriber")
+
+    return {
+        'events': subscriber.pop_all(timeout)
+    }
+
+def events_unsubscribe(subscriber_id):
+    subscribers.pop(subscriber_id, None)
+    return {}
@@ -0,0 +1,99 @@
+"""
+events_stream_http_test.py
+
+Fixtures:
+    url: starts the server
+    channel_with_user: registers a user who owns a public channel
+
+Test Modules:
+    test_invalid_token: fail case for opening a stream with an invalid token
+    test_stream_message: success case for a sent message being pushed down the stream
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import pytest
+import re
+import signal
+import json
+import requests
+from subprocess     import Popen, PIPE
+from time           import sleep
+from helper         import token_hash
+
+@pytest.fixture
+def url():
+    url_re = re.compile(r' \* Running on ([^ ]*)')
+    server = Popen(["python3", "src/server.py"], stderr=PIPE, stdout=PIPE)
+    line = server.stderr.readline()
+    local_url = url_re.match(line.decode())
+    if local_url:
+        yield local_url.group(1)
+        # Terminate the server
+        server.send_signal(signal.SIGINT)
+        waited = 0
+        while server.poll() is None and waited < 5:
+            sleep(0.1)
+            waited += 0.1
+        if server.poll() is None:
+            server.kill()
+    else:
+        server.kill()
+        raise Exception("Couldn't get URL from local server")
+
+@pytest.fixture
+def channel_with_user(url):
+    requests.delete(f"{url}/clear")
+    user = requests.post(f"{url}/auth/register", json={
+        'email': 'owner@email.com',
+        'password': 'password',
+        'name_first': 'Firstname',
+        'name_last': 'Lastname',
+    }).json()
+
+    c_id = requests.post(f"{url}/channels/create", json={
+        'token': user['token'],
+        'name': 'Channel',
+        'is_public': True,
+    }).json()['channel_id']
+
+    return {
+        'token': user['token'],
+        'c_id': c_id,
+    }
+
+def test_invalid_token(url, channel_with_user):
+    result = requests.get(f"{url}/events/stream", params={'token': token_hash(1)})
+    assert result.status_code == 400
+
+def test_stream_message(url, channel_with_user):
+    owner = channel_with_user
+    stream = requests.get(f"{url}/events/stream", params={'token': owner['token']}, stream=True, timeout=5)
+    assert stream.headers['Content-Type'].startswith('text/event-stream')
+    # Read byte by byte, otherwise requests waits for a full buffer of events
+    lines = stream.iter_lines(chunk_size=1, decode_unicode=True)
+    assert next(lines) == ': connected'
+
+    requests.post(f"{url}/message/send", json={
+        'token': owner['token'],
+        'channel_id': owner['c_id'],
+        'message': 'Hello',
+    })
+
+    # Skip blank lines and comments until the first event has been read
+    received = {}
+    for line in lines:
+        if line.startswith(':'):
+            continue
+        if not line:
+            if received:
+                break
+            continue
+        field, _, value = line.partition(': ')
+        received[field] = value
+    stream.close()
+
+    assert received['event'] == 'message_sent'
+    event = json.loads(received['data'])
+    assert event['message']['message'] == 'Hello'
+    assert event['channel_id'] == owner['c_id']
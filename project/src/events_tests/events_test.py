@@ -0,0 +1,138 @@
+"""
+events_test.py
+
+Fixtures:
+    channel_with_user: registers a user who owns a public channel and subscribes them to events
+
+Test Modules:
+    test_invalid_token: fail case for subscribing with an invalid token
+    test_invalid_subscriber: fail case for an unknown subscriber_id
+    test_message_sent: success case for message_send publishing the message
+    test_not_a_member: success case for users not seeing events from other channels
+    test_message_changes: success case for edit, pin, react and remove events in order
+    test_timeout: success case for no events being returned after the timeout
+    test_unsubscribe: fail case for fetching events after unsubscribing
+    test_listener: success case for a listener being called with the channel and subscribers of each publish
+    test_unheard: success case for a publish no one is listening for not copying the event or locking
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import pytest
+import events
+from events             import events_subscribe, events_next, events_unsubscribe, add_listener, remove_listener
+from error              import AccessError, InputError
+from helper             import token_hash
+from implement.other    import clear
+from implement.auth     import auth_register
+from implement.channels import channels_create
+from implement.message  import message_send, message_edit, message_pin, message_react, message_remove
+
+@pytest.fixture
+def channel_with_user():
+    clear()
+    user = auth_register("owner@email.com", "password", "Firstname", "Lastname")
+    c_id = channels_create(user['token'], "Channel", True)['channel_id']
+    subscriber_id = events_subscribe(user['token'])['subscriber_id']
+
+    return {
+        'u_id': user['u_id'],
+        'token': user['token'],
+        'c_id': c_id,
+        'subscriber_id': subscriber_id,
+    }
+
+def test_invalid_token(channel_with_user):
+    with pytest.raises(AccessError):
+        events_subscribe(token_hash(1))
+
+def test_invalid_subscriber(channel_with_user):
+    with pytest.raises(InputError):
+        events_next(-1, 0)
+
+def test_message_sent(channel_with_user):
+    owner = channel_with_user
+    message_send(owner['token'], owner['c_id'], "Hello")
+
+    events = events_next(owner['subscriber_id'], 1)['events']
+    assert len(events) == 1
+    assert events[0]['type'] == 'message_sent'
+    assert events[0]['channel_id'] == owner['c_id']
+    assert events[0]['message']['message'] == "Hello"
+    assert events[0]['message']['message_id'] == 0
+
+def test_not_a_member(channel_with_user):
+    owner = channel_with_user
+    other = auth_register("other@email.com", "password", "Other", "User")
+    other_subscriber = events_subscribe(other['token'])['subscriber_id']
+
+    message_send(owner['token'], owner['c_id'], "Hello")
+
+    assert events_next(other_subscriber, 0)['events'] == []
+    assert len(events_next(owner['subscriber_id'], 0)['events']) == 1
+
+def test_message_changes(channel_with_user):
+    owner = channel_with_user
+    message_id = message_send(owner['token'], owner['c_id'], "Hello")['message_id']
+    message_edit(owner['token'], message_id, "Edited")
+    message_pin(owner['token'], message_id)
+    message_react(owner['token'], message_id, 1)
+    message_remove(owner['token'], message_id)
+
+    events = events_next(owner['subscriber_id'], 0)['events']
+    assert [event['type'] for event in events] == [
+        'message_sent',
+        'message_edited',
+        'message_pinned',
+        'message_reacted',
+        'message_removed',
+    ]
+    # Each event is a snapshot of the message when it happened
+    assert events[0]['message']['message'] == "Hello"
+    assert events[1]['message']['message'] == "Edited"
+    assert events[4]['message_id'] == message_id
+
+def test_timeout(channel_with_user):
+    assert events_next(channel_with_user['subscriber_id'], 0.1)['events'] == []
+
+def test_unsubscribe(channel_with_user):
+    owner = channel_with_user
+    events_unsubscribe(owner['subscriber_id'])
+    with pytest.raises(InputError):
+        events_next(owner['subscriber_id'], 0)
+
+def test_listener(channel_with_user):
+    owner = channel_with_user
+    calls = []
+
+    def listener(channel_id, subscriber_ids):
+        calls.append((channel_id, subscriber_ids))
+
+    add_listener(listener)
+    try:
+        message_send(owner['token'], owner['c_id'], "Hello")
+    finally:
+        remove_listener(listener)
+    message_send(owner['token'], owner['c_id'], "Not heard")
+
+    # Subscribers left by other tests can be the same u_id, so only this one is checked
+    assert len(calls) == 1
+    assert calls[0][0] == owner['c_id']
+    assert owner['subscriber_id'] in calls[0][1]
+
+def test_unheard(channel_with_user, monkeypatch):
+    owner = channel_with_user
+    monkeypatch.setattr(events, 'subscribers', {})
+    monkeypatch.setattr(events, 'channel_conditions', {})
+    copies = []
+    deepcopy = events.copy.deepcopy
+    monkeypatch.setattr(events.copy, 'deepcopy', lambda fields: copies.append(fields) or deepcopy(fields))
+
+    message_send(owner['token'], owner['c_id'], "Hello")
+    assert copies == []
+    assert events.channel_conditions == {}
+
+    subscriber_id = events_subscribe(owner['token'])['subscriber_id']
+    message_send(owner['token'], owner['c_id'], "Heard")
+    assert len(copies) == 1
+    assert [event['message']['message'] for event in events_next(subscriber_id, 0)['events']] == ["Heard"]
@@ -1,12 +1,18 @@
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
 
-from data   import data
-from error  import AccessError, InputError
-import jwt
-import hashlib
+from data           import data
+from error          import AccessError, InputError
+from passwords      import hash_password
+from tokens         import TokenSigner, InvalidToken
+from contextlib     import contextmanager
+import threading
 
 SECRET = 'shenpai'
+session_tokens = TokenSigner(SECRET)
+
+# The token trusted_token has already validated on this thread
+trusted = threading.local()
 
 
 def token_validator(encoded_jwt):
@@ -20,8 +26,13 @@ def token_validator(encoded_jwt):
         AccessError when no user is found given the token
     """
 
-    encoded_jwt = encoded_jwt.encode('utf-8')
-    decoded_jwt = jwt.decode(encoded_jwt, SECRET, algorithms=['HS256'])
+    if getattr(trusted, 'token', None) == encoded_jwt:
+        return dict(trusted.payload)
+
+    try:
+        decoded_jwt = session_tokens.verify(encoded_jwt)
+    except InvalidToken:
+        raise AccessError("Invalid token")
     
     # Checks if payload user details exists
     for user in data['users']:
@@ -31,6 +42,26 @@ def token_validator(encoded_jwt):
     raise AccessError("Invalid token")
 
 
+@contextmanager
+def trusted_token(encoded_jwt):
+    """
+    trusted_token
+
+    Validates a token once, then until the block ends token_validator returns
+    its payload on this thread without decoding it or scanning the users again
+
+    Raises:
+        AccessError when no user is found given the token
+    """
+
+    payload = token_validator(encoded_jwt)
+    trusted.token, trusted.payload = encoded_jwt, payload
+    try:
+        yield payload
+    finally:
+        trusted.token = trusted.payload = None
+
+
 def token_hash(u_id):
     """
     token_hash
@@ -39,9 +70,7 @@ def token_hash(u_id):
         a hashed jwt token
     """
 
-    encoded_jwt = jwt.encode({"u_id": u_id}, SECRET, algorithm = 'HS256')
-    # Decoded hashed token so it returns a string 
-    return encoded_jwt.decode('utf-8')
+    return session_tokens.sign({"u_id": u_id})
 
 
 def u_id_validator(u_id):
@@ -88,12 +117,10 @@ def password_hash(password):
     password_hash
 
     Returns:
-        A hashed password
+        A salted hash of the password, see passwords.py
     """
 
-    encoded_password = hashlib.sha256(password.encode()).hexdigest()
-
-    return encoded_password
+    return hash_password(password)
 
 
 def channel_validator(channel_id):
@@ -4,11 +4,14 @@ auth.py
 Helper Modules:
     check: Checks if email is valid using method provided in spec
     unique_handle: Checks to see if default generated handle exists
+    registration_error: Checks if a user can be registered, for auth_register and auth_register_bulk
+    bulk_registration_errors: Checks every user for auth_register_bulk
 
 Main Modules:
     auth_login: logs a registered user in
     auth_logout: logs a registered user out
     auth_register: registers a new user 
+    auth_register_bulk: a Flockr owner registers many users at once
     auth_passwordreset_request: sends user a code to reset password through their email
     auth_passwordreset_reset: resets the user's password
 """
@@ -17,8 +20,20 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__
 
 from data               import data
 from error              import InputError, AccessError
-from helper             import token_validator, token_hash, password_hash
-import jwt, smtplib, ssl, re   
+from helper             import token_validator, token_hash, password_hash, is_flockr_owner
+from versions           import bump
+from outbox             import outbox
+from passwords          import verify_password, needs_rehash, hash_passwords
+from tokens             import TokenSigner, InvalidToken
+import re   
+import threading
+
+RESET_SECRET = 'BSOC4THEBOYS'
+reset_codes = TokenSigner(RESET_SECRET)
+
+# Held from checking a new user's email to adding them, so registrations
+# which finish hashing at the same time can't get the same u_id or email
+registration_lock = threading.Lock()
 
 # Checks if email is valid using method provided
 def check(email): 
@@ -40,12 +55,16 @@ def auth_login(email, password):
         a dictionary containing users u_id and their token 
     '''
 
-    password = password_hash(password)
     valid_email = check(email)
     
     if valid_email == True:
         for user in data['users']:
-            if email == user['email'] and password == user['password']:
+            if email == user['email'] and verify_password(password, user['password']):
+                # Legacy sha256 hashes, or hashes made with an older cost, are
+                # replaced now that the password is known
+                if needs_rehash(user['password']):
+                    user['password'] = password_hash(password)
+
                 u_id = user['u_id']
                 email = user['email']
 
@@ -90,70 +109,149 @@ def auth_register(email, password, name_first, name_last):
         a dictionary containing users u_id and their token   
     '''
 
-    valid_email = check(email)  
-    
-    unique_email = True 
-    for user in data['users']:
-        if email == user['email']:
-            unique_email = False
-    
-    pw_len = len(password) >= 6
-    
-    fname_len = 1 <= len(name_first) <= 50
-
-    lname_len = 1 <= len(name_last) <= 50
-
-    if not valid_email:
-        raise InputError("Email entered is not a valid email using the method provided.")
-    elif not unique_email:
-        raise InputError("Email address is already being used by another user.")
-    elif not pw_len:
-        raise InputError("Password entered is less than 6 characters long.")
-    elif not fname_len:
-        raise InputError("name_first not is between 1 and 50 characters inclusively in length.")
-    elif not lname_len:
-        raise InputError("name_last is not between 1 and 50 characters inclusively in length.")
-
-    if not len(data['users']):
-        u_id = 0
-    else: 
-        for user in data['users']:
-            last_u_id = user['u_id']
-            u_id = last_u_id + 1
-    handle = name_first.lower() + name_last.lower()
-
-    # Checks to see if concatenation of first and last name already exists
-    # If it does, add the u_id to start of handle to make it unique.
-    if not unique_handle(handle):
-        handle = str(u_id) + name_first.lower() + name_last.lower()
-    handle = handle[:20]
-
-    # Determine if Flockr owner or not, first user is Flockr Owner
-    permission_id = 2
-    if u_id == 0:
-        permission_id = 1
-
-    # Hash the password after completing password checks for the user
+    emails = {user['email'] for user in data['users']}
+    error = registration_error(email, password, name_first, name_last, emails)
+    if error:
+        raise InputError(error)
+
+    # Hash the password after completing password checks for the user, it
+    # waits on the KDF workers so is done before the user is allocated
     password = password_hash(password)
 
-    new_user = {
-            'u_id': u_id,
-            'email': email,
-            'handle_str': handle,
-            'password': password,
-            'name_first': name_first,
-            'name_last': name_last,
-            'profile_img_url': 'default.jpg',
-            'permission_id': permission_id,
-        }
-    new_user_copy = new_user.copy()
-    data['users'].append(new_user_copy)
+    with registration_lock:
+        # Checked again, another user may have registered the email while hashing
+        if any(user['email'] == email for user in data['users']):
+            raise InputError("Email address is already being used by another user.")
+
+        if not len(data['users']):
+            u_id = 0
+        else: 
+            for user in data['users']:
+                last_u_id = user['u_id']
+                u_id = last_u_id + 1
+        handle = name_first.lower() + name_last.lower()
+
+        # Checks to see if concatenation of first and last name already exists
+        # If it does, add the u_id to start of handle to make it unique.
+        if not unique_handle(handle):
+            handle = str(u_id) + name_first.lower() + name_last.lower()
+        handle = handle[:20]
+
+        # Determine if Flockr owner or not, first user is Flockr Owner
+        permission_id = 2
+        if u_id == 0:
+            permission_id = 1
+
+        new_user = {
+                'u_id': u_id,
+                'email': email,
+                'handle_str': handle,
+                'password': password,
+                'name_first': name_first,
+                'name_last': name_last,
+                'profile_img_url': 'default.jpg',
+                'permission_id': permission_id,
+            }
+        new_user_copy = new_user.copy()
+        data['users'].append(new_user_copy)
+        bump('users')
 
     return {
         'u_id': u_id,
         'token': token_hash(u_id),
     }
 
+# Returns why a user can't be registered, or None if they can
+def registration_error(email, password, name_first, name_last, emails):
+    if not check(email):
+        return "Email entered is not a valid email using the method provided."
+    elif email in emails:
+        return "Email address is already being used by another user."
+    elif len(password) < 6:
+        return "Password entered is less than 6 characters long."
+    elif not 1 <= len(name_first) <= 50:
+        return "name_first not is between 1 and 50 characters inclusively in length."
+    elif not 1 <= len(name_last) <= 50:
+        return "name_last is not between 1 and 50 characters inclusively in length."
+    return None
+
+# Raises InputError for the first user in users who can't be registered
+def bulk_registration_errors(users):
+    emails = {user['email'] for user in data['users']}
+    for index, user in enumerate(users):
+        try:
+            error = registration_error(user['email'], user['password'], user['name_first'], user['name_last'], emails)
+        except (KeyError, TypeError):
+            error = "needs email, password, name_first and name_last"
+        if error:
+            raise InputError(f"User {index}: {error}")
+        emails.add(user['email'])
+
+def auth_register_bulk(token, users):
+    '''
+    auth_register_bulk
+
+    Every user is validated before any are added, in one pass over the
+    existing emails and handles, and the u_ids are allocated as a block.
+    The passwords are hashed first, the checks are repeated and the users
+    added under registration_lock once they are.
+
+    Args:
+        token: authorises user, who must be a Flockr owner
+        users: a list of {'email', 'password', 'name_first', 'name_last'}
+
+    Returns:
+        users: a list of {'u_id', 'token'}, in the same order
+
+    Raises:
+        AccessError when token is invalid
+        AccessError when the authorised user is not a Flockr owner
+        InputError when any user could not be registered with auth_register,
+        or two of them have the same email
+    '''
+    owner = token_validator(token)
+    if not is_flockr_owner(token, owner['u_id']):
+        raise AccessError("The authorised user is not a Flockr owner")
+    if not isinstance(users, list):
+        raise InputError("users must be a list")
+
+    bulk_registration_errors(users)
+
+    # Hashed across every KDF worker at once rather than one after another
+    passwords = hash_passwords([user['password'] for user in users])
+
+    with registration_lock:
+        # Checked again, other users may have registered while hashing
+        bulk_registration_errors(users)
+
+        first_u_id = data['users'][-1]['u_id'] + 1
+        handles = {user['handle_str'] for user in data['users']}
+
+        new_users = []
+        for u_id, user, password in zip(range(first_u_id, first_u_id + len(users)), users, passwords):
+            handle = user['name_first'].lower() + user['name_last'].lower()
+            if handle in handles:
+                handle = str(u_id) + handle
+            handle = handle[:20]
+            handles.add(handle)
+
+            new_users.append({
+                'u_id': u_id,
+                'email': user['email'],
+                'handle_str': handle,
+                'password': password,
+                'name_first': user['name_first'],
+                'name_last': user['name_last'],
+                'profile_img_url': 'default.jpg',
+                'permission_id': 2,
+            })
+        data['users'].extend(new_users)
+        bump('users')
+
+    return {
+        'users': [{'u_id': user['u_id'], 'token': token_hash(user['u_id'])} for user in new_users],
+    }
+
 # Checks to see if default generated handle exists
 def unique_handle(handle):
     for user in data['users']:
@@ -179,25 +277,16 @@ def auth_passwordreset_request(email):
     if not email_exists:
         return {}        
 
-    SECRET = 'BSOC4THEBOYS'
-    encoded_jwt = jwt.encode({"email": email}, SECRET, algorithm = 'HS256')
-    code = encoded_jwt.decode('utf-8')
+    code = reset_codes.sign({"email": email})
 
-    port = 465  
-    smtp_server = "smtp.gmail.com"
-    sender_email = "1531mangoteam3@gmail.com"  
-    receiver_email = email
-    password = 'wz"b9Tu@}gCWF_+F'
     message = f"""\
 Subject: Your Flockr Password Reset Code
 
 Use this code to reset your Flockr account password:
 {code}"""
 
-    context = ssl.create_default_context()
-    with smtplib.SMTP_SSL(smtp_server, port, context=context) as server:
-        server.login(sender_email, password)
-        server.sendmail(sender_email, receiver_email, message)
+    # Sent by the outbox's worker, so the request doesn't wait on the SMTP server
+    outbox.send(email, message)
 
     return {}
 
@@ -216,9 +305,10 @@ def auth_passwordreset_reset(reset_code, new_password):
         InputError when the new password is not valid (less than six characters)
     '''
 
-    SECRET = 'BSOC4THEBOYS'
-    encoded_jwt = reset_code.encode('utf-8')
-    decoded_jwt = jwt.decode(encoded_jwt, SECRET, algorithms=['HS256'])
+    try:
+        decoded_jwt = reset_codes.verify(reset_code)
+    except InvalidToken:
+        raise InputError("Reset Code is not a valid reset code")
 
     pw_length = len(new_password) > 6
 
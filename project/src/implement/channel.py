@@ -3,14 +3,18 @@ channel.py
 
 Main Modules:
     channel_invite: invites a user to a channel
+    channel_invite_bulk: invites many users to a channel at once
     channel_details: returns a channel's details
     channel_messages: retrieves 50 messages from a channel
+    channel_messages_since: retrieves the messages sent after a given message, waiting for one if there are none
     channel_leave: makes a user leave a channel
 """
 
 from data               import data
 from error              import InputError, AccessError
 from helper             import token_validator, u_id_validator, is_flockr_owner, channel_validator
+from events             import wait_for_channel
+from versions           import bump
 from implement.auth     import auth_register, auth_login
 from implement.channels import channels_create, channels_list, channels_listall
 
@@ -43,6 +47,51 @@ def channel_invite(token, channel_id, u_id):
             else: 
             # user is not in the channel and it is safe to invite and add the user
                 channel['all_members'].append(u_id)
+    bump('channels')
+
+    return {
+    }
+
+def channel_invite_bulk(token, channel_id, u_ids):
+    """
+    channel_invite_bulk
+
+    Every u_id is checked against one set of the users and the channel's
+    members before any are added, so the channel is changed once.
+
+    Args:
+        token: authorises user
+        channel_id: to specify the channel to invite users to
+        u_ids: a list of the users to invite
+
+    Returns:
+        empty dictionary {}
+
+    Raises:
+        InputError when a u_id is not a user, or is in u_ids twice
+        AccessError when a user is already in the channel
+        AccessError when token is invalid
+    """
+
+    token_validator(token)
+    channel_validator(channel_id)
+    if not isinstance(u_ids, list):
+        raise InputError("u_ids must be a list")
+
+    channel = next(channel for channel in data['channels'] if channel['channel_id'] == channel_id)
+    users = {user['u_id'] for user in data['users']}
+    members = set(channel['all_members'])
+
+    if len(set(u_ids)) != len(u_ids):
+        raise InputError("A user is invited more than once.")
+    for u_id in u_ids:
+        if u_id not in users:
+            raise InputError("Invalid User ID.")
+        if u_id in members:
+            raise AccessError("User is already in the channel.")
+
+    channel['all_members'].extend(u_ids)
+    bump('channels')
 
     return {
     }
@@ -205,6 +254,62 @@ def channel_messages(token, channel_id, start):
         'end': end
     }
 
+# The longest a client can be kept waiting by channel_messages_since
+MAX_WAIT = 30
+
+# Assumption: messages are compared by their position in the channel, since a
+#             message_sendlater message can arrive after messages with larger ids
+def channel_messages_since(token, channel_id, message_id, timeout):
+    """
+    channel_messages_since
+
+    Args:
+        token: authorises user
+        channel_id: to specify the channel to retrieve messages from
+        message_id: the last message the user has seen, or -1 for none
+        timeout: how long to wait (in seconds, at most 30) when there are no new messages
+
+    Returns:
+        a dictionary of the messages after message_id, oldest first, and the
+        last_message_id to pass in next time
+
+    Raises:
+        AccessError when user is not a member of given channel
+        AccessError when token is invalid
+        InputError when channel_id is not a valid channel
+    """
+
+    user = token_validator(token)
+    channel_validator(channel_id)
+
+    for channel in data['channels']:
+        if channel_id == channel['channel_id']:
+            break
+
+    if user['u_id'] not in channel['all_members']:
+        raise AccessError("Authorised user is not a member of channel.")
+
+    def newer_messages():
+        messages = channel['messages']
+        for position in range(len(messages) - 1, -1, -1):
+            if messages[position]['message_id'] == message_id:
+                return messages[position + 1:]
+        # The last seen message was removed, or none has been seen yet
+        return [message for message in messages if message['message_id'] > message_id]
+
+    timeout = min(max(timeout, 0), MAX_WAIT)
+    fetched_messages = wait_for_channel(channel_id, newer_messages, timeout)
+
+    if not fetched_messages:
+        return {
+            'messages': [],
+            'last_message_id': message_id,
+        }
+
+    return {
+        'messages': fetched_messages,
+        'last_message_id': fetched_messages[-1]['message_id'],
+    }
 
 def channel_leave(token, channel_id):
     """
@@ -236,6 +341,7 @@ def channel_leave(token, channel_id):
                     channel['owner_members'].remove(user['u_id'])
             else:
                 raise AccessError("Authorised user is not a member of the channel.")
+    bump('channels')
 
     return {}
 
@@ -274,6 +380,7 @@ def channel_join(token, channel_id):
                     raise AccessError("The user is already in the channel.")
             else:
                 raise AccessError("Channel ID refers to a channel that is private.")
+    bump('channels')
 
     return {}
 
@@ -311,6 +418,7 @@ def channel_addowner(token, channel_id, u_id):
 
                     # Now it is safe to add the user to the channel
                     channel['owner_members'].append(u_id)
+                    bump('channels')
 
                 else: 
                     raise InputError("User is already an owner.")
@@ -357,6 +465,7 @@ def channel_removeowner(token, channel_id, u_id):
 
                     # It is now safe to remove the 'channel_departee'
                     channel['owner_members'].remove(channel_departee)
+                    bump('channels')
 
                 else:
                     raise InputError("The user that is being removed is not an owner.")
@@ -15,6 +15,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__
 from data           import data
 from helper         import token_validator
 from error          import InputError
+from versions       import bump
 
 def new_channel_id():
     if not len(data['channels']):
@@ -116,6 +117,7 @@ def channels_create(token, name, is_public):
             'messages': []
         }
     )
+    bump('channels')
 
     return {
         'channel_id': channel_id
@@ -9,6 +9,7 @@ Main Modules:
     message_unpin: owner unpins a pinned message in a channel
     message_react: user reacts a specific message in a channel they are a member of
     message_unreact: user removes a react they have placed on a specific message
+    message_import_bulk: a Flockr owner imports many messages at once, e.g. history from another chat
 
 Helper Modules:
     queue_message: appends a message to the channel at a later time with a prepared message_id
@@ -18,7 +19,11 @@ import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
 
 import threading
+import time
 from data               import data
+from allocator          import message_ids
+from events             import publish
+from versions           import bump
 from error              import AccessError, InputError
 from helper             import token_validator, channel_validator, is_flockr_owner
 from datetime           import datetime, timezone
@@ -38,7 +43,7 @@ def message_send(token, channel_id, message):
         raise InputError("Message is empty or contains only whitespace")
 
     # Verify that the sender (token) is in the right channel
-    message_id = data['message_counter']
+    message_id = None
     for channel in data['channels']:
         if channel_id == channel['channel_id']:
             current_time = datetime.utcnow()
@@ -46,7 +51,7 @@ def message_send(token, channel_id, message):
 
             if sender['u_id'] in channel['all_members']:
                 # Append message information into the data
-                data['message_counter'] += 1
+                message_id = message_ids.next_id()
                 channel['messages'].append({
                     'message_id': message_id, 
                     'u_id': sender['u_id'], 
@@ -61,6 +66,8 @@ def message_send(token, channel_id, message):
                     ],
                     'is_pinned': False,
                 })
+                bump('messages')
+                publish(channel, 'message_sent', message=channel['messages'][-1])
             else:
                 raise AccessError("The authorised user has not joined the channel \
                                    that they are are trying to post to.")
@@ -84,6 +91,8 @@ def message_remove(token, message_id):
                 # Remover is authorised if they are either the sender of the message or they are the owner of the channel
                 if remover['u_id'] == message_find['u_id'] or remover['u_id'] in channel['owner_members'] or is_flockr_owner(token, remover['u_id']):
                     del channel['messages'][message_id]
+                    bump('messages')
+                    publish(channel, 'message_removed', message_id=message_id)
                     return {}
                 else:
                     raise AccessError("Sorry, you are neither the owner of the channel or creator of the message")
@@ -120,9 +129,13 @@ def message_edit(token, message_id, message):
         if len(new_message) == 0:
             # The entire message including its details is deleted
             del channel['messages'][message_id]
+            bump('messages')
+            publish(channel, 'message_removed', message_id=message_id)
         else:
             # The message in data is replaced with the new message
             curr_message['message'] = new_message
+            bump('messages')
+            publish(channel, 'message_edited', message=curr_message)
     else:
         raise AccessError("The message_id does not match the message you are trying to edit.")
 
@@ -145,6 +158,8 @@ def message_pin(token, message_id):
             if pinner in channel['all_members'] or is_flockr_owner(token, pinner):
                 if pinner in channel['owner_members'] or is_flockr_owner(token, pinner):
                     message['is_pinned'] = True
+                    bump('messages')
+                    publish(channel, 'message_pinned', message=message)
                 else:
                     raise AccessError("Authorised user is not an owner")
             else:
@@ -174,6 +189,8 @@ def message_unpin(token, message_id):
             if unpinner in channel['all_members'] or is_flockr_owner(token, unpinner):
                 if unpinner in channel['owner_members'] or is_flockr_owner(token, unpinner):
                     message['is_pinned'] = False
+                    bump('messages')
+                    publish(channel, 'message_unpinned', message=message)
                 else:
                     raise AccessError("Authorised user is not an owner")
             else:
@@ -213,6 +230,8 @@ def message_react(token, message_id, react_id):
                 react['react_id'] = react_id
                 react['u_ids'].append(user['u_id'])
                 react['is_this_user_reacted'] = True
+                bump('messages')
+                publish(channel, 'message_reacted', message=current_message)
             else:
                 raise InputError("The message with ID message_id already has an active react_id by the same user with ID u_id")
     else:
@@ -244,6 +263,8 @@ def message_unreact(token, message_id, react_id):
             if user['u_id'] in react['u_ids']:
                 react['u_ids'].remove(user['u_id'])
                 react['is_this_user_reacted'] = False
+                bump('messages')
+                publish(channel, 'message_unreacted', message=current_message)
             else:
                 raise InputError("You have not reacted this message yet")
     else:
@@ -297,7 +318,7 @@ def message_sendlater(token, channel_id, message, time_sent):
                                    that they are are trying to post to.")
 
     # Assign the message_id to be used for the queued up message
-    message_id = data['message_counter']
+    message_id = message_ids.next_id()
 
     # Determine waiting time for the message to be sent
     waiting_time = int(time_sent - current_timestamp)
@@ -307,8 +328,6 @@ def message_sendlater(token, channel_id, message, time_sent):
 
     delay_message.start()
 
-    # Update the message counter for other messages which may be sent
-    data['message_counter'] += 1
     return {
         'message_id': message_id
     }
@@ -338,4 +357,92 @@ def queue_message(sender_u_id, channel_id, message_id, message, time_sent):
                     }
                 ],
                 'is_pinned': False,
-            })
\ No newline at end of file
+            })
+            bump('messages')
+            publish(channel, 'message_sent', message=channel['messages'][-1])
+
+
+def message_import_bulk(token, messages):
+    '''
+    message_import_bulk
+
+    The token is checked and the channels and users are looked up once, then
+    every message is validated before any is imported, so an invalid message
+    leaves the channels as they were. Imported messages get a block of
+    message_ids, keep their time_created and are appended to each channel in
+    time order, after the messages already there, so channel_messages_since
+    returns them like any other new messages. They aren't published one by one,
+    they are history, each channel gets a single messages_imported event.
+
+    Args:
+        token: authorises user, who must be a Flockr owner
+        messages: an iterable of {'channel_id', 'u_id', 'message', 'time_created'}
+
+    Returns:
+        imported: how many messages were imported
+        seconds: how long the import took
+        messages_per_second: the import's throughput
+
+    Raises:
+        AccessError when token is not valid
+        AccessError when the authorised user is not a Flockr owner
+        InputError when a message has an invalid channel_id or u_id, is empty
+        or more than 1000 characters, or its time_created isn't a number,
+        nothing is imported
+    '''
+    start = time.perf_counter()
+
+    owner = token_validator(token)
+    if not is_flockr_owner(token, owner['u_id']):
+        raise AccessError("The authorised user is not a Flockr owner")
+
+    channels = {channel['channel_id']: channel for channel in data['channels']}
+    u_ids = {user['u_id'] for user in data['users']}
+
+    messages = list(messages)
+    for index, record in enumerate(messages):
+        try:
+            channel_id, u_id, message, time_created = (
+                record['channel_id'], record['u_id'], record['message'], record['time_created'])
+        except (KeyError, TypeError):
+            raise InputError(f"Message {index} needs channel_id, u_id, message and time_created")
+        if channel_id not in channels:
+            raise InputError(f"Message {index} has an invalid channel_id")
+        if u_id not in u_ids:
+            raise InputError(f"Message {index} has an invalid u_id")
+        if not isinstance(message, str) or len(message) > 1000 or message == "" or message.isspace():
+            raise InputError(f"Message {index} is empty or more than 1000 characters")
+        if not isinstance(time_created, (int, float)):
+            raise InputError(f"Message {index} has an invalid time_created")
+
+    by_channel = {}
+    for message_id, record in zip(message_ids.lease_block(len(messages)), messages):
+        by_channel.setdefault(record['channel_id'], []).append({
+            'message_id': message_id,
+            'u_id': record['u_id'],
+            'message': record['message'],
+            'time_created': int(record['time_created']),
+            'reacts': [
+                {
+                    'react_id': 0,
+                    'u_ids': [],
+                    'is_this_user_reacted': False
+                }
+            ],
+            'is_pinned': False,
+        })
+
+    for channel_id, new_messages in by_channel.items():
+        new_messages.sort(key=lambda message: message['time_created'])
+        channels[channel_id]['messages'].extend(new_messages)
+        publish(channels[channel_id], 'messages_imported', imported=len(new_messages))
+
+    if messages:
+        bump('messages')
+
+    seconds = time.perf_counter() - start
+    return {
+        'imported': len(messages),
+        'seconds': seconds,
+        'messages_per_second': len(messages) / seconds if seconds else 0,
+    }
@@ -5,13 +5,17 @@ Main Modules:
     clear: resets the internal data of the application to its inititial state
     users_all: returns all users in the data
     search: Returns a collection of messages in all of the channels that the user has joined that match a given query
+    admin_check: checks the user is a Flockr owner, for admin routes which don't change the data
 """
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
 
 from data               import data
+from allocator          import message_ids
+from versions           import bump
 from helper             import token_validator, u_id_validator, is_flockr_owner
 from implement.channels           import channels_list
+from implement.user     import photo_jobs, picture_refs, picture_refs_lock
 from error              import AccessError, InputError
 import re
 
@@ -23,6 +27,11 @@ def clear():
     data['users'].clear()
     data['channels'].clear()
     data['message_counter'] = 0
+    message_ids.reset()
+    photo_jobs.clear()
+    with picture_refs_lock:
+        picture_refs.clear()
+    bump('users', 'channels', 'messages')
     pass
 
 def users_all(token):
@@ -97,6 +106,27 @@ def admin_userpermission_change(token, u_id, permission_id):
     for user in data['users']:
         if user['u_id'] == u_id:
             user['permission_id'] = permission_id
+    bump('users')
+
+def admin_check(token):
+    """
+    admin_check
+
+    Args:
+        token: authorises user
+
+    Returns:
+        u_id of the Flockr owner
+
+    Raises:
+        AccessError when token is not valid or the user is not a Flockr owner
+    """
+
+    user = token_validator(token)
+    if not is_flockr_owner(token, user['u_id']):
+        raise AccessError("The authorised user is not a Flockr owner")
+
+    return {'u_id': user['u_id']}
 
 def search(token, query_str):
     '''
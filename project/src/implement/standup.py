@@ -14,6 +14,9 @@ import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
 
 from data               import data
+from allocator          import message_ids
+from events             import publish
+from versions           import bump
 from helper             import channel_validator, token_validator
 from implement.message            import message_send
 from error              import AccessError, InputError
@@ -92,19 +95,20 @@ def thread_standup(token, channel_id, length):
     if not packed_message:
         # time_finish is reset after the channel standup is done
         channel['time_finish'] = None
+        bump('channels')
+        publish(channel, 'standup_finished', message=None)
 
         return
     
     # message_send is not used as the check for the message length needs to be ignored
     # since the packed message contains 'unecessary characters' such as the handle_str
     sender = token_validator(token)
-    message_id = data['message_counter']
+    message_id = message_ids.next_id()
 
     # time_finish is reset after the channel standup is done
     channel['time_finish'] = None
 
     # Append standup message into the data
-    data['message_counter'] += 1
     channel['messages'].append({
         'message_id': message_id, 
         'u_id': sender['u_id'], 
@@ -119,6 +123,8 @@ def thread_standup(token, channel_id, length):
         ],
         'is_pinned': False,
     })
+    bump('channels', 'messages')
+    publish(channel, 'standup_finished', message=channel['messages'][-1])
 
     return {
         'message_id': message_id,
@@ -153,6 +159,8 @@ def standup_start(token, channel_id, length):
     for channel in data['channels']:
         if channel['channel_id'] == channel_id:
             channel['time_finish'] = time_finish
+            bump('channels')
+            publish(channel, 'standup_started', time_finish=time_finish)
     
     return {
         'time_finish': time_finish
@@ -7,25 +7,66 @@ Main Modules:
     user_profile_setemail: Updates an authorised user's email address.
     user_profile_sethandle: Updates an authorised user's handle.
     user_profile_uploadphoto: Uploads an authorised user's profile picture.
+    user_profile_uploadphoto_async: Queues an upload of an authorised user's profile picture.
+    user_profile_uploadphoto_status: Returns whether a queued upload has finished.
     user_profile_getphoto: Retrieves target photo from url
+
+Helper Modules:
+    check_crop: checks a crop is within an image's dimensions
+    fetch_image: streams an image from a url into a file, checking it as it arrives
+    process_photo: fetches, checks, crops and stores a profile picture and gives it to a user
+    collect_pictures: removes the stored pictures no user has, run every PICTURE_GC_INTERVAL
 """
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
 
 import re 
 import os
-import imgspy
+import time
+import itertools
+import tempfile
+import threading
 import requests
-import urllib.request
+from collections    import Counter
+from concurrent.futures import ThreadPoolExecutor
 from PIL            import Image
-import uuid 
 
 from data           import data
 from error          import InputError
 from helper         import token_validator, u_id_validator
+from versions       import bump
+from jpeg           import jpeg_size
+from pictures       import store_picture, collect_garbage
 
 IMG_LOCATION = f"{os.getcwd()}/src/profile_pictures"
 
+# Images are downloaded in chunks this size, giving up on a server this slow (in seconds)
+FETCH_CHUNK_SIZE = 64 * 1024
+FETCH_TIMEOUT = 10
+
+# Uploads bigger than this (in bytes) are rejected
+MAX_IMAGE_SIZE = int(os.environ.get('FLOCKR_MAX_IMAGE_SIZE', 10 * 1024 * 1024))
+
+# Uploads from user_profile_uploadphoto_async are fetched and cropped on these threads
+photo_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('FLOCKR_PHOTO_WORKERS', 4)),
+                                    thread_name_prefix='photo')
+photo_jobs = {}
+photo_jobs_lock = threading.Lock()
+photo_job_ids = itertools.count()
+MAX_PHOTO_JOBS = 1000
+
+# Jobs still queued or processing can't be forgotten, so each user and the
+# whole server can only have this many waiting for the photo workers
+MAX_PENDING_PHOTO_JOBS = 100
+MAX_PENDING_PHOTO_JOBS_PER_USER = 3
+
+# How many users have each stored picture, pictures no user has are removed
+# by collect_pictures every PICTURE_GC_INTERVAL seconds
+picture_refs = Counter()
+picture_refs_lock = threading.Lock()
+picture_gc = None
+PICTURE_GC_INTERVAL = int(os.environ.get('FLOCKR_PICTURE_GC_INTERVAL', 60 * 60))
+
 def user_profile(token, u_id):
     '''
     user_profile
@@ -96,6 +137,7 @@ def user_profile_setname(token, name_first, name_last):
         if users['u_id'] == user['u_id']:
             users['name_first'] = name_first
             users['name_last'] = name_last
+    bump('users')
 
     return {}
 
@@ -130,6 +172,7 @@ def user_profile_setemail(token, email):
     for users in data['users']:
         if users['u_id'] == user['u_id']:
             users['email'] = email
+    bump('users')
 
     return {}
 
@@ -167,9 +210,144 @@ def user_profile_sethandle(token, handle_str):
     for users in data['users']:
         if users['u_id'] == user['u_id']:
             users['handle_str'] = handle_str
+    bump('users')
 
     return {}
 
+def check_crop(size, x_start, y_start, x_end, y_end):
+    width, height = size
+    if width * height > Image.MAX_IMAGE_PIXELS:
+        raise InputError("Image uploaded is too large.")
+
+    # Verify that the parameters are within image dimensions
+    img_width = range(0, width + 1)
+    img_height = range(0, height + 1)
+
+    if not (x_start in img_width and x_end in img_width
+            and y_start in img_height and y_end in img_height):
+        raise InputError("x_start, y_start, x_end, y_end are not within \
+                          the dimensions of the image at the URL.")
+
+def fetch_image(img_url, download, crop):
+    '''
+    fetch_image
+
+    Streams the image with a single request. Its type and dimensions are read
+    from the first bytes, so a wrong type, a crop outside the image or an
+    image over MAX_IMAGE_SIZE stops the download as soon as it is known.
+
+    Args:
+        img_url: the url of the image
+        download: an open binary file the image is streamed into
+        crop: (x_start, y_start, x_end, y_end), checked against the dimensions
+
+    Raises:
+        InputError when img_url can't be fetched or returns an HTTP status other than 200
+        InputError when the image is not a JPG or is bigger than MAX_IMAGE_SIZE
+        InputError when the crop is not within the dimensions of the image
+    '''
+    try:
+        with requests.get(img_url, stream=True, timeout=FETCH_TIMEOUT) as response:
+            if response.status_code != 200:
+                raise InputError("The image url returned a HTTP status other than 200.")
+            if int(response.headers.get('Content-Length') or 0) > MAX_IMAGE_SIZE:
+                raise InputError("Image uploaded is too large.")
+
+            head = b''
+            size = None
+            received = 0
+            for chunk in response.iter_content(FETCH_CHUNK_SIZE):
+                received += len(chunk)
+                if received > MAX_IMAGE_SIZE:
+                    raise InputError("Image uploaded is too large.")
+
+                if size is None:
+                    head += chunk
+                    try:
+                        size = jpeg_size(head)
+                    except ValueError:
+                        raise InputError("Image uploaded is not a JPG.")
+                    if size:
+                        check_crop(size, *crop)
+                        head = None
+
+                download.write(chunk)
+    except requests.RequestException:
+        raise InputError("The image url returned a HTTP status other than 200.")
+
+    if size is None:
+        raise InputError("Image uploaded is not a JPG.")
+
+def process_photo(u_id, img_url, x_start, y_start, x_end, y_end):
+    '''
+    process_photo
+
+    Fetches the image once, checks and crops it, and then points the user's
+    profile_img_url at it. The cropped image is written under a temporary
+    name and renamed into place, so a profile picture is never seen half written.
+
+    Raises:
+        InputError when img_url returns an HTTP status other than 200.
+        InputError when the image is not a JPG or is too large
+        InputError when any of the parameters are not within the dimensions of the image.
+    '''
+    # The download is spooled to disk, so memory use doesn't grow with the image
+    with tempfile.NamedTemporaryFile(dir=IMG_LOCATION, suffix='.download') as download:
+        fetch_image(img_url, download, (x_start, y_start, x_end, y_end))
+        download.flush()
+
+        try:
+            image = Image.open(download.name)
+            cropped = image.crop((x_start, y_start, x_end, y_end))
+            cropped.load()
+        except (OSError, Image.DecompressionBombError):
+            raise InputError("Image uploaded is not a JPG.")
+
+        profile_img_url = store_picture(cropped, IMG_LOCATION)
+
+    # Add image url to the user's data, moving the user's reference from
+    # their old picture to the new one
+    with picture_refs_lock:
+        for users in data['users']:
+            if users['u_id'] == u_id:
+                old_img_url = users['profile_img_url']
+                users['profile_img_url'] = profile_img_url
+                picture_refs[profile_img_url] += 1
+                if old_img_url in picture_refs:
+                    picture_refs[old_img_url] -= 1
+                    if not picture_refs[old_img_url]:
+                        del picture_refs[old_img_url]
+    bump('users')
+    start_picture_gc()
+
+def collect_pictures():
+    '''
+    collect_pictures
+
+    Returns:
+        how many unreferenced pictures were removed from IMG_LOCATION
+    '''
+    with picture_refs_lock:
+        referenced = set(picture_refs)
+    return collect_garbage(IMG_LOCATION, referenced)
+
+def run_picture_gc():
+    while True:
+        time.sleep(PICTURE_GC_INTERVAL)
+        try:
+            collect_pictures()
+        except OSError as err:
+            print('picture gc', err)
+
+# Until a picture has been uploaded there are no stored pictures to collect,
+# so the collector is started by process_photo rather than at import
+def start_picture_gc():
+    global picture_gc
+    with picture_refs_lock:
+        if picture_gc is None:
+            picture_gc = threading.Thread(target=run_picture_gc, name='picture-gc', daemon=True)
+            picture_gc.start()
+
 def user_profile_uploadphoto(token, img_url, x_start, y_start, x_end, y_end):
     '''
     user_profile_uploadphoto 
@@ -190,47 +368,96 @@ def user_profile_uploadphoto(token, img_url, x_start, y_start, x_end, y_end):
     '''
 
     user = token_validator(token)
+    process_photo(user['u_id'], img_url, x_start, y_start, x_end, y_end)
 
-    # Verify that the img_url is valid
-    r = requests.head(img_url)
-    valid_url = r.status_code == 200
-    if not valid_url:
-        raise InputError("The image url returned a HTTP status other than 200.")
-    
-    # Verify that the image has JPG format
-    image = imgspy.info(img_url)
-    if image['type'] == None or image['type'] != 'jpg':
-        raise InputError("Image uploaded is not a JPG.")
+    return {}
 
-    # Verify that the parameters are within image dimensions
-    # {'type': 'jpg', 'width': 2370, 'height': 1927}
-    img_width = range(0, image['width'] + 1)
-    img_height = range(0, image['height'] + 1)
-
-    if (x_start in img_width and x_end in img_width
-    and y_start in img_height and y_end in img_height):
-        print("valid")
-    else:
-        raise InputError("x_start, y_start, x_end, y_end are not within \
-                          the dimensions of the image at the URL.")
+def run_photo_job(job, args):
+    job['status'] = 'processing'
+    try:
+        process_photo(job['u_id'], *args)
+        job['status'] = 'done'
+    except InputError as err:
+        job['status'] = 'failed'
+        job['error'] = err.description
+    except Exception as err:
+        job['status'] = 'failed'
+        job['error'] = str(err)
+
+def user_profile_uploadphoto_async(token, img_url, x_start, y_start, x_end, y_end):
+    '''
+    user_profile_uploadphoto_async
 
-    # Generate unique image_id using uuid
-    profile_img_url = str(uuid.uuid4())
+    Queues the same work as user_profile_uploadphoto for the photo workers
+    and returns straight away, the profile picture changes when it is done.
 
-    # Download and retrieve the image
-    profile_image = f"{IMG_LOCATION}/{profile_img_url}.jpg"
+    Args:
+        token: authorises user.
+        img_url: The url of the source image is provided.
+        x_start, y_start, x_end, y_end: Image dimensions are specified by the user.
 
-    # Move the image into the appropriate directory
-    urllib.request.urlretrieve(img_url, profile_image)
+    Returns:
+        job_id: for user_profile_uploadphoto_status
 
-    # Crop the image
-    imageObject = Image.open(profile_image)
-    cropped = imageObject.crop((x_start, y_start, x_end, y_end))
-    cropped.save(profile_image)
+    Raises:
+        AccessError when the token is invalid
+        InputError when the user, or the server, already has too many uploads
+        waiting to be processed
+    '''
 
-    # Add image url to the user's data
-    for users in data['users']:
-        if users['u_id'] == user['u_id']:
-            users['profile_img_url'] = profile_img_url + '.jpg'
+    user = token_validator(token)
 
-    return {}
+    with photo_jobs_lock:
+        pending = [job for job in photo_jobs.values() if job['status'] in ('queued', 'processing')]
+        if len(pending) >= MAX_PENDING_PHOTO_JOBS:
+            raise InputError("Too many uploads are being processed, try again later.")
+        if sum(job['u_id'] == user['u_id'] for job in pending) >= MAX_PENDING_PHOTO_JOBS_PER_USER:
+            raise InputError("Wait for your previous uploads to finish before uploading again.")
+
+        # Forget the oldest finished jobs once there are too many
+        finished = [job_id for job_id, job in photo_jobs.items() if job['status'] in ('done', 'failed')]
+        for job_id in finished[:max(0, len(photo_jobs) - MAX_PHOTO_JOBS + 1)]:
+            del photo_jobs[job_id]
+
+        job = {
+            'job_id': next(photo_job_ids),
+            'u_id': user['u_id'],
+            'status': 'queued',
+            'error': None,
+        }
+        photo_jobs[job['job_id']] = job
+
+    photo_executor.submit(run_photo_job, job, (img_url, x_start, y_start, x_end, y_end))
+
+    return {
+        'job_id': job['job_id'],
+    }
+
+def user_profile_uploadphoto_status(token, job_id):
+    '''
+    user_profile_uploadphoto_status
+
+    Args:
+        token: authorises user.
+        job_id: from user_profile_uploadphoto_async
+
+    Returns:
+        job_id, status ('queued', 'processing', 'done' or 'failed') and the
+        error when it failed
+
+    Raises:
+        AccessError when the token is invalid
+        InputError when job_id is not one of the user's upload jobs
+    '''
+
+    user = token_validator(token)
+
+    job = photo_jobs.get(job_id)
+    if job is None or job['u_id'] != user['u_id']:
+        raise InputError("job_id is not a valid upload.")
+
+    return {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'error': job['error'],
+    }
@@ -0,0 +1,72 @@
+"""
+jpeg.py
+    - reads the dimensions of a JPEG from the first bytes of the file, so an
+      upload can be rejected before the rest of it is downloaded
+
+Main Modules:
+    jpeg_size: returns (width, height) from the start of a JPEG
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+# Start of frame markers, which hold the dimensions. 0xC4 (DHT), 0xC8 (JPG)
+# and 0xCC (DAC) are in the same range but are not frames
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# Markers with no length after them
+STANDALONE_MARKERS = set(range(0xD0, 0xD8)) | {0x01}
+
+START_OF_SCAN = 0xDA
+
+def jpeg_size(head):
+    '''
+    jpeg_size
+
+    Args:
+        head: the first bytes of the file, as many as have been downloaded
+
+    Returns:
+        (width, height), or None if more of the file is needed to find them
+
+    Raises:
+        ValueError when the file is not a JPEG
+    '''
+    if len(head) < 3:
+        if not b'\xff\xd8\xff'.startswith(head):
+            raise ValueError("Not a JPEG")
+        return None
+    if not head.startswith(b'\xff\xd8\xff'):
+        raise ValueError("Not a JPEG")
+
+    position = 2
+    while True:
+        if position >= len(head):
+            return None
+        if head[position] != 0xFF:
+            raise ValueError("Not a JPEG")
+
+        # Markers can be padded with any number of 0xFF bytes
+        while position < len(head) and head[position] == 0xFF:
+            position += 1
+        if position >= len(head):
+            return None
+
+        marker = head[position]
+        position += 1
+        if marker in STANDALONE_MARKERS:
+            continue
+        if marker == START_OF_SCAN:
+            raise ValueError("JPEG has no frame before its image data")
+
+        if position + 2 > len(head):
+            return None
+        length = int.from_bytes(head[position:position + 2], 'big')
+
+        if marker in SOF_MARKERS:
+            if position + 7 > len(head):
+                return None
+            height = int.from_bytes(head[position + 3:position + 5], 'big')
+            width = int.from_bytes(head[position + 5:position + 7], 'big')
+            return width, height
+
+        position += length
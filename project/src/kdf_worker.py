@@ -0,0 +1,39 @@
+"""
+kdf_worker.py
+    - a worker process for passwords.py's pool. It only imports passwords.py,
+      not the server which started it, derives one key per line it reads on
+      stdin and exits when stdin is closed, which happens when the server
+      shuts the pool down or dies
+
+Usage:
+    started by passwords.py as python3 src/kdf_worker.py, each line in is
+    {"kdf": ..., "params": [...], "password": hex, "salt": hex} and each line
+    out is {"key": hex} or {"error": message}
+
+Main Modules:
+    main: answers requests until stdin is closed
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import json
+import signal
+from passwords import derive
+
+def main():
+    # Ctrl-C reaches the whole process group, the server stops its workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            key = derive(request['kdf'], tuple(request['params']),
+                         bytes.fromhex(request['password']), bytes.fromhex(request['salt']))
+            reply = {'key': key.hex()}
+        except ValueError as err:
+            reply = {'error': str(err)}
+        sys.stdout.write(json.dumps(reply) + '\n')
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
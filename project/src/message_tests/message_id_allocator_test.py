@@ -0,0 +1,75 @@
+'''
+message_id_allocator_test.py
+
+Test Modules:
+    test_sequential_ids: success case for ids being handed out in order
+    test_ids_unique_across_threads: success case for many threads allocating at once
+    test_block_leasing: success case for a custom lease only being called once per block
+    test_lease_block: success case for reserving a contiguous range of ids
+    test_clear_resets_ids: success case for ids starting from 0 again after clear
+'''
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import threading
+from allocator      import IdAllocator, message_ids
+from data           import data
+from implement.other          import clear
+from implement.auth           import auth_register
+from implement.channels       import channels_create
+from implement.message        import message_send
+
+def test_sequential_ids():
+    clear()
+    assert [message_ids.next_id() for _ in range(5)] == [0, 1, 2, 3, 4]
+    assert data['message_counter'] == 5
+
+def test_ids_unique_across_threads():
+    clear()
+    allocated = []
+
+    def allocate():
+        ids = [message_ids.next_id() for _ in range(1000)]
+        allocated.extend(ids)
+
+    threads = [threading.Thread(target=allocate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(allocated) == list(range(8000))
+
+def test_block_leasing():
+    leases = []
+    shared_counter = [100]
+
+    def lease(size):
+        leases.append(size)
+        start = shared_counter[0]
+        shared_counter[0] += size
+        return start
+
+    allocator = IdAllocator('message_counter', block_size=10, lease=lease)
+    ids = [allocator.next_id() for _ in range(25)]
+
+    assert ids == list(range(100, 125))
+    assert leases == [10, 10, 10]
+
+def test_lease_block():
+    clear()
+    message_ids.next_id()
+    assert message_ids.lease_block(3) == range(1, 4)
+    assert message_ids.next_id() == 4
+
+def test_clear_resets_ids():
+    clear()
+    token = auth_register("owner@email.com", "password", "Firstname", "Lastname")['token']
+    c_id = channels_create(token, "Channel", True)['channel_id']
+    assert message_send(token, c_id, "First")['message_id'] == 0
+    assert message_send(token, c_id, "Second")['message_id'] == 1
+
+    clear()
+    token = auth_register("owner@email.com", "password", "Firstname", "Lastname")['token']
+    c_id = channels_create(token, "Channel", True)['channel_id']
+    assert message_send(token, c_id, "First")['message_id'] == 0
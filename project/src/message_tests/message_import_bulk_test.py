@@ -0,0 +1,142 @@
+'''
+message_import_bulk_test.py
+
+Fixtures:
+    owner_and_channel: the flockr owner and another user are registered, and
+                       the other user owns a channel
+
+Test Modules:
+    - Failure Cases:
+    test_invalid_token: Raises an AccessError for an invalid token.
+    test_not_flockr_owner: Raises an AccessError if the authorised user is not a Flockr owner.
+    test_invalid_message: Raises an InputError for an invalid channel_id, u_id, message or time_created.
+
+    - Success Cases:
+    test_import: Imported messages keep their sender and time, and are returned by channel_messages
+    test_append: Imported history is appended after a channel's existing messages, in time order
+    test_unique_ids: Messages from any iterable are imported with unique message_ids
+    test_nothing_imported: Nothing is imported when any message is invalid
+    test_since: channel_messages_since returns imported messages, and wakes for them
+'''
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import time
+import pytest
+import threading
+from error          import InputError, AccessError
+from implement.other          import clear
+from implement.auth           import auth_register
+from implement.channels       import channels_create
+from implement.channel        import channel_messages, channel_messages_since
+from helper         import token_hash
+from implement.message        import message_send, message_import_bulk
+
+@pytest.fixture
+def owner_and_channel():
+    clear()
+    flockr_owner = auth_register("flockrowner@email.com", "password", "John", "Doe")
+    user = auth_register("owner@email.com", "password", "Firstname", "Lastname")
+    c_id = channels_create(user['token'], "Channel", True)
+
+    return {
+        'token': flockr_owner['token'],
+        'user': user,
+        'c_id': c_id['channel_id'],
+    }
+
+def record(owner_and_channel, message, time_created):
+    return {
+        'channel_id': owner_and_channel['c_id'],
+        'u_id': owner_and_channel['user']['u_id'],
+        'message': message,
+        'time_created': time_created,
+    }
+
+def test_invalid_token(owner_and_channel):
+    with pytest.raises(AccessError):
+        message_import_bulk(token_hash(5), [])
+
+def test_not_flockr_owner(owner_and_channel):
+    with pytest.raises(AccessError):
+        message_import_bulk(owner_and_channel['user']['token'], [])
+
+def test_invalid_message(owner_and_channel):
+    for invalid in [
+        dict(record(owner_and_channel, "Hello", 100), channel_id=10),
+        dict(record(owner_and_channel, "Hello", 100), u_id=10),
+        record(owner_and_channel, "", 100),
+        record(owner_and_channel, "a" * 1001, 100),
+        record(owner_and_channel, "Hello", "yesterday"),
+        {'message': "Hello"},
+    ]:
+        with pytest.raises(InputError):
+            message_import_bulk(owner_and_channel['token'], [invalid])
+
+    messages = channel_messages(owner_and_channel['user']['token'], owner_and_channel['c_id'], 0)
+    assert messages['messages'] == []
+
+def test_import(owner_and_channel):
+    result = message_import_bulk(owner_and_channel['token'], [
+        record(owner_and_channel, "Second", 200),
+        record(owner_and_channel, "First", 100),
+    ])
+    assert result['imported'] == 2
+    assert result['messages_per_second'] > 0
+
+    messages = channel_messages(owner_and_channel['user']['token'], owner_and_channel['c_id'], 0)['messages']
+    assert [message['message'] for message in messages] == ["First", "Second"]
+    assert [message['time_created'] for message in messages] == [100, 200]
+    assert all(message['u_id'] == owner_and_channel['user']['u_id'] for message in messages)
+
+def test_append(owner_and_channel):
+    message_send(owner_and_channel['user']['token'], owner_and_channel['c_id'], "Sent now")
+    message_import_bulk(owner_and_channel['token'], [
+        record(owner_and_channel, "Newer", 200),
+        record(owner_and_channel, "Old", 100),
+    ])
+
+    messages = channel_messages(owner_and_channel['user']['token'], owner_and_channel['c_id'], 0)['messages']
+    assert [message['message'] for message in messages] == ["Sent now", "Old", "Newer"]
+
+def test_unique_ids(owner_and_channel):
+    records = (record(owner_and_channel, f"Message {i}", i) for i in range(10))
+
+    assert message_import_bulk(owner_and_channel['token'], records)['imported'] == 10
+    message_id = message_send(owner_and_channel['user']['token'], owner_and_channel['c_id'], "After")['message_id']
+
+    messages = channel_messages(owner_and_channel['user']['token'], owner_and_channel['c_id'], 0)['messages']
+    assert len(messages) == 11
+    assert len({message['message_id'] for message in messages}) == 11
+    assert messages[-1]['message_id'] == message_id
+
+def test_nothing_imported(owner_and_channel):
+    records = [record(owner_and_channel, f"Message {i}", i) for i in range(5)] + [record(owner_and_channel, "", 5)]
+
+    with pytest.raises(InputError):
+        message_import_bulk(owner_and_channel['token'], records)
+
+    messages = channel_messages(owner_and_channel['user']['token'], owner_and_channel['c_id'], 0)['messages']
+    assert messages == []
+
+def test_since(owner_and_channel):
+    user = owner_and_channel['user']
+    last = message_send(user['token'], owner_and_channel['c_id'], "Sent now")['message_id']
+
+    # History older than the last message seen still comes after it
+    message_import_bulk(owner_and_channel['token'], [record(owner_and_channel, "Old", 100)])
+    result = channel_messages_since(user['token'], owner_and_channel['c_id'], last, 0)
+    assert [message['message'] for message in result['messages']] == ["Old"]
+
+    waited = {}
+    def wait():
+        waited.update(channel_messages_since(user['token'], owner_and_channel['c_id'], result['last_message_id'], 10))
+    waiter = threading.Thread(target=wait)
+    started = time.time()
+    waiter.start()
+    time.sleep(0.2)
+    message_import_bulk(owner_and_channel['token'], [record(owner_and_channel, "Older", 50)])
+    waiter.join()
+
+    assert time.time() - started < 5
+    assert [message['message'] for message in waited['messages']] == ["Older"]
@@ -0,0 +1,237 @@
+"""
+metrics.py
+    - WSGI middleware which times requests and counts their sizes, and the
+      registry it records them in, rendered for /metrics in Prometheus' text
+      format. The counters are in memory, so with serve.py each worker
+      process reports its own requests
+
+Usage:
+    FLOCKR_METRICS_SAMPLE is the fraction of requests recorded, from 0 (off,
+    requests go straight through) to 1 (every request, the default). The
+    counts are of the sampled requests only
+
+    A sampled request has a record in its environ under RECORD, which
+    server.py fills in with the route and how long the view and encoding
+    took, so the time in implement/ can be told apart from serialization
+
+Helper Modules:
+    Histogram: counts of values in buckets, with their sum
+    Measured: a response's body, recorded once it has been sent
+    escape: escapes a label value
+    labels: formats the labels of one sample
+
+Main Modules:
+    Metrics: the registry, and renders it for /metrics
+    Instrumentation: the middleware, wraps APP.wsgi_app in server.py
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import time
+import random
+import bisect
+import threading
+from collections    import Counter
+
+RECORD = 'flockr.metrics'
+
+# Upper bounds of the histograms' buckets, in seconds and bytes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+# For requests which didn't match a route, so unknown paths don't each get a label
+UNMATCHED = '<unmatched>'
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def labels(**values):
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in values.items()) + '}'
+
+class Metrics:
+    '''
+    Metrics
+
+    Args:
+        sample_rate: the fraction of requests recorded, 0 for none
+    '''
+    def __init__(self, sample_rate=1.0):
+        self.sample_rate = sample_rate
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.durations = {}
+        self.request_sizes = {}
+        self.response_sizes = {}
+        # (route, phase) to [total seconds, requests]
+        self.phases = {}
+
+    def histogram(self, histograms, route, bounds):
+        if route not in histograms:
+            histograms[route] = Histogram(bounds)
+        return histograms[route]
+
+    def observe(self, record):
+        '''
+        Records a finished request, record being the one Instrumentation made for it
+        '''
+        route = record['route'] or UNMATCHED
+        total = record['end'] - record['start']
+
+        phases = {}
+        if record['view'] is not None:
+            phases['implement'] = max(0, record['view'] - record['serialize'])
+            phases['serialize'] = record['serialize']
+            phases['other'] = max(0, total - record['view'])
+
+        with self.lock:
+            self.requests[record['method'], route, record['status']] += 1
+            self.histogram(self.durations, route, LATENCY_BUCKETS).observe(total)
+            self.histogram(self.request_sizes, route, SIZE_BUCKETS).observe(record['request_bytes'])
+            self.histogram(self.response_sizes, route, SIZE_BUCKETS).observe(record['response_bytes'])
+            for phase, seconds in phases.items():
+                totals = self.phases.setdefault((route, phase), [0, 0])
+                totals[0] += seconds
+                totals[1] += 1
+
+    def clear(self):
+        with self.lock:
+            self.requests.clear()
+            self.durations.clear()
+            self.request_sizes.clear()
+            self.response_sizes.clear()
+            self.phases.clear()
+
+    def render(self, others=None):
+        '''
+        render
+
+        Args:
+            others: other values to report, {name: (type, help, value)}
+
+        Returns:
+            every metric in Prometheus' text format
+        '''
+        lines = []
+        def header(name, kind, description):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histograms(name, description, histograms):
+            header(name, 'histogram', description)
+            for route, histogram in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.bounds + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{labels(route=route, le=bound)} {cumulative}")
+                lines.append(f"{name}_sum{labels(route=route)} {histogram.sum}")
+                lines.append(f"{name}_count{labels(route=route)} {cumulative}")
+
+        with self.lock:
+            header('flockr_requests_total', 'counter', "Requests recorded, by route and status")
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f"flockr_requests_total{labels(method=method, route=route, status=status)} {count}")
+
+            histograms('flockr_request_duration_seconds', "Time from a request arriving to its response being sent", self.durations)
+            histograms('flockr_request_size_bytes', "Size of request bodies", self.request_sizes)
+            histograms('flockr_response_size_bytes', "Size of response bodies as sent, after compression", self.response_sizes)
+
+            header('flockr_request_phase_seconds', 'summary',
+                   "Time in implement/ functions, encoding the result, and the rest (routing, compression, sending)")
+            for (route, phase), (seconds, count) in sorted(self.phases.items()):
+                lines.append(f"flockr_request_phase_seconds_sum{labels(route=route, phase=phase)} {seconds}")
+                lines.append(f"flockr_request_phase_seconds_count{labels(route=route, phase=phase)} {count}")
+
+        header('flockr_metrics_sample_rate', 'gauge', "Fraction of requests recorded")
+        lines.append(f"flockr_metrics_sample_rate {self.sample_rate}")
+        for name, (kind, description, value) in (others or {}).items():
+            header(name, kind, description)
+            lines.append(f"{name} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+class Measured:
+    '''
+    Measured
+
+    A response's body, which counts its bytes as they are sent and records the
+    request once the body has been sent or closed, whichever happens first
+    '''
+    def __init__(self, body, record, observe):
+        self.body = body
+        self.record = record
+        self.observe = observe
+
+    def __iter__(self):
+        try:
+            for chunk in self.body:
+                self.record['response_bytes'] += len(chunk)
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            if self.record['end'] is None:
+                self.record['end'] = time.perf_counter()
+                self.observe(self.record)
+
+class Instrumentation:
+    '''
+    Instrumentation
+
+    Args:
+        app: the WSGI application to wrap
+        metrics: the Metrics to record requests in
+    '''
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    def __call__(self, environ, start_response):
+        sample_rate = self.metrics.sample_rate
+        if not sample_rate or (sample_rate < 1 and random.random() >= sample_rate):
+            return self.app(environ, start_response)
+
+        try:
+            request_bytes = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            request_bytes = 0
+        record = environ[RECORD] = {
+            'start': time.perf_counter(),
+            'end': None,
+            'method': environ.get('REQUEST_METHOD'),
+            'route': None,
+            'status': None,
+            'view': None,
+            'serialize': 0,
+            'request_bytes': request_bytes,
+            'response_bytes': 0,
+        }
+
+        def capture(status, headers, exc_info=None):
+            record['status'] = status.split(' ', 1)[0]
+            return start_response(status, headers, exc_info)
+
+        try:
+            body = self.app(environ, capture)
+        except BaseException:
+            record['status'] = record['status'] or '500'
+            record['end'] = time.perf_counter()
+            self.metrics.observe(record)
+            raise
+        return Measured(body, record, self.metrics.observe)
@@ -0,0 +1,172 @@
+"""
+outbox.py
+    - a queue for outgoing email, so a route which sends an email (e.g.
+      auth_passwordreset_request) returns without waiting on an SMTP server.
+      A worker thread keeps one SMTP connection open, sends whatever has been
+      queued on it in batches and retries when the connection fails
+
+Usage:
+    The SMTP server is set with FLOCKR_SMTP_HOST, FLOCKR_SMTP_PORT,
+    FLOCKR_SMTP_SSL (1 or 0), FLOCKR_SMTP_USER, FLOCKR_SMTP_PASSWORD and
+    FLOCKR_SMTP_SENDER, e.g. a local debugging server for tests
+
+Helper Modules:
+    is_permanent: whether an SMTP error will happen again if the email is resent
+
+Main Modules:
+    Outbox: the queue and its worker
+    outbox: the outbox for the SMTP server set in the environment
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from collections    import deque
+
+def is_permanent(err):
+    # 5xx replies, e.g. an unknown recipient, won't succeed if retried
+    if isinstance(err, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(err, smtplib.SMTPResponseException) and err.smtp_code >= 500
+
+class Outbox:
+    '''
+    Outbox
+
+    Args:
+        host, port: the SMTP server
+        use_ssl: whether to connect with SSL (SMTP_SSL) rather than plain SMTP
+        username, password: to log in with, no login when username is empty
+        sender: the address emails are sent from
+        batch_size: the most emails sent before checking the queue again
+        max_attempts: how many times an email is tried before it is given up on
+        retry_delay: the wait (in seconds) before the first retry, doubling each time
+        idle_timeout: the connection is closed after this long (in seconds) with nothing to send
+        max_failed: how many of the emails given up on are kept, the most recent ones
+    '''
+    def __init__(self, host, port, use_ssl=True, username=None, password=None, sender=None,
+                 batch_size=50, max_attempts=5, retry_delay=1, idle_timeout=30, max_failed=100):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.idle_timeout = idle_timeout
+
+        self.queue = queue.Queue()
+        self.connection = None
+        self.worker = None
+        self.worker_lock = threading.Lock()
+
+        # How the outbox has done so far: emails delivered, SMTP connections
+        # opened (a burst of emails should share one), and the emails given up
+        # on, of which only the last max_failed are kept for their details
+        self.sent = 0
+        self.connections = 0
+        self.failed_count = 0
+        self.failed = deque(maxlen=max_failed)
+
+    def send(self, receiver, message):
+        '''
+        send
+
+        Args:
+            receiver: the address to send to
+            message: the email, headers and then the body
+        '''
+        self.queue.put({
+            'receiver': receiver,
+            'message': message,
+            'attempts': 0,
+        })
+
+        # The sending thread only exists once there is something to send, the
+        # server and the tests which never email don't run one
+        with self.worker_lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run, name='outbox', daemon=True)
+                self.worker.start()
+
+    def flush(self):
+        '''
+        Waits until every queued email has been sent or given up on
+        '''
+        self.queue.join()
+
+    def connect(self):
+        if self.use_ssl:
+            self.connection = smtplib.SMTP_SSL(self.host, self.port, context=ssl.create_default_context())
+        else:
+            self.connection = smtplib.SMTP(self.host, self.port)
+        self.connections += 1
+        if self.username:
+            self.connection.login(self.username, self.password)
+
+    def disconnect(self):
+        if self.connection is None:
+            return
+        try:
+            self.connection.quit()
+        except (smtplib.SMTPException, OSError):
+            self.connection.close()
+        self.connection = None
+
+    def run(self):
+        while True:
+            try:
+                batch = [self.queue.get(timeout=self.idle_timeout)]
+            except queue.Empty:
+                self.disconnect()
+                continue
+
+            # Whatever else has been queued is sent on the same connection
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self.deliver(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    def deliver(self, batch):
+        pending = list(batch)
+        while pending:
+            email = pending[0]
+            try:
+                if self.connection is None:
+                    self.connect()
+                self.connection.sendmail(self.sender, email['receiver'], email['message'])
+                self.sent += 1
+                pending.pop(0)
+            except (smtplib.SMTPException, OSError) as err:
+                email['attempts'] += 1
+                if not is_permanent(err):
+                    # The connection may be broken, the next attempt makes a new one
+                    self.disconnect()
+
+                if is_permanent(err) or email['attempts'] >= self.max_attempts:
+                    print('outbox', email['receiver'], err)
+                    self.failed_count += 1
+                    self.failed.append(email)
+                    pending.pop(0)
+                else:
+                    time.sleep(self.retry_delay * 2 ** (email['attempts'] - 1))
+
+outbox = Outbox(
+    os.environ.get('FLOCKR_SMTP_HOST', 'smtp.gmail.com'),
+    int(os.environ.get('FLOCKR_SMTP_PORT', 465)),
+    use_ssl=os.environ.get('FLOCKR_SMTP_SSL', '1') == '1',
+    username=os.environ.get('FLOCKR_SMTP_USER', '1531mangoteam3@gmail.com'),
+    password=os.environ.get('FLOCKR_SMTP_PASSWORD', 'wz"b9Tu@}gCWF_+F'),
+    sender=os.environ.get('FLOCKR_SMTP_SENDER'),
+)
@@ -0,0 +1,284 @@
+"""
+passwords.py
+    - salted password hashing with a key derivation function (scrypt or
+      PBKDF2 from hashlib), run in a pool of kdf_worker.py processes so a
+      login's hashing doesn't hold up the threads serving other requests
+
+Usage:
+    FLOCKR_KDF picks 'scrypt' (the default) or 'pbkdf2', and its cost is set
+    with FLOCKR_SCRYPT_N, FLOCKR_SCRYPT_R, FLOCKR_SCRYPT_P or
+    FLOCKR_PBKDF2_ITERATIONS. FLOCKR_KDF_WORKERS sets the number of
+    processes, 0 hashes on the calling thread instead
+
+    A hash is stored as 'scrypt$n$r$p$salt$key' or 'pbkdf2_sha256$iterations$salt$key',
+    hashes made before these (unsalted sha256) are still accepted
+
+Helper Modules:
+    derive: runs the key derivation function, in a worker process
+    legacy_hash: the unsalted sha256 hash passwords used to be stored as
+    WorkerPool: the kdf_worker.py processes, started as they are needed
+    shutdown: stops the workers, at exit or on SIGTERM (see stop_on_sigterm)
+
+Main Modules:
+    hash_password: hashes a password with the current function and cost
+    hash_passwords: hashes many passwords across every worker
+    verify_password: checks a password against a stored hash
+    needs_rehash: whether a stored hash is legacy or has a different cost to the current one
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import hashlib
+import hmac
+import json
+import queue
+import signal
+import atexit
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+KDF = os.environ.get('FLOCKR_KDF', 'scrypt')
+SCRYPT_COST = (
+    int(os.environ.get('FLOCKR_SCRYPT_N', 2 ** 14)),
+    int(os.environ.get('FLOCKR_SCRYPT_R', 8)),
+    int(os.environ.get('FLOCKR_SCRYPT_P', 1)),
+)
+PBKDF2_ITERATIONS = int(os.environ.get('FLOCKR_PBKDF2_ITERATIONS', 600000))
+KDF_WORKERS = int(os.environ.get('FLOCKR_KDF_WORKERS', os.cpu_count() or 1))
+
+SALT_SIZE = 16
+KEY_SIZE = 32
+
+def legacy_hash(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def derive(kdf, params, password, salt):
+    '''
+    derive
+
+    Args:
+        kdf: 'scrypt' or 'pbkdf2_sha256'
+        params: (n, r, p) for scrypt, (iterations,) for pbkdf2_sha256
+        password: the password as bytes
+        salt: the salt as bytes
+
+    Returns:
+        the derived key as bytes
+    '''
+    if kdf == 'scrypt':
+        n, r, p = params
+        # Needs 128 * n * r bytes, maxmem is raised to allow for that
+        return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r, dklen=KEY_SIZE)
+    if kdf == 'pbkdf2_sha256':
+        iterations, = params
+        return hashlib.pbkdf2_hmac('sha256', password, salt, iterations, dklen=KEY_SIZE)
+    raise ValueError(f"Unknown key derivation function {kdf}")
+
+def current_params():
+    if KDF == 'pbkdf2':
+        return 'pbkdf2_sha256', (PBKDF2_ITERATIONS,)
+    return 'scrypt', SCRYPT_COST
+
+# Where a worker process starts, it imports this module rather than whatever
+# started the server
+WORKER_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'kdf_worker.py')
+
+# How long (in seconds) a worker has to exit once its stdin is closed
+WORKER_EXIT_TIMEOUT = 5
+
+class Worker:
+    '''
+    Worker
+
+    A kdf_worker.py process, which derives one key at a time
+    '''
+    def __init__(self):
+        self.process = subprocess.Popen([sys.executable, WORKER_PATH],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+    def derive(self, kdf, params, password, salt):
+        '''
+        Raises:
+            OSError when the process has died
+            ValueError when kdf isn't known
+        '''
+        self.process.stdin.write(json.dumps({
+            'kdf': kdf,
+            'params': list(params),
+            'password': password.hex(),
+            'salt': salt.hex(),
+        }) + '\n')
+        self.process.stdin.flush()
+
+        line = self.process.stdout.readline()
+        if not line:
+            raise BrokenPipeError("The KDF worker exited")
+        reply = json.loads(line)
+        if 'error' in reply:
+            raise ValueError(reply['error'])
+        return bytes.fromhex(reply['key'])
+
+    def stop(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(WORKER_EXIT_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+class WorkerPool:
+    '''
+    WorkerPool
+
+    Workers are started as they are needed, up to size, and reused
+
+    Args:
+        size: the most workers running at once
+    '''
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.workers = []
+        self.idle = queue.LifoQueue()
+
+    def acquire(self):
+        with self.lock:
+            if self.idle.empty() and len(self.workers) < self.size:
+                worker = Worker()
+                self.workers.append(worker)
+                return worker
+        return self.idle.get()
+
+    def run(self, kdf, params, password, salt):
+        worker = self.acquire()
+        try:
+            key = worker.derive(kdf, params, password, salt)
+        except OSError:
+            # The worker died (e.g. it was killed), it is replaced by the next acquire
+            with self.lock:
+                if worker in self.workers:
+                    self.workers.remove(worker)
+            worker.stop()
+            return derive(kdf, params, password, salt)
+        except ValueError:
+            self.idle.put(worker)
+            raise
+        self.idle.put(worker)
+        return key
+
+    def map(self, *arguments):
+        # Each thread waits on one worker, so the keys are derived in parallel
+        with ThreadPoolExecutor(max_workers=self.size) as threads:
+            return list(threads.map(self.run, *arguments))
+
+    def shutdown(self):
+        with self.lock:
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.stop()
+
+# The pool is started by the first hash, as most requests never hash a
+# password. It is shut down when the server exits, and a worker whose server
+# is killed exits when its stdin closes
+pool = None
+pool_lock = threading.Lock()
+
+def get_pool():
+    global pool
+    with pool_lock:
+        if pool is None:
+            pool = WorkerPool(KDF_WORKERS)
+            atexit.register(shutdown)
+        return pool
+
+def shutdown():
+    '''
+    Stops the workers, the next hash starts a new pool
+    '''
+    global pool
+    with pool_lock:
+        current_pool, pool = pool, None
+    if current_pool is not None:
+        current_pool.shutdown()
+
+def stop_on_sigterm():
+    '''
+    Makes SIGTERM shut the pool down and exit, so atexit hooks run as they do
+    after Ctrl-C. Called by the servers from their main thread
+    '''
+    def stop(signum, frame):
+        shutdown()
+        sys.exit(128 + signum)
+    signal.signal(signal.SIGTERM, stop)
+
+def run(kdf, params, password, salt):
+    if KDF_WORKERS == 0:
+        return derive(kdf, params, password, salt)
+    return get_pool().run(kdf, params, password, salt)
+
+def encode(kdf, params, salt, key):
+    return '$'.join([kdf, *map(str, params), salt.hex(), key.hex()])
+
+def hash_password(password):
+    '''
+    hash_password
+
+    Returns:
+        the password's hash, with the function, cost and salt needed to check it
+    '''
+    kdf, params = current_params()
+    salt = os.urandom(SALT_SIZE)
+    return encode(kdf, params, salt, run(kdf, params, password.encode(), salt))
+
+def hash_passwords(passwords):
+    '''
+    hash_passwords
+
+    Returns:
+        the hash of each password, in the same order, hashed in parallel by the workers
+    '''
+    kdf, params = current_params()
+    salts = [os.urandom(SALT_SIZE) for _ in passwords]
+    arguments = ([kdf] * len(passwords), [params] * len(passwords),
+                 [password.encode() for password in passwords], salts)
+
+    if KDF_WORKERS == 0:
+        keys = map(derive, *arguments)
+    else:
+        keys = get_pool().map(*arguments)
+    return [encode(kdf, params, salt, key) for salt, key in zip(salts, keys)]
+
+def verify_password(password, stored):
+    '''
+    verify_password
+
+    Args:
+        password: the password given by the user
+        stored: the hash from hash_password, or a legacy sha256 hash
+
+    Returns:
+        True if the password matches
+    '''
+    if '$' not in stored:
+        return hmac.compare_digest(legacy_hash(password), stored)
+
+    kdf, *params, salt, key = stored.split('$')
+    params = tuple(int(param) for param in params)
+    derived = run(kdf, params, password.encode(), bytes.fromhex(salt))
+    return hmac.compare_digest(derived, bytes.fromhex(key))
+
+def needs_rehash(stored):
+    '''
+    Returns:
+        True when stored is a legacy hash or uses a different function or
+        cost to the current one, so it should be replaced after a login
+    '''
+    if '$' not in stored:
+        return True
+    kdf, params = current_params()
+    return stored.split('$')[:-2] != [kdf, *map(str, params)]
@@ -0,0 +1,218 @@
+"""
+pictures.py
+    - storage for profile pictures. A picture is named by the hash of its
+      contents, so the same picture uploaded twice is stored once, and kept
+      in subdirectories by the start of its hash so no directory gets too big.
+      Resized copies are made when a picture is stored, so a member list
+      showing 32px avatars isn't sent every full size picture
+
+Helper Modules:
+    picture_path: where a picture or thumbnail is stored
+    thumbnail_name: the file name of one size and format of a picture
+    save_thumbnails: writes every size and format of a newly cropped picture
+    picture_name: picks the file to serve for a request's size and Accept header
+
+Main Modules:
+    store_picture: stores a cropped picture and its thumbnails, returns its name
+    collect_garbage: removes the stored pictures no user refers to
+    AvatarCache: a least recently used cache of small pictures' bytes
+    avatar_cache: the cache server.py serves small pictures from
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import re
+import io
+import time
+import hashlib
+import tempfile
+import threading
+from collections    import OrderedDict
+from error          import InputError
+
+# The widths and heights (in pixels) pictures are resized to fit within
+THUMBNAIL_SIZES = (32, 64, 256)
+
+# Each size is saved as a progressive JPEG, and as WebP for the clients which accept it
+THUMBNAIL_FORMATS = {
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80}),
+}
+
+# Pictures up to this size are kept in avatar_cache
+CACHED_SIZES = (32, 64)
+
+# Content addressed pictures, pictures uploaded before them are named by a uuid
+STORED_NAME = re.compile(r'^[0-9a-f]{64}\.')
+
+# Temporary files left by a download or write which didn't finish
+TEMPORARY_SUFFIXES = ('.part', '.download')
+
+# collect_garbage leaves files changed more recently than this (in seconds),
+# they may belong to an upload which hasn't been given to its user yet
+GC_GRACE = 10 * 60
+
+def picture_path(directory, name):
+    '''
+    Returns:
+        the path of a picture or one of its thumbnails, e.g. ab/cd/abcd...jpg
+        in directory for a content addressed picture
+    '''
+    if STORED_NAME.match(name):
+        return os.path.join(directory, name[:2], name[2:4], name)
+    return os.path.join(directory, name)
+
+# Written under a temporary name so a picture is never seen half written
+def write_atomically(path, content):
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.part', delete=False) as part:
+        part.write(content)
+    os.replace(part.name, path)
+
+def thumbnail_name(image_url, size, extension):
+    stem = image_url.rsplit('.', 1)[0]
+    return f"{stem}.{size}.{extension}"
+
+def save_thumbnails(image, directory, image_url):
+    '''
+    save_thumbnails
+
+    Args:
+        image: the cropped picture, a PIL Image
+        directory: where the pictures are stored
+        image_url: the picture's file name
+    '''
+    image = image.convert('RGB')
+    for size in THUMBNAIL_SIZES:
+        thumbnail = image.copy()
+        thumbnail.thumbnail((size, size))
+        for extension, (image_format, options) in THUMBNAIL_FORMATS.items():
+            content = io.BytesIO()
+            thumbnail.save(content, format=image_format, **options)
+            name = thumbnail_name(image_url, size, extension)
+            write_atomically(picture_path(directory, name), content.getvalue())
+
+def store_picture(image, directory):
+    '''
+    store_picture
+
+    Args:
+        image: the cropped picture, a PIL Image
+        directory: where the pictures are stored
+
+    Returns:
+        the picture's name, the hash of its contents
+    '''
+    content = io.BytesIO()
+    image.convert('RGB').save(content, format='JPEG')
+    content = content.getvalue()
+
+    name = hashlib.sha256(content).hexdigest() + '.jpg'
+    path = picture_path(directory, name)
+
+    if os.path.exists(path):
+        # Already stored, touched so collect_garbage doesn't remove it before
+        # it is given to its new user
+        for stored in os.listdir(os.path.dirname(path)):
+            if stored.startswith(name[:-len('.jpg')]):
+                os.utime(os.path.join(os.path.dirname(path), stored))
+        return name
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # The thumbnails are written first, so a stored picture always has them
+    save_thumbnails(image, directory, name)
+    write_atomically(path, content)
+    return name
+
+def collect_garbage(directory, referenced, grace=GC_GRACE):
+    '''
+    collect_garbage
+
+    Pictures uploaded before pictures were content addressed, and files
+    which aren't pictures (e.g. default.jpg), are left alone.
+
+    Args:
+        directory: where the pictures are stored
+        referenced: the names of the pictures users have
+        grace: how long ago (in seconds) a file must have last changed to be removed
+
+    Returns:
+        how many files were removed
+    '''
+    referenced = {name.split('.')[0] for name in referenced}
+    cutoff = time.time() - grace
+    removed = 0
+
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            stored = STORED_NAME.match(name) and name.split('.')[0] not in referenced
+            if not stored and not name.endswith(TEMPORARY_SUFFIXES):
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+def picture_name(directory, image_url, size, accept):
+    '''
+    picture_name
+
+    Args:
+        directory: where the pictures are stored
+        image_url: the picture's file name
+        size: the size asked for, or None for the full picture
+        accept: the request's Accept header
+
+    Returns:
+        the name of the file to serve, the full picture when it has no
+        thumbnails (e.g. it was uploaded before they were made)
+
+    Raises:
+        InputError when size isn't one of THUMBNAIL_SIZES
+    '''
+    if size is None:
+        return image_url
+    if size not in THUMBNAIL_SIZES:
+        raise InputError(f"size must be one of {', '.join(map(str, THUMBNAIL_SIZES))}")
+
+    extension = 'webp' if 'image/webp' in accept else 'jpg'
+    name = thumbnail_name(image_url, size, extension)
+    if not os.path.exists(picture_path(directory, name)):
+        return image_url
+    return name
+
+class AvatarCache:
+    '''
+    AvatarCache
+
+    A picture's name is the hash of its contents, so cached bytes don't
+    need invalidating.
+
+    Args:
+        max_items: how many pictures to keep, the least recently used go first
+    '''
+    def __init__(self, max_items=1024):
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        with self.lock:
+            if path in self.items:
+                self.items.move_to_end(path)
+                return self.items[path]
+
+        with open(path, 'rb') as picture:
+            content = picture.read()
+
+        with self.lock:
+            self.items[path] = content
+            self.items.move_to_end(path)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+        return content
+
+avatar_cache = AvatarCache(int(os.environ.get('FLOCKR_AVATAR_CACHE_ITEMS', 1024)))
@@ -0,0 +1,229 @@
+"""
+profiler.py
+    - profiles the requests a running server handles, for when it is slow in
+      a way the tests don't show. Either every request is run under cProfile,
+      or the stacks of the threads serving requests are sampled, for some
+      seconds or for the next few requests to a route. Only the process
+      serving /admin/profile is profiled, under serve.py that is one worker
+
+Usage:
+    GET /admin/profile?token=...&mode=sample&seconds=10
+    GET /admin/profile?token=...&mode=cprofile&route=/search&requests=20
+
+    mode=sample returns collapsed stacks, one 'outer;inner count' line per
+    stack, for flamegraph.pl or speedscope. mode=cprofile returns pstats
+    text sorted by cumulative time, or with format=pstats the marshalled
+    stats pstats.Stats can load
+
+Helper Modules:
+    frame_name: names a frame in a collapsed stack
+    collapse: the collapsed stack of a frame
+    Session: the requests being profiled and what has been collected from them
+
+Main Modules:
+    Profiling: the middleware, wraps APP.wsgi_app in server.py, and runs profiles
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import io
+import time
+import marshal
+import pstats
+import cProfile
+import threading
+from collections    import Counter
+from error          import InputError
+
+MODES = ('sample', 'cprofile')
+FORMATS = ('text', 'pstats')
+
+# The longest a profile can run for, and the most requests it can wait for
+MAX_SECONDS = 300
+MAX_REQUESTS = 10000
+
+# How often (in seconds) stacks are sampled
+SAMPLE_INTERVAL = 0.005
+
+# Lines of pstats text returned
+STATS_LINES = 100
+
+# Not profiled, it is the request waiting for the profile
+PROFILE_PATH = '/admin/profile'
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def collapse(frame):
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class Session:
+    '''
+    Session
+
+    Args:
+        mode: 'sample' or 'cprofile'
+        route: only requests to this path are profiled, None for every request
+        requests: the profile ends after this many requests, None for no limit
+    '''
+    def __init__(self, mode, route, requests):
+        self.mode = mode
+        self.route = route
+        self.requests = requests
+
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.started = 0
+        self.finished = 0
+        # Thread ids of the requests being sampled
+        self.threads = set()
+        self.profiles = []
+        self.stacks = Counter()
+
+    def matches(self, path):
+        return path != PROFILE_PATH and (self.route is None or path == self.route)
+
+    def begin(self):
+        '''
+        Returns:
+            the request's profile (None when sampling), or False when the
+            request isn't profiled because enough have been
+        '''
+        with self.lock:
+            if self.done.is_set() or (self.requests and self.started >= self.requests):
+                return False
+            self.started += 1
+            if self.mode == 'sample':
+                self.threads.add(threading.get_ident())
+                return None
+
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def end(self, profile):
+        if profile is not None:
+            profile.disable()
+
+        with self.lock:
+            if profile is not None:
+                self.profiles.append(profile)
+            self.threads.discard(threading.get_ident())
+            self.finished += 1
+            if self.requests and self.finished >= self.requests:
+                self.done.set()
+
+    def sample(self, until):
+        while not self.done.is_set() and time.monotonic() < until:
+            frames = sys._current_frames()
+            with self.lock:
+                threads = list(self.threads)
+            for thread in threads:
+                frame = frames.get(thread)
+                if frame is not None:
+                    self.stacks[collapse(frame)] += 1
+            del frames
+            time.sleep(SAMPLE_INTERVAL)
+
+class Profiling:
+    '''
+    Profiling
+
+    One profile runs at a time, while none is running a request only costs
+    a check of self.session
+
+    Args:
+        app: the WSGI application to wrap
+    '''
+    def __init__(self, app):
+        self.app = app
+        self.session = None
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        session = self.session
+        if session is None or not session.matches(environ.get('PATH_INFO', '')):
+            return self.app(environ, start_response)
+
+        profile = session.begin()
+        if profile is False:
+            return self.app(environ, start_response)
+        # The route runs and builds its response here, sending it isn't profiled
+        try:
+            return self.app(environ, start_response)
+        finally:
+            session.end(profile)
+
+    def profile(self, mode='sample', seconds=None, requests=None, route=None, output='text'):
+        '''
+        profile
+
+        Args:
+            mode: 'sample' for collapsed stacks, 'cprofile' for pstats
+            seconds: how long to profile for
+            requests: how many requests to profile, the profile ends after
+                whichever of seconds and requests comes first
+            route: only profile requests to this path, e.g. /search
+            output: 'text' or 'pstats' (cprofile only)
+
+        Returns:
+            the profile as bytes
+
+        Raises:
+            InputError when an argument is not valid, neither seconds nor
+            requests is given, or another profile is running
+        '''
+        if mode not in MODES:
+            raise InputError(f"mode must be one of {', '.join(MODES)}")
+        if output not in FORMATS or (output == 'pstats' and mode != 'cprofile'):
+            raise InputError("format must be text, or pstats with mode cprofile")
+        if seconds is None and requests is None:
+            raise InputError("Give seconds or requests to profile for")
+        if seconds is not None and not 0 < seconds <= MAX_SECONDS:
+            raise InputError(f"seconds must be more than 0 and at most {MAX_SECONDS}")
+        if requests is not None and not 0 < requests <= MAX_REQUESTS:
+            raise InputError(f"requests must be more than 0 and at most {MAX_REQUESTS}")
+
+        session = Session(mode, route, requests)
+        with self.lock:
+            if self.session is not None:
+                raise InputError("A profile is already running")
+            self.session = session
+
+        until = time.monotonic() + (seconds or MAX_SECONDS)
+        try:
+            if mode == 'sample':
+                session.sample(until)
+            else:
+                session.done.wait(max(0, until - time.monotonic()))
+        finally:
+            with self.lock:
+                self.session = None
+            session.done.set()
+
+        if mode == 'sample':
+            return ''.join(f"{stack} {count}\n" for stack, count in session.stacks.most_common()).encode()
+
+        # Requests still running have their profiles added as they finish, only
+        # the finished ones are reported
+        with session.lock:
+            profiles = list(session.profiles)
+        if not profiles:
+            return marshal.dumps({}) if output == 'pstats' else b"No requests were profiled\n"
+
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        if output == 'pstats':
+            return marshal.dumps(stats.stats)
+
+        text = io.StringIO()
+        stats.stream = text
+        print(f"{len(profiles)} requests", file=text)
+        stats.sort_stats('cumulative').print_stats(STATS_LINES)
+        return text.getvalue().encode()
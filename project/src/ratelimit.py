@@ -0,0 +1,328 @@
+"""
+ratelimit.py
+    - WSGI middleware which turns requests away before they reach a route: a
+      client over its rate gets a 429, and when too many requests are already
+      being served a 503, so one client hammering /search can't take the whole
+      server. The counters are in memory, so with serve.py each worker process
+      has its own
+
+Usage:
+    Each token and each IP address has a bucket which refills at its rate (in
+    cost per second) up to its burst. A request takes its route's cost from
+    both, ROUTE_COSTS, and is refused if either doesn't have enough. A /batch
+    costs what its operations would cost sent one at a time, and one with a
+    body over MAX_BATCH_BODY gets a 413 without it being read. Set in
+    server.py from FLOCKR_RATE_LIMIT, FLOCKR_RATE_BURST, FLOCKR_IP_RATE_LIMIT,
+    FLOCKR_IP_RATE_BURST and FLOCKR_MAX_CONCURRENT, 0 turns each off
+
+Helper Modules:
+    TokenBucket: one client's allowance
+    content_length: a request's Content-Length
+    request_body: reads a request's JSON body and puts it back for the route
+    request_token: finds the token in a request's query string or JSON body
+    batch_paths: the path of each operation in a /batch request
+    Admitted: a response's body, which counts towards the concurrency limit until it is sent
+    cors_headers: the CORS headers Flask-CORS adds, for the responses made here
+    refuse: the error response for a refused request
+
+Main Modules:
+    RateLimit: the middleware, wraps APP.wsgi_app in server.py
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import io
+import re
+import json
+import math
+import time
+import threading
+from urllib.parse       import parse_qs
+from encoder            import encode
+
+# Routes which cost more than one request, the rest cost 1
+ROUTE_COSTS = {
+    '/search': 5,
+    '/channel/messages': 2,
+    '/users/all': 2,
+    '/user/profile/uploadphoto': 10,
+    '/user/profile/uploadphoto/async': 10,
+    '/auth/register/bulk': 10,
+    '/channel/invite/bulk': 5,
+    '/admin/message/import': 10,
+}
+
+# Routes which spend most of their time waiting for something to happen
+# rather than working, they aren't counted towards the concurrency limit
+WAITING_ROUTES = ('/events/stream', '/channel/messages/since', '/admin/profile')
+
+# Only bodies up to this size (in bytes) are read to find their token
+MAX_TOKEN_BODY = 64 * 1024
+
+# Charged the cost of each of its operations, read from its whole body
+BATCH_PATH = '/batch'
+
+# The most a /batch body can be (in bytes). It's read into memory to price it
+# before the route runs, this still fits batch.MAX_OPERATIONS of the longest
+# messages with every character escaped
+MAX_BATCH_BODY = 1024 * 1024
+
+TOKEN_FIELD = re.compile(rb'"token"\s*:\s*"([^"]*)"')
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self, cost):
+        '''
+        Returns:
+            how long (in seconds) until the bucket has cost, 0 when it already does
+        '''
+        return max(0, cost - self.tokens) / self.rate
+
+def content_length(environ):
+    '''
+    Returns:
+        the request's Content-Length, 0 when it has none or it isn't a number
+    '''
+    try:
+        return max(0, int(environ.get('CONTENT_LENGTH') or 0))
+    except ValueError:
+        return 0
+
+def request_body(environ, max_length):
+    '''
+    Returns:
+        a JSON body up to max_length bytes, or None. It is put back as
+        wsgi.input, so the route still reads all of it
+    '''
+    if 'json' not in environ.get('CONTENT_TYPE', ''):
+        return None
+    length = content_length(environ)
+    if length == 0 or length > max_length:
+        return None
+
+    body = environ['wsgi.input'].read(length)
+    environ['wsgi.input'] = io.BytesIO(body)
+    return body
+
+def request_token(environ):
+    '''
+    Returns:
+        the request's token, or None
+    '''
+    token = parse_qs(environ.get('QUERY_STRING', '')).get('token')
+    if token:
+        return token[0]
+
+    body = request_body(environ, MAX_TOKEN_BODY)
+    token = TOKEN_FIELD.search(body) if body else None
+    return token.group(1).decode(errors='replace') if token else None
+
+def batch_paths(environ):
+    '''
+    Returns:
+        the path of each of a /batch request's operations, None for an
+        operation without one, or [] when the body isn't a list of operations
+        (the route refuses it without running anything)
+    '''
+    body = request_body(environ, MAX_BATCH_BODY)
+    try:
+        operations = json.loads(body)['operations'] if body else None
+    except (ValueError, TypeError, KeyError):
+        return []
+    if not isinstance(operations, list):
+        return []
+    return [operation.get('path') if isinstance(operation, dict) else None for operation in operations]
+
+class Admitted:
+    '''
+    Admitted
+
+    A response's body, which gives back its concurrency slot once the body has
+    been sent or closed, whichever happens first
+    '''
+    def __init__(self, body, release):
+        self.body = body
+        self.release = release
+        self.released = False
+
+    def __iter__(self):
+        try:
+            yield from self.body
+        finally:
+            self.close()
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            if not self.released:
+                self.released = True
+                self.release()
+
+def cors_headers(environ):
+    '''
+    Returns:
+        the headers CORS(APP) in server.py adds to a response, for responses
+        made outside Flask, which a browser couldn't read without them
+    '''
+    origin = environ.get('HTTP_ORIGIN')
+    if origin is None:
+        return [('Access-Control-Allow-Origin', '*')]
+    return [('Access-Control-Allow-Origin', origin), ('Vary', 'Origin')]
+
+def refuse(environ, start_response, code, status, message, retry_after=None):
+    body = encode({
+        'code': code,
+        'name': "System Error",
+        'message': message,
+    })
+    headers = [
+        ('Content-Type', 'application/json'),
+        ('Content-Length', str(len(body))),
+    ]
+    # The frontend reads Retry-After to know when to try again, a request
+    # refused for what it is rather than when it came has none
+    if retry_after is not None:
+        headers += [
+            ('Retry-After', str(max(1, math.ceil(retry_after)))),
+            ('Access-Control-Expose-Headers', 'Retry-After'),
+        ]
+    start_response(status, headers + cors_headers(environ))
+    return [body]
+
+class RateLimit:
+    '''
+    RateLimit
+
+    Args:
+        app: the WSGI application to wrap
+        rate, burst: each token's bucket, rate 0 for no limit
+        ip_rate, ip_burst: each IP address's bucket, rate 0 for no limit
+        max_concurrent: the most requests served at once, 0 for no limit
+        costs: each route's cost, ROUTE_COSTS by default
+        max_buckets: buckets are pruned when there are more than this
+    '''
+    def __init__(self, app, rate=20, burst=40, ip_rate=50, ip_burst=100, max_concurrent=32,
+                 costs=None, max_buckets=100000):
+        self.app = app
+        self.limits = {'token': (rate, burst), 'ip': (ip_rate, ip_burst)}
+        self.max_concurrent = max_concurrent
+        self.costs = ROUTE_COSTS if costs is None else costs
+        self.max_buckets = max_buckets
+
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.active = 0
+
+        # Refusals so far, 429s and 503s, reported by /metrics
+        self.limited = 0
+        self.shed = 0
+
+    def take(self, keys, cost, now):
+        '''
+        Takes cost from every bucket in keys, or from none of them
+
+        Returns:
+            0 when the request is allowed, otherwise how long (in seconds)
+            until it would be
+        '''
+        with self.lock:
+            buckets = []
+            for key in keys:
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    rate, burst = self.limits[key[0]]
+                    bucket = self.buckets[key] = TokenBucket(rate, burst, now)
+                bucket.refill(now)
+                buckets.append(bucket)
+
+            # A route costing more than a whole burst can still run when the
+            # bucket is full, the bucket goes below empty and the client waits
+            # for all of it to refill before its next request
+            wait = max([bucket.wait(min(cost, bucket.burst)) for bucket in buckets], default=0)
+            if wait == 0:
+                for bucket in buckets:
+                    bucket.tokens -= cost
+
+            if len(self.buckets) > self.max_buckets:
+                self.prune(now)
+            return wait
+
+    def prune(self, now):
+        # A full bucket is the same as a new one, so it can be forgotten
+        for key, bucket in list(self.buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.burst:
+                del self.buckets[key]
+
+    def cost(self, path, environ):
+        if path != BATCH_PATH:
+            return self.costs.get(path, 1)
+        # Each operation costs the same as its route sent on its own
+        return max(1, sum(self.costs.get(operation, 1) for operation in batch_paths(environ)))
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+
+    def limit(self, environ):
+        '''
+        Takes the request's cost from its token's and IP address' buckets,
+        asgi.py calls this for the routes it serves without the middleware
+
+        Returns:
+            0 when the request is allowed, otherwise how long (in seconds)
+            until it would be
+        '''
+        keys = []
+        if self.limits['ip'][0]:
+            keys.append(('ip', environ.get('REMOTE_ADDR')))
+        if self.limits['token'][0]:
+            token = request_token(environ)
+            if token is not None:
+                keys.append(('token', token))
+
+        wait = self.take(keys, self.cost(environ.get('PATH_INFO', ''), environ), time.monotonic()) if keys else 0
+        if wait:
+            self.limited += 1
+        return wait
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path == BATCH_PATH and content_length(environ) > MAX_BATCH_BODY:
+            return refuse(environ, start_response, 413, '413 REQUEST ENTITY TOO LARGE',
+                          f"A batch can be at most {MAX_BATCH_BODY} bytes")
+
+        wait = self.limit(environ)
+        if wait:
+            return refuse(environ, start_response, 429, '429 TOO MANY REQUESTS', "Too many requests, slow down", wait)
+
+        if not self.max_concurrent or path in WAITING_ROUTES:
+            return self.app(environ, start_response)
+
+        with self.lock:
+            admitted = self.active < self.max_concurrent
+            if admitted:
+                self.active += 1
+        if not admitted:
+            self.shed += 1
+            return refuse(environ, start_response, 503, '503 SERVICE UNAVAILABLE', "The server is busy, try again", 1)
+
+        # Counted until the response has been sent, not just until the route returns
+        try:
+            return Admitted(self.app(environ, start_response), self.release)
+        except BaseException:
+            self.release()
+            raise
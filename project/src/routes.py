@@ -0,0 +1,172 @@
+"""
+routes.py
+    - the registry of every flockr route. server.py serves each route in
+      ROUTES from here, and has its own view for the others, in
+      SERVED_ROUTES. It refuses to start if it doesn't serve every route here
+      (see missing_routes), and asgi.py serves requests with server.py's app
+
+Helper Modules:
+    profile_url: turns a stored profile_img_url into an absolute url on this host
+    absolute_profile_urls: rewrites every profile_img_url in a result for this host
+    find_route: finds the route for a method and path
+    call_route: runs the implement/ function behind a route with the request's parameters
+    missing_routes: the routes an entry point doesn't serve
+
+Main Modules:
+    ROUTES: maps (method, path) to the implement/ function and its parameters
+    CONDITIONAL_ROUTES: the GET routes answered with a 304 while their resources are unchanged
+    SERVED_ROUTES: the routes which aren't a single implement/ function
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+from state_server   import implement_modules
+from error          import InputError
+
+MODULES = implement_modules()
+
+def profile_url(host, profile_img_url):
+    return 'http://' + str(host) + '/profile_pictures/' + str(profile_img_url)
+
+def absolute_profile_urls(result, host):
+    if 'user' in result:
+        result['user']['profile_img_url'] = profile_url(host, result['user']['profile_img_url'])
+
+    for key in ('users', 'owner_members', 'all_members'):
+        for user in result.get(key, []):
+            user['profile_img_url'] = profile_url(host, user['profile_img_url'])
+
+    return result
+
+# Passed the host the request was sent to rather than a request parameter
+HOST = 'host'
+
+# Each route is (module, function, parameters, rewrites_profile_urls)
+# A parameter is either its name, (name, cast) when it is cast from the query
+# string, (name, cast, default) when it is optional, or HOST
+ROUTES = {
+    ('POST', '/auth/login'): ('implement.auth', 'auth_login', ('email', 'password'), False),
+    ('POST', '/auth/logout'): ('implement.auth', 'auth_logout', ('token',), False),
+    ('POST', '/auth/register'): ('implement.auth', 'auth_register', ('email', 'password', 'name_first', 'name_last'), False),
+    ('POST', '/auth/register/bulk'): ('implement.auth', 'auth_register_bulk', ('token', 'users'), False),
+    ('POST', '/auth/passwordreset/request'): ('implement.auth', 'auth_passwordreset_request', ('email',), False),
+    ('POST', '/auth/passwordreset/reset'): ('implement.auth', 'auth_passwordreset_reset', ('reset_code', 'new_password'), False),
+
+    ('POST', '/channel/invite'): ('implement.channel', 'channel_invite', ('token', 'channel_id', 'u_id'), False),
+    ('POST', '/channel/invite/bulk'): ('implement.channel', 'channel_invite_bulk', ('token', 'channel_id', 'u_ids'), False),
+    ('GET', '/channel/details'): ('implement.channel', 'channel_details', ('token', ('channel_id', int)), True),
+    ('GET', '/channel/messages'): ('implement.channel', 'channel_messages', ('token', ('channel_id', int), ('start', int)), False),
+    ('GET', '/channel/messages/since'): ('implement.channel', 'channel_messages_since', ('token', ('channel_id', int), ('message_id', int), ('timeout', float, 0)), False),
+    ('POST', '/channel/leave'): ('implement.channel', 'channel_leave', ('token', 'channel_id'), False),
+    ('POST', '/channel/join'): ('implement.channel', 'channel_join', ('token', 'channel_id'), False),
+    ('POST', '/channel/addowner'): ('implement.channel', 'channel_addowner', ('token', 'channel_id', 'u_id'), False),
+    ('POST', '/channel/removeowner'): ('implement.channel', 'channel_removeowner', ('token', 'channel_id', 'u_id'), False),
+
+    ('GET', '/channels/list'): ('implement.channels', 'channels_list', ('token',), False),
+    ('GET', '/channels/listall'): ('implement.channels', 'channels_listall', ('token',), False),
+    ('POST', '/channels/create'): ('implement.channels', 'channels_create', ('token', 'name', 'is_public'), False),
+
+    ('POST', '/message/send'): ('implement.message', 'message_send', ('token', ('channel_id', int), 'message'), False),
+    ('DELETE', '/message/remove'): ('implement.message', 'message_remove', ('token', 'message_id'), False),
+    ('PUT', '/message/edit'): ('implement.message', 'message_edit', ('token', 'message_id', 'message'), False),
+    ('POST', '/message/pin'): ('implement.message', 'message_pin', ('token', 'message_id'), False),
+    ('POST', '/message/unpin'): ('implement.message', 'message_unpin', ('token', 'message_id'), False),
+    ('POST', '/message/react'): ('implement.message', 'message_react', ('token', 'message_id', 'react_id'), False),
+    ('POST', '/message/unreact'): ('implement.message', 'message_unreact', ('token', 'message_id', 'react_id'), False),
+    ('POST', '/message/sendlater'): ('implement.message', 'message_sendlater', ('token', 'channel_id', 'message', 'time_sent'), False),
+    ('POST', '/admin/message/import'): ('implement.message', 'message_import_bulk', ('token', 'messages'), False),
+
+    ('GET', '/user/profile'): ('implement.user', 'user_profile', ('token', ('u_id', int)), True),
+    ('PUT', '/user/profile/setname'): ('implement.user', 'user_profile_setname', ('token', 'name_first', 'name_last'), False),
+    ('PUT', '/user/profile/setemail'): ('implement.user', 'user_profile_setemail', ('token', 'email'), False),
+    ('PUT', '/user/profile/sethandle'): ('implement.user', 'user_profile_sethandle', ('token', 'handle_str'), False),
+    ('POST', '/user/profile/uploadphoto'): ('implement.user', 'user_profile_uploadphoto', ('token', 'img_url', 'x_start', 'y_start', 'x_end', 'y_end'), False),
+    ('POST', '/user/profile/uploadphoto/async'): ('implement.user', 'user_profile_uploadphoto_async', ('token', 'img_url', 'x_start', 'y_start', 'x_end', 'y_end'), False),
+    ('GET', '/user/profile/uploadphoto/status'): ('implement.user', 'user_profile_uploadphoto_status', ('token', ('job_id', int)), False),
+
+    ('GET', '/users/all'): ('implement.other', 'users_all', ('token',), True),
+    ('POST', '/admin/userpermission/change'): ('implement.other', 'admin_userpermission_change', ('token', 'u_id', 'permission_id'), False),
+    ('GET', '/search'): ('implement.other', 'search', ('token', 'query_str'), False),
+    ('DELETE', '/clear'): ('implement.other', 'clear', (), False),
+
+    ('POST', '/standup/start'): ('implement.standup', 'standup_start', ('token', 'channel_id', 'length'), False),
+    ('GET', '/standup/active'): ('implement.standup', 'standup_active', ('token', ('channel_id', int)), False),
+    ('POST', '/standup/send'): ('implement.standup', 'standup_send', ('token', 'channel_id', 'message'), False),
+
+    ('POST', '/batch'): ('batch', 'batch', ('token', 'operations', HOST), False),
+}
+
+# The versions.py resources each route's result is built from, its ETag
+# changes when one of them does
+CONDITIONAL_ROUTES = {
+    ('GET', '/channel/details'): ('channels', 'users'),
+    ('GET', '/channels/listall'): ('channels', 'messages'),
+    ('GET', '/user/profile'): ('users',),
+    ('GET', '/users/all'): ('users',),
+}
+
+# Routes which stream, serve files or report on the server itself rather
+# than run an implement/ function
+SERVED_ROUTES = (
+    ('GET', '/echo'),
+    ('GET', '/profile_pictures/<image_url>'),
+    ('GET', '/events/stream'),
+    ('GET', '/metrics'),
+    ('GET', '/admin/profile'),
+)
+
+def find_route(method, path):
+    '''
+    Returns:
+        the route for method and path, or None if there is no such route
+    '''
+    return ROUTES.get((method, path.rstrip('/') or '/'))
+
+def missing_routes(served):
+    '''
+    Args:
+        served: the (method, path) of every route an entry point serves
+
+    Returns:
+        the routes in ROUTES and SERVED_ROUTES which aren't in served
+    '''
+    return (set(ROUTES) | set(SERVED_ROUTES)) - set(served)
+
+def call_route(route, params, host):
+    '''
+    call_route
+
+    Args:
+        route: an entry of ROUTES
+        params: the query string arguments or json body of the request
+        host: the host the request was sent to, for profile picture urls
+
+    Returns:
+        the result of the implement/ function
+
+    Raises:
+        InputError when a parameter is missing or isn't a number when it should be
+    '''
+    module, function, parameters, rewrites_profile_urls = route
+
+    args = []
+    for parameter in parameters:
+        if parameter == HOST:
+            args.append(host)
+            continue
+        name, cast, *default = parameter if isinstance(parameter, tuple) else (parameter, None)
+        if name not in params and default:
+            args.append(default[0])
+            continue
+        if name not in params:
+            raise InputError(f"Missing parameter {name}")
+        try:
+            args.append(cast(params[name]) if cast else params[name])
+        except ValueError:
+            raise InputError(f"Parameter {name} is not valid")
+
+    result = getattr(MODULES[module], function)(*args)
+
+    if rewrites_profile_urls:
+        absolute_profile_urls(result, host)
+    return result
@@ -0,0 +1,83 @@
+"""
+serve.py
+    - runs the flockr server across several worker processes, which parse HTTP
+      and encode JSON in parallel while sharing one state process (state_server.py)
+
+Usage:
+    python3 src/serve.py [port] [workers]
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import multiprocessing
+import socket
+import tempfile
+import time
+from werkzeug.serving   import make_server
+from state_server       import serve, connect
+from passwords          import stop_on_sigterm
+
+HOST = '127.0.0.1'
+
+# Processes are forked so that the workers inherit the listening socket
+CONTEXT = multiprocessing.get_context('fork')
+
+def start_state_process(address, authkey):
+    state_process = CONTEXT.Process(target=serve, args=(address, authkey), daemon=True)
+    state_process.start()
+
+    # Wait until the state process accepts connections
+    for _ in range(100):
+        try:
+            connect(address, authkey)
+            return state_process
+        except (FileNotFoundError, ConnectionRefusedError):
+            time.sleep(0.05)
+
+    state_process.terminate()
+    raise Exception("Couldn't connect to the state process")
+
+def run_worker(fd):
+    # server.py connects to the state process when it is imported
+    from server import APP
+    make_server(HOST, 0, APP, threaded=True, fd=fd).serve_forever()
+
+def main(port=0, workers=os.cpu_count()):
+    address = os.path.join(tempfile.mkdtemp(), 'state.sock')
+    authkey = os.urandom(16)
+    state_process = start_state_process(address, authkey)
+
+    os.environ['FLOCKR_STATE_ADDRESS'] = address
+    os.environ['FLOCKR_STATE_AUTHKEY'] = authkey.hex()
+
+    # Every worker accepts connections from the same listening socket
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((HOST, port))
+    listener.listen(128)
+
+    processes = [state_process]
+    for _ in range(workers):
+        worker = CONTEXT.Process(target=run_worker, args=(listener.fileno(),), daemon=True)
+        worker.start()
+        processes.append(worker)
+
+    # Printed once every worker is listening, in werkzeug's format, so the
+    # http tests and load_bench.py find the url as they do for server.py
+    print(f" * Running on http://{HOST}:{listener.getsockname()[1]}/ "
+          f"({workers} workers)", file=sys.stderr, flush=True)
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        os.remove(address)
+
+if __name__ == "__main__":
+    # The state process and workers are terminated on SIGTERM as on Ctrl-C
+    stop_on_sigterm()
+    main(*[int(arg) for arg in sys.argv[1:3]])
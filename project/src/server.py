@@ -5,24 +5,89 @@ server.py
 # Import paths for json and HTTP
 import sys
 import os
-from json       import dumps
-from flask      import Flask, request, send_from_directory, abort
+import time
+import hashlib
+import mimetypes
+from functools  import wraps
+from flask      import Flask, Response, g, request, abort
 from flask_cors import CORS
 from error      import InputError
-
-# Import paths for main modules
-import implement.message  as m
-import implement.auth     as a
-import implement.channel  as c
-import implement.channels as cs
-import implement.user     as u
-import implement.other    as o
-import implement.standup  as s
+from encoder    import encode
+from compression import Compression
+from ratelimit  import RateLimit
+from metrics    import Metrics, Instrumentation, RECORD
+from profiler   import Profiling
+from pictures   import picture_name, picture_path, avatar_cache, CACHED_SIZES, STORED_NAME
+from passwords  import stop_on_sigterm
+from werkzeug.wsgi import wrap_file
+
+# Import paths for main modules, when started by serve.py the data lives in a
+# separate state process shared by every worker and these forward calls to it
+from state_server import implement_modules
+MODULES = implement_modules()
+o  = MODULES['implement.other']
+ev = MODULES['events']
+vs = MODULES['versions']
+
+# The routes which run one implement/ function are served from routes.ROUTES,
+# the same table asgi.py serves
+from routes import ROUTES, CONDITIONAL_ROUTES, call_route, missing_routes
+
+# How long (in seconds) clients can cache a profile picture, they never change
+PICTURE_MAX_AGE = 365 * 24 * 60 * 60
+
+# How often (in seconds) an idle event stream sends a keep-alive comment
+EVENTS_KEEPALIVE = 15
+
+# Every route returns its result through here, so the encoder only has to
+# change in encoder.py and the content type is always set
+def respond(result):
+    return Response(encode_result(result), mimetype='application/json')
+
+# When the request is being recorded for /metrics, the time spent encoding is
+# added up so it can be told apart from the time in implement/
+def encode_result(result):
+    record = request.environ.get(RECORD)
+    if record is None:
+        return encode(result)
+
+    start = time.perf_counter()
+    body = encode(result)
+    record['serialize'] += time.perf_counter() - start
+    return body
+
+def conditional(*resources):
+    '''
+    For GET routes which are built only from resources (see versions.py), the
+    ETag is made from their versions so a client with an up to date copy gets
+    a 304 without the result being built or encoded again
+    '''
+    def decorator(route):
+        @wraps(route)
+        def conditional_route(*args, **kwargs):
+            versions = vs.resource_versions(request.args.get('token'), resources)
+            g.versions = tuple(versions)
+            etag = hashlib.sha1(f"{versions}:{request.host}:{request.full_path}".encode()).hexdigest()
+
+            if etag in request.if_none_match:
+                response = Response(status=304)
+            else:
+                response = route(*args, **kwargs)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return conditional_route
+    return decorator
+
+# The encoded users/all body for each host the server is reached by, with the
+# versions it was built from, so it is only rebuilt after a profile changes
+USERS_ALL_CACHE = {}
+USERS_ALL_CACHE_HOSTS = 16
 
 def defaultHandler(err):
     response = err.get_response()
     print('response', err, err.get_response())
-    response.data = dumps({
+    response.data = encode({
         "code": err.code,
         "name": "System Error",
         "message": err.get_description(),
@@ -40,6 +105,47 @@ APP.config["CLIENT_IMAGES"] = f"{os.getcwd()}/src/profile_pictures"
 
 APP.register_error_handler(Exception, defaultHandler)
 
+# Responses at least this big (in bytes) are compressed for clients which accept it
+APP.config['COMPRESSION_MIN_SIZE'] = int(os.environ.get('FLOCKR_COMPRESSION_MIN_SIZE', 1024))
+
+# Innermost, so a profile is of the routes rather than the other middleware
+PROFILING = Profiling(APP.wsgi_app)
+APP.wsgi_app = Compression(PROFILING, min_size=APP.config['COMPRESSION_MIN_SIZE'])
+
+# Latency and size of the responses as sent, see /metrics
+APP.config['METRICS_SAMPLE'] = float(os.environ.get('FLOCKR_METRICS_SAMPLE', 1))
+METRICS = Metrics(sample_rate=APP.config['METRICS_SAMPLE'])
+APP.wsgi_app = Instrumentation(APP.wsgi_app, METRICS)
+
+# Requests over a client's rate, or beyond how many can be served at once, are
+# refused by the outermost middleware before any other work is done for them
+APP.config['RATE_LIMIT'] = float(os.environ.get('FLOCKR_RATE_LIMIT', 20))
+APP.config['RATE_BURST'] = float(os.environ.get('FLOCKR_RATE_BURST', 40))
+APP.config['IP_RATE_LIMIT'] = float(os.environ.get('FLOCKR_IP_RATE_LIMIT', 50))
+APP.config['IP_RATE_BURST'] = float(os.environ.get('FLOCKR_IP_RATE_BURST', 100))
+APP.config['MAX_CONCURRENT'] = int(os.environ.get('FLOCKR_MAX_CONCURRENT', 32))
+APP.wsgi_app = RateLimit(APP.wsgi_app,
+    rate=APP.config['RATE_LIMIT'], burst=APP.config['RATE_BURST'],
+    ip_rate=APP.config['IP_RATE_LIMIT'], ip_burst=APP.config['IP_RATE_BURST'],
+    max_concurrent=APP.config['MAX_CONCURRENT'])
+RATE_LIMIT = APP.wsgi_app
+
+# The route and the time in the view are added to the request's record, the
+# route by its rule so e.g. every profile picture counts as one route
+@APP.before_request
+def start_record():
+    record = request.environ.get(RECORD)
+    if record is not None:
+        record['route'] = request.url_rule.rule if request.url_rule else None
+        record['view_start'] = time.perf_counter()
+
+@APP.after_request
+def end_record(response):
+    record = request.environ.get(RECORD)
+    if record is not None and 'view_start' in record:
+        record['view'] = time.perf_counter() - record['view_start']
+    return response
+
 # ===================================================
 #  _____     _            ______            _       
 # |  ___|   | |           | ___ \          | |      
@@ -55,472 +161,211 @@ def echo():
     data = request.args.get('data')
     if data == 'echo':
    	    raise InputError(description='Cannot echo "echo"')
-    return dumps({
+    return respond({
         'data': data
     })
 
-# =========================================================
-#   ___        _   _      ______            _
-#  / _ \      | | | |     | ___ \          | |
-# / /_\ \_   _| |_| |__   | |_/ /___  _   _| |_ ___  ___
-# |  _  | | | | __| '_ \  |    // _ \| | | | __/ _ \/ __|
-# | | | | |_| | |_| | | | | |\ \ (_) | |_| | ||  __/\__ \
-# \_| |_/\__,_|\__|_| |_| \_| \_\___/ \__,_|\__\___||___/
-
-# =========================================================
-
-@APP.route("/auth/login", methods=['POST'])
-def auth_login_flask():
-    payload = request.get_json()
-
-    email = payload['email']
-    password = payload['password']
-
-    return dumps(
-        a.auth_login(email, password)
-    )
-
-@APP.route("/auth/logout", methods=['POST'])
-def auth_logout_flask():
-    payload = request.get_json()
-
-    token = payload['token']
-
-    return dumps(
-        a.auth_logout(token)
-    )
-
-@APP.route("/auth/register", methods=['POST'])
-def auth_register_flask():
-    payload = request.get_json()
-
-    email = payload['email']
-    password = payload['password']
-    name_first = payload['name_first']
-    name_last = payload['name_last']
-
-    return dumps(
-        a.auth_register(email, password, name_first, name_last)
-    )
-
-@APP.route("/auth/passwordreset/request", methods=['POST'])
-def auth_passwordreset_request_flask():
-    payload = request.get_json()
-    email = payload['email']
-    return dumps(
-        a.auth_passwordreset_request(email)
-    )
-
-@APP.route("/auth/passwordreset/reset", methods=['POST'])
-def auth_passwordreset_reset_flask():
-
-    payload = request.get_json()
-    reset_code = payload['reset_code']
-    new_password = payload['new_password']
-
-    return dumps(
-        a.auth_passwordreset_reset(reset_code, new_password)
-    )
-    
-# =======================================================================
-#  _____ _                            _  ______            _
-# /  __ \ |                          | | | ___ \          | |
-# | /  \/ |__   __ _ _ __  _ __   ___| | | |_/ /___  _   _| |_ ___  ___
-# | |   | '_ \ / _` | '_ \| '_ \ / _ \ | |    // _ \| | | | __/ _ \/ __|
-# | \__/\ | | | (_| | | | | | | |  __/ | | |\ \ (_) | |_| | ||  __/\__ \
-#  \____/_| |_|\__,_|_| |_|_| |_|\___|_| \_| \_\___/ \__,_|\__\___||___/
-
-# =======================================================================
-
-@APP.route("/channel/invite", methods=['POST'])
-def channel_invite_flask():
-    payload = request.get_json()
-
-    token = payload['token']
-    channel_id = payload['channel_id']
-    u_id = payload['u_id']
-
-    return dumps(
-        c.channel_invite(token, channel_id, u_id)
-    )
-
-@APP.route("/channel/details", methods=['GET'])
-def channel_details_flask():
-    token = request.args.get('token')
-    channel_id = int(request.args.get('channel_id'))
-    result = c.channel_details(token, channel_id)
-
-    for user in result['owner_members']:
-        user['profile_img_url'] = 'http://' + str(request.host) + '/profile_pictures/' + str(user['profile_img_url'])
-
-    for user in result['all_members']:
-        user['profile_img_url'] = 'http://' + str(request.host) + '/profile_pictures/' + str(user['profile_img_url'])
+# ======================================================
+#   ___  ______ _____  ______            _            
+#  / _ \ | ___ \_   _| | ___ \          | |           
+# / /_\ \| |_/ / | |   | |_/ /___  _   _| |_ ___  ___ 
+# |  _  ||  __/  | |   |    // _ \| | | | __/ _ \/ __|
+# | | | || |    _| |_  | |\ \ (_) | |_| | ||  __/\__ \
+# \_| |_/\_|    \___/  \_| \_\___/ \__,_|\__\___||___/
 
-    return dumps(
-        result
-    )
+# ======================================================
 
-@APP.route("/channel/messages", methods=['GET'])
-def channel_messages_flask():
-    token = request.args.get('token')
-    channel_id = int(request.args.get('channel_id'))
-    start = int(request.args.get('start'))
-
-    return dumps(
-        c.channel_messages(token, channel_id, start))
-    
-@APP.route("/channel/leave", methods=['POST'])
-def channel_leave_flask():
-    payload = request.get_json()
-    token = payload['token']
-    channel_id = payload['channel_id']
-    return dumps(
-        c.channel_leave(token, channel_id)
-    )
-
-@APP.route("/channel/join", methods=['POST'])
-def channel_join_flask():
-    payload = request.get_json()
-    token = payload['token']
-    channel_id = payload['channel_id']
-    return dumps(
-        c.channel_join(token, channel_id)
-    )
-
-@APP.route("/channel/addowner", methods=['POST'])
-def channel_addowner_flask():
-    payload = request.get_json()
-
-    token = payload['token']
-    channel_id = payload['channel_id']
-    u_id = payload['u_id']
-    return dumps(
-        c.channel_addowner(token, channel_id, u_id)
-    )
-
-@APP.route("/channel/removeowner", methods=['POST'])
-def channel_removeowner_flask():
-    payload = request.get_json()
-
-    token = payload['token']
-    channel_id = payload['channel_id']
-    u_id = payload['u_id']
-    return dumps(
-        c.channel_removeowner(token, channel_id, u_id)
-    )
-
-# ===========================================================================
-#  _____ _                            _      ______            _            
-# /  __ \ |                          | |     | ___ \          | |           
-# | /  \/ |__   __ _ _ __  _ __   ___| |___  | |_/ /___  _   _| |_ ___  ___ 
-# | |   | '_ \ / _` | '_ \| '_ \ / _ \ / __| |    // _ \| | | | __/ _ \/ __|
-# | \__/\ | | | (_| | | | | | | |  __/ \__ \ | |\ \ (_) | |_| | ||  __/\__ \
-#  \____/_| |_|\__,_|_| |_|_| |_|\___|_|___/ \_| \_\___/ \__,_|\__\___||___/
-
-# ===========================================================================
-
-@APP.route("/channels/list", methods=['GET'])
-def channels_list_flask():
-    token = request.args.get('token')
-    
-    return dumps(
-        cs.channels_list(token)
-    )
+# Every route in routes.ROUTES runs its implement/ function with the request's
+# query string (GET) or JSON body as parameters, the same as under asgi.py
+def route_view(route):
+    def view():
+        if request.method == 'GET':
+            params = request.args.to_dict()
+        else:
+            params = request.get_json(silent=True) or {}
+        return respond(
+            call_route(route, params, request.host)
+        )
+    return view
 
-@APP.route("/channels/listall", methods=['GET'])
-def channels_listall_flask():
+def users_all_flask():
     token = request.args.get('token')
 
-    return dumps(
-        cs.channels_listall(token)
-    )
-
-@APP.route("/channels/create", methods=['POST'])
-def channels_create_flask():
-    payload = request.get_json()
-
-    token = payload['token']
-    name = payload['name']
-    is_public = payload['is_public']
-
-    return dumps(
-        cs.channels_create(token, name, is_public)
-    )
-
-# ========================================================================
-# ___  ___                                ______            _
-# |  \/  |                                | ___ \          | |
-# | .  . | ___  ___ ___  __ _  __ _  ___  | |_/ /___  _   _| |_ ___  ___
-# | |\/| |/ _ \/ __/ __|/ _` |/ _` |/ _ \ |    // _ \| | | | __/ _ \/ __|
-# | |  | |  __/\__ \__ \ (_| | (_| |  __/ | |\ \ (_) | |_| | ||  __/\__ \
-# \_|  |_/\___||___/___/\__,_|\__, |\___| \_| \_\___/ \__,_|\__\___||___/
-                             # __/ |
-                            # |___/
-# ========================================================================
-
-@APP.route("/message/send", methods=['POST'])
-def message_send_flask():
-    payload = request.get_json()
-
-    token = payload['token']
-    channel_id = int(payload['channel_id'])
-    message = payload ['message']
-
-    return dumps(
-        m.message_send(token, channel_id, message)
-    )
-
-@APP.route("/message/remove", methods=['DELETE'])
-def message_remove_flask():
-    payload = request.get_json()
-
-    token = payload['token']
-    message_id = payload['message_id']
-
-    return dumps(
-        m.message_remove(token, message_id)
-    )
-
-@APP.route("/message/edit", methods=['PUT'])
-def message_edit_flask():
-    payload = request.get_json()
-
-    token = payload['token']
-    message_id = payload['message_id']
-    message = payload['message']
-
-    return dumps(
-        m.message_edit(token, message_id, message)
-    )
-
-@APP.route("/message/pin", methods=['POST'])
-def message_pin_flask():
-    payload = request.get_json()
-
-    token = payload['token']
-    message_id = payload['message_id']
-
-    return dumps(
-        m.message_pin(token, message_id)
-    )
-
-@APP.route("/message/unpin", methods=['POST'])
-def message_unpin_flask():
-    payload = request.get_json()
-
-    token = payload['token']
-    message_id = payload['message_id']
-
-    return dumps(
-        m.message_unpin(token, message_id)
-    )
-
-@APP.route("/message/react", methods=['POST'])
-def message_react_flask():
-    payload = request.get_json()
-
-    token = payload['token']
-    message_id = payload['message_id']
-    react_id = payload['react_id']
-
-    return dumps(
-        m.message_react(token, message_id, react_id)
-    )
+    # The token has already been checked by conditional
+    cached = USERS_ALL_CACHE.get(request.host)
+    if cached and cached[0] == g.versions:
+        return Response(cached[1], mimetype='application/json')
 
+    result = o.users_all(token)
+    for user in result['users']:
+        user['profile_img_url'] = 'http://' + str(request.host) + '/profile_pictures/' + str(user['profile_img_url'])
+    body = encode_result(result)
 
-@APP.route("/message/unreact", methods=['POST'])
-def message_unreact_flask():
-    payload = request.get_json()
-    token = payload['token']
-    message_id = payload['message_id']
-    react_id = payload['react_id']
+    # The host header comes from the client, so only a few hosts are kept
+    if len(USERS_ALL_CACHE) >= USERS_ALL_CACHE_HOSTS:
+        USERS_ALL_CACHE.clear()
+    USERS_ALL_CACHE[request.host] = (g.versions, body)
 
-    return dumps(
-        m.message_unreact(token, message_id, react_id)
-    )
+    return Response(body, mimetype='application/json')
 
-@APP.route("/message/sendlater", methods=['POST'])
-def message_sendlater_flask():
-    payload = request.get_json()
+# Routes with their own view instead of route_view
+VIEWS = {
+    ('GET', '/users/all'): users_all_flask,
+}
 
-    token = payload['token']
-    channel_id = payload['channel_id']
-    message = payload['message']
-    time_sent = payload['time_sent']
-
-    return dumps(
-        m.message_sendlater(token, channel_id, message, time_sent)
-    )
+for (method, path), route in ROUTES.items():
+    view = VIEWS.get((method, path)) or route_view(route)
+    if (method, path) in CONDITIONAL_ROUTES:
+        view = conditional(*CONDITIONAL_ROUTES[method, path])(view)
+    APP.add_url_rule(path, f"{route[1]}_flask", view, methods=[method])
 
-# ======================================================
-#  _   _                ______            _            
-# | | | |               | ___ \          | |           
-# | | | |___  ___ _ __  | |_/ /___  _   _| |_ ___  ___ 
-# | | | / __|/ _ \ '__| |    // _ \| | | | __/ _ \/ __|
-# | |_| \__ \  __/ |    | |\ \ (_) | |_| | ||  __/\__ \
-#  \___/|___/\___|_|    \_| \_\___/ \__,_|\__\___||___/
-                                                     
-# ======================================================
+# ==============================================================
+# ______ _      _                   ______            _       
+# | ___ (_)    | |                  | ___ \          | |      
+# | |_/ /_  ___| |_ _   _ _ __ ___  | |_/ /___  _   _| |_ ___ 
+# |  __/| |/ __| __| | | | '__/ _ \ |    // _ \| | | | __/ _ \
+# | |   | | (__| |_| |_| | | |  __/ | |\ \ (_) | |_| | ||  __/
+# \_|   |_|\___|\__|\__,_|_|  \___| \_| \_\___/ \__,_|\__\___|
 
-@APP.route("/user/profile", methods=['GET'])
-def user_profile_flask():
-    token = request.args.get('token')
-    u_id = int(request.args.get('u_id'))
-    result = u.user_profile(token, u_id)
-    result['user']['profile_img_url'] = 'http://' + str(request.host) + '/profile_pictures/' + str(result['user']['profile_img_url'])
-    return dumps(
-        result
-    )
-
-@APP.route("/user/profile/setname", methods=['PUT'])
-def user_profile_setemail_flask():
-    payload = request.get_json()
-    token = payload['token']
-    name_first = payload['name_first']
-    name_last = payload['name_last']
-
-    return dumps(
-        u.user_profile_setname(token, name_first, name_last)
-    )
-
-@APP.route("/user/profile/setemail", methods=['PUT'])
-def user_profile__setemail_flask():
-    payload = request.get_json()
-    token = payload['token']
-    email = payload['email']
-
-    return dumps(
-        u.user_profile_setemail(token, email)
-    )
-
-@APP.route("/user/profile/sethandle", methods=['PUT'])
-def user_profile__sethandle_flask():
-    payload = request.get_json()
-    token = payload['token']
-    handle_str = payload['handle_str']
-
-    return dumps(
-        u.user_profile_sethandle(token, handle_str)
-    )
-
-@APP.route("/user/profile/uploadphoto", methods=['POST'])
-def user_profile_sethandle_flask():
-    payload = request.get_json()
-
-    token = payload['token']    
-    img_url = payload['img_url']
-    x_start = payload['x_start']
-    y_start = payload['y_start']
-    x_end = payload['x_end']
-    y_end = payload['y_end']
-
-    return dumps(
-        u.user_profile_uploadphoto(token, img_url, x_start, y_start, x_end, y_end)
-    )
+# ==============================================================
 
 @APP.route("/profile_pictures/<image_url>", methods=['GET'])
 def user_profile_getphoto_flask(image_url):
-    # Fetch image object based on route
-    try:
-        return send_from_directory(APP.config["CLIENT_IMAGES"], filename=image_url, as_attachment=True)
-    except FileNotFoundError:
+    directory = APP.config["CLIENT_IMAGES"]
+    size = request.args.get('size', type=int)
+    if image_url.startswith('.'):
         abort(404)
 
-@APP.route('/profile_pictures/<path:path>')
-def send_js(path):
-    return send_from_directory('', path)
-
-# ===========================================================
-#  _____ _   _                ______            _
-# |  _  | | | |               | ___ \          | |
-# | | | | |_| |__   ___ _ __  | |_/ /___  _   _| |_ ___  ___
-# | | | | __| '_ \ / _ \ '__| |    // _ \| | | | __/ _ \/ __|
-# \ \_/ / |_| | | |  __/ |    | |\ \ (_) | |_| | ||  __/\__ \
-#  \___/ \__|_| |_|\___|_|    \_| \_\___/ \__,_|\__\___||___/
+    # A picture's name never refers to different contents, so the name of the
+    # file served (a thumbnail, or the full picture when it has none) is a
+    # strong ETag and a client's copy can be confirmed without opening it
+    name = picture_name(directory, image_url, size, request.headers.get('Accept', ''))
+    if request.if_none_match.contains(name):
+        response = Response(status=304)
+    else:
+        response = picture_response(picture_path(directory, name), size)
+
+    response.set_etag(name)
+    response.headers['Cache-Control'] = f"public, max-age={PICTURE_MAX_AGE}"
+    if STORED_NAME.match(image_url):
+        response.headers['Cache-Control'] += ', immutable'
+    if size is not None:
+        response.headers['Vary'] = 'Accept'
+    if response.status_code == 304:
+        return response
+
+    # Answers Range requests with 206 Partial Content
+    return response.make_conditional(request, accept_ranges=True, complete_length=response.content_length)
+
+def picture_response(path, size):
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    try:
+        # Small thumbnails are shown in every member list, so they are kept in memory
+        if size in CACHED_SIZES:
+            return Response(avatar_cache.get(path), mimetype=mimetype)
 
-# ===========================================================
+        picture = open(path, 'rb')
+    except (FileNotFoundError, IsADirectoryError):
+        abort(404)
 
-@APP.route("/users/all", methods=['GET'])
-def users_all_flask():
-    token = request.args.get('token')
-    result = o.users_all(token)
-    for user in result['users']:
-        user['profile_img_url'] = 'http://' + str(request.host) + '/profile_pictures/' + str(user['profile_img_url'])
-    return dumps(
-        result
-    )
+    # The server's wsgi.file_wrapper can send the file with sendfile, e.g. under gunicorn
+    response = Response(wrap_file(request.environ, picture), mimetype=mimetype, direct_passthrough=True)
+    response.content_length = os.fstat(picture.fileno()).st_size
+    if size is None:
+        response.headers['Content-Disposition'] = f"attachment; filename={os.path.basename(path)}"
+    return response
 
-@APP.route("/admin/userpermission/change", methods=['POST'])
-def admin_userpermission_change_flask():
-    payload = request.get_json()
+# ================================================================
+#  _____                _        ______            _            
+# |  ___|              | |       | ___ \          | |           
+# | |____   _____ _ __ | |_ ___  | |_/ /___  _   _| |_ ___  ___ 
+# |  __\ \ / / _ \ '_ \| __/ __| |    // _ \| | | | __/ _ \/ __|
+# | |___\ V /  __/ | | | |_\__ \ | |\ \ (_) | |_| | ||  __/\__ \
+# \____/ \_/ \___|_| |_|\__|___/ \_| \_\___/ \__,_|\__\___||___/
 
-    token = payload['token']
-    u_id = payload['u_id']
-    permission_id = payload['permission_id']
+# ================================================================
 
-    return dumps(
-        o.admin_userpermission_change(token, u_id, permission_id)
-    )
+# One event as Server-Sent Events sends it, asgi.py streams the same
+def sse_event(event):
+    return f"id: {event['event_id']}\nevent: {event['type']}\ndata: {encode(event).decode()}\n\n"
 
-@APP.route("/search", methods=['GET'])
-def other_search_flask():
-    token = request.args.get('token')
-    query_str = request.args.get('query_str')
-
-    return dumps(
-        o.search(token, query_str)
-    )
-
-@APP.route("/clear", methods=['DELETE'])
-def clear_flask():
-    return dumps(
-        o.clear()
-    )
-
-# ==========================================================================
-#  _____ _                  _              ______            _            
-# /  ___| |                | |             | ___ \          | |           
-# \ `--.| |_ __ _ _ __   __| |_   _ _ __   | |_/ /___  _   _| |_ ___  ___ 
-#  `--. \ __/ _` | '_ \ / _` | | | | '_ \  |    // _ \| | | | __/ _ \/ __|
-# /\__/ / || (_| | | | | (_| | |_| | |_) | | |\ \ (_) | |_| | ||  __/\__ \
-# \____/ \__\__,_|_| |_|\__,_|\__,_| .__/  \_| \_\___/ \__,_|\__\___||___/
-                                 # | |                                    
-                                 # |_|                                    
-# ==========================================================================
-
-@APP.route("/standup/start", methods=['POST'])
-def standup_start_flask():
-    payload = request.get_json()
-
-    token = payload['token']
-    channel_id = payload['channel_id']
-    length = payload['length']
-
-    return dumps(
-        s.standup_start(token, channel_id, length)
-    )
-
-@APP.route("/standup/active", methods=['GET'])
-def standup_active_flask():
+@APP.route("/events/stream", methods=['GET'])
+def events_stream_flask():
     token = request.args.get('token')
-    channel_id = int(request.args.get('channel_id'))
-
-    return dumps(
-        s.standup_active(token, channel_id)
-    )
+    subscriber_id = ev.events_subscribe(token)['subscriber_id']
+
+    # Server-Sent Events, one per message/react/pin/standup change in the
+    # user's channels, the keep-alive also notices when the client has gone
+    def stream():
+        try:
+            yield ': connected\n\n'
+            while True:
+                events = ev.events_next(subscriber_id, EVENTS_KEEPALIVE)['events']
+                if not events:
+                    yield ': keep-alive\n\n'
+                for event in events:
+                    yield sse_event(event)
+        finally:
+            ev.events_unsubscribe(subscriber_id)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
 
-@APP.route("/standup/send", methods=['POST'])
-def standup_send_flask():
-    payload = request.get_json()
+# ==============================================================
+# ___  ___     _        _           ______            _       
+# |  \/  |    | |      (_)          | ___ \          | |      
+# | .  . | ___| |_ _ __ _  ___ ___  | |_/ /___  _   _| |_ ___ 
+# | |\/| |/ _ \ __| '__| |/ __/ __| |    // _ \| | | | __/ _ \
+# | |  | |  __/ |_| |  | | (__\__ \ | |\ \ (_) | |_| | ||  __/
+# \_|  |_/\___|\__|_|  |_|\___|___/ \_| \_\___/ \__,_|\__\___|
+
+# ==============================================================
+
+@APP.route("/metrics", methods=['GET'])
+def metrics_flask():
+    body = METRICS.render({
+        'flockr_rate_limited_total': ('counter', "Requests refused with a 429 for going over a rate", RATE_LIMIT.limited),
+        'flockr_shed_total': ('counter', "Requests refused with a 503 for going over the concurrency limit", RATE_LIMIT.shed),
+        'flockr_active_requests': ('gauge', "Requests being served, not counting event streams", RATE_LIMIT.active),
+    })
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
-    token = payload['token']
-    channel_id = payload['channel_id']
-    message = payload['message']
+# ==========================================================
+# ______           __ _ _       ______            _       
+# | ___ \         / _(_) |      | ___ \          | |      
+# | |_/ / __ ___ | |_ _| | ___  | |_/ /___  _   _| |_ ___ 
+# |  __/ '__/ _ \|  _| | |/ _ \ |    // _ \| | | | __/ _ \
+# | |  | | | (_) | | | | |  __/ | |\ \ (_) | |_| | ||  __/
+# \_|  |_|  \___/|_| |_|_|\___| \_| \_\___/ \__,_|\__\___|
 
-    return dumps(
-        s.standup_send(token, channel_id, message)
-    )
+# ==========================================================
 
+@APP.route("/admin/profile", methods=['GET'])
+def admin_profile_flask():
+    token = request.args.get('token')
+    mode = request.args.get('mode', 'sample')
+    seconds = request.args.get('seconds', type=float)
+    requests = request.args.get('requests', type=int)
+    route = request.args.get('route')
+    output = request.args.get('format', 'text')
+
+    o.admin_check(token)
+    body = PROFILING.profile(mode, seconds, requests, route, output)
+
+    if output == 'pstats':
+        return Response(body, mimetype='application/octet-stream', headers={
+            'Content-Disposition': 'attachment; filename="profile.pstats"',
+        })
+    return Response(body, mimetype='text/plain')
+
+# Every route in routes.py has been registered above
+MISSING_ROUTES = missing_routes(
+    (method, rule.rule) for rule in APP.url_map.iter_rules() for method in rule.methods)
+if MISSING_ROUTES:
+    raise Exception(f"server.py doesn't serve {sorted(MISSING_ROUTES)}")
 
 if __name__ == "__main__":
-    APP.run(port=0) # Do not edit this port
+    stop_on_sigterm()
+    APP.run(port=0) # Do not edit this port
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+asgi_http_test.py
+
+Fixtures:
+    url: starts asgi.py on its built in asyncio server
+
+Test Modules:
+    test_register_and_send: success case for a user sending a message over HTTP
+    test_keep_alive: success case for several requests on one connection
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import pytest
+import re
+import signal
+import requests
+from subprocess     import Popen, PIPE
+from time           import sleep
+from helper         import token_hash
+
+@pytest.fixture
+def url():
+    url_re = re.compile(r' \* Running on ([^ ]*)')
+    server = Popen(["python3", "src/asgi.py"], stderr=PIPE, stdout=PIPE)
+    line = server.stderr.readline()
+    local_url = url_re.match(line.decode())
+    if local_url:
+        yield local_url.group(1).rstrip('/')
+        # Terminate the server
+        server.send_signal(signal.SIGINT)
+        waited = 0
+        while server.poll() is None and waited < 5:
+            sleep(0.1)
+            waited += 0.1
+        if server.poll() is None:
+            server.kill()
+    else:
+        server.kill()
+        raise Exception("Couldn't get URL from local server")
+
+def test_register_and_send(url):
+    requests.delete(f"{url}/clear")
+    user = requests.post(f"{url}/auth/register", json={
+        'email': 'owner@email.com',
+        'password': 'password',
+        'name_first': 'Firstname',
+        'name_last': 'Lastname',
+    }).json()
+    assert user == {'u_id': 0, 'token': token_hash(0)}
+
+    c_id = requests.post(f"{url}/channels/create", json={
+        'token': user['token'],
+        'name': 'Channel',
+        'is_public': True,
+    }).json()['channel_id']
+
+    result = requests.post(f"{url}/message/send", json={
+        'token': user['token'],
+        'channel_id': c_id,
+        'message': 'Hello',
+    })
+    assert result.status_code == 200
+    assert result.json() == {'message_id': 0}
+
+    result = requests.post(f"{url}/message/send", json={
+        'token': user['token'],
+        'channel_id': c_id,
+        'message': '',
+    })
+    assert result.status_code == 400
+
+def test_keep_alive(url):
+    with requests.Session() as session:
+        session.delete(f"{url}/clear")
+        for _ in range(5):
+            assert session.get(f"{url}/echo", params={'data': 'hello'}).json() == {'data': 'hello'}
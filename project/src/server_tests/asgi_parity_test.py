@@ -0,0 +1,140 @@
+"""
+asgi_parity_test.py
+
+Fixtures:
+    picture: a saved profile picture
+
+Helper Modules:
+    flask_request: a request to server.py's WSGI app, through its middleware
+    asgi_request: the same request to asgi.py's app, through asgi_test.py's raw_request
+    both: the same request to both, as (status, headers, body)
+
+Test Modules:
+    test_conditional: success case for both answering with the same ETag, and a 304 for it
+    test_compression: success case for both compressing a large response
+    test_rate_limit: fail case for both refusing a client over its rate, long polls included
+    test_users_all_cache: success case for asgi.py filling server.py's users/all cache
+    test_picture: success case for both serving a picture with its caching headers and Range
+    test_preflight: success case for both answering a CORS preflight
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import gzip
+import json
+import uuid
+import pytest
+import server
+from PIL                    import Image
+from werkzeug.test          import EnvironBuilder, run_wsgi_app
+from asgi_test              import raw_request
+from implement.message      import message_send
+
+HOST = 'localhost:5000'
+
+# Headers which have to be the same from both, the rest (e.g. Date) can differ
+COMPARED_HEADERS = (
+    'content-type', 'etag', 'cache-control', 'content-encoding', 'content-range',
+    'accept-ranges', 'retry-after', 'vary', 'access-control-allow-origin',
+    'access-control-expose-headers',
+)
+
+def compared(headers):
+    return {name: value for name, value in headers.items() if name in COMPARED_HEADERS}
+
+# The test client's Response would add headers the app didn't send, e.g. a
+# Content-Type on a 304, so the WSGI app's own response is compared
+def flask_request(method, path, params=None, headers=()):
+    params = params or {}
+    environ = EnvironBuilder(
+        path, method=method, base_url=f"http://{HOST}", headers=list(headers),
+        query_string=params if method == 'GET' else None,
+        json=params if method != 'GET' else None,
+    ).get_environ()
+    app_iter, status, response_headers = run_wsgi_app(server.APP.wsgi_app, environ, buffered=True)
+    return (int(status.split()[0]),
+            compared({name.lower(): value for name, value in response_headers.items()}),
+            b''.join(app_iter))
+
+def asgi_request(method, path, params=None, headers=()):
+    status, response_headers, body = raw_request(method, path, params, headers)
+    return status, compared({name.decode(): value.decode() for name, value in response_headers.items()}), body
+
+def both(method, path, params=None, headers=()):
+    return flask_request(method, path, params, headers), asgi_request(method, path, params, headers)
+
+@pytest.fixture
+def picture():
+    directory = server.APP.config["CLIENT_IMAGES"]
+    image_url = f"{uuid.uuid4()}.jpg"
+    Image.new('RGB', (30, 20), (10, 120, 200)).save(os.path.join(directory, image_url))
+    yield image_url
+    os.remove(os.path.join(directory, image_url))
+
+def test_conditional(owner):
+    params = {'token': owner['token'], 'u_id': 0}
+    flask_response, asgi_response = both('GET', '/user/profile', params)
+    assert flask_response == asgi_response
+    etag = flask_response[1]['etag']
+
+    flask_response, asgi_response = both('GET', '/user/profile', params, [('If-None-Match', etag)])
+    assert flask_response[0] == asgi_response[0] == 304
+    assert flask_response == asgi_response
+
+def test_compression(owner):
+    for _ in range(5):
+        message_send(owner['token'], owner['c_id'], "a long message " * 50)
+
+    params = {'token': owner['token'], 'channel_id': owner['c_id'], 'start': 0}
+    flask_response, asgi_response = both('GET', '/channel/messages', params, [('Accept-Encoding', 'gzip')])
+    assert flask_response[1] == asgi_response[1]
+    assert asgi_response[1]['content-encoding'] == 'gzip'
+    assert gzip.decompress(flask_response[2]) == gzip.decompress(asgi_response[2])
+
+def test_rate_limit(owner, monkeypatch):
+    monkeypatch.setattr(server.RATE_LIMIT, 'limits', {'token': (1, 1), 'ip': (0, 0)})
+    monkeypatch.setattr(server.RATE_LIMIT, 'limited', 0)
+    headers = [('Origin', 'http://frontend')]
+    responses = []
+    for send_request in (flask_request, asgi_request):
+        monkeypatch.setattr(server.RATE_LIMIT, 'buckets', {})
+        responses.append([send_request('GET', '/channels/list', {'token': owner['token']}, headers) for _ in range(2)])
+    assert [status for status, _, _ in responses[0]] == [200, 429]
+    assert responses[0] == responses[1]
+
+    # A long poll is served on the loop, after the same limit
+    status, headers, body = asgi_request('GET', '/channel/messages/since', {
+        'token': owner['token'], 'channel_id': owner['c_id'], 'message_id': -1, 'timeout': 5,
+    })
+    assert status == 429
+    assert headers['retry-after'] == '1'
+    assert json.loads(body)['code'] == 429
+
+def test_users_all_cache(owner, monkeypatch):
+    monkeypatch.setattr(server, 'USERS_ALL_CACHE', {})
+    status, _, body = asgi_request('GET', '/users/all', {'token': owner['token']})
+    assert status == 200
+    assert server.USERS_ALL_CACHE[HOST][1] == body
+
+    flask_response, asgi_response = both('GET', '/users/all', {'token': owner['token']})
+    assert flask_response == asgi_response
+
+def test_picture(picture):
+    flask_response, asgi_response = both('GET', f"/profile_pictures/{picture}", headers=[('Range', 'bytes=0-9')])
+    assert flask_response == asgi_response
+    status, headers, body = asgi_response
+    assert status == 206
+    assert len(body) == 10
+    assert headers['cache-control'].startswith('public, max-age=')
+
+    flask_response, asgi_response = both('GET', f"/profile_pictures/{picture}", headers=[('If-None-Match', headers['etag'])])
+    assert flask_response[0] == asgi_response[0] == 304
+    assert flask_response == asgi_response
+
+def test_preflight():
+    flask_response, asgi_response = both('OPTIONS', '/channels/create', headers=[
+        ('Origin', 'http://frontend'),
+        ('Access-Control-Request-Method', 'POST'),
+    ])
+    assert flask_response == asgi_response
+    assert asgi_response[1]['access-control-allow-origin'] == 'http://frontend'
@@ -0,0 +1,221 @@
+"""
+asgi_test.py
+
+Helper Modules:
+    call_app: calls the ASGI app directly on the running loop
+    raw_request: calls the ASGI app directly and returns the status, headers and body
+    request: calls the ASGI app directly and returns the status and JSON body
+
+Test Modules:
+    test_register_and_login: success case for POST routes with a json body
+    test_get_route: success case for GET routes with query string parameters
+    test_profile_urls: success case for profile_img_url being absolute like server.py
+    test_input_error: fail case for errors returning the same body as server.py
+    test_unknown_route: fail case for a route which doesn't exist
+    test_echo: success and fail case for echo
+    test_batch: success case for /batch
+    test_metrics: success case for /metrics counting the requests served
+    test_events_stream: success case for an event stream getting a message
+    test_messages_since_without_thread: success case for long polls not holding a thread while they wait
+    test_messages_since_timeout: success case for a long poll with nothing published
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import asyncio
+import json
+import asgi
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse   import urlencode
+from asgi           import app
+from helper         import token_hash
+
+async def call_app(method, path, params=None, headers=()):
+    params = params if params else {}
+    query = urlencode(params) if method == 'GET' else ''
+    body = json.dumps(params).encode() if method != 'GET' else b''
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(b'host', b'localhost:5000')] + ([(b'content-type', b'application/json')] if body else []) + [
+            (name.lower().encode(), value.encode()) for name, value in headers
+        ],
+    }
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]['status'], dict(sent[0]['headers']), b''.join(message.get('body', b'') for message in sent[1:])
+
+def raw_request(method, path, params=None, headers=()):
+    return asyncio.run(call_app(method, path, params, headers))
+
+def request(method, path, params=None):
+    status, _, body = raw_request(method, path, params)
+    return status, json.loads(body)
+
+def register(email):
+    return request('POST', '/auth/register', {
+        'email': email,
+        'password': 'password',
+        'name_first': 'Firstname',
+        'name_last': 'Lastname',
+    })[1]
+
+def test_register_and_login():
+    request('DELETE', '/clear')
+    assert register('owner@email.com') == {'u_id': 0, 'token': token_hash(0)}
+
+    status, body = request('POST', '/auth/login', {
+        'email': 'owner@email.com',
+        'password': 'password',
+    })
+    assert status == 200
+    assert body == {'u_id': 0, 'token': token_hash(0)}
+
+def test_get_route():
+    request('DELETE', '/clear')
+    token = register('owner@email.com')['token']
+    c_id = request('POST', '/channels/create', {'token': token, 'name': 'Channel', 'is_public': True})[1]['channel_id']
+    request('POST', '/message/send', {'token': token, 'channel_id': c_id, 'message': 'Hello'})
+
+    status, body = request('GET', '/channel/messages', {'token': token, 'channel_id': c_id, 'start': 0})
+    assert status == 200
+    assert [message['message'] for message in body['messages']] == ['Hello']
+
+def test_profile_urls():
+    request('DELETE', '/clear')
+    token = register('owner@email.com')['token']
+
+    status, body = request('GET', '/user/profile', {'token': token, 'u_id': 0})
+    assert status == 200
+    assert body['user']['profile_img_url'] == 'http://localhost:5000/profile_pictures/default.jpg'
+
+def test_input_error():
+    request('DELETE', '/clear')
+    status, body = request('POST', '/auth/login', {
+        'email': 'owner@email.com',
+        'password': 'password',
+    })
+    assert status == 400
+    assert body['code'] == 400
+    assert body['name'] == 'System Error'
+
+def test_unknown_route():
+    status, body = request('GET', '/not/a/route')
+    assert status == 404
+    assert body['code'] == 404
+
+def test_echo():
+    assert request('GET', '/echo', {'data': 'hello'}) == (200, {'data': 'hello'})
+    assert request('GET', '/echo', {'data': 'echo'})[0] == 400
+
+def test_batch():
+    request('DELETE', '/clear')
+    token = register('owner@email.com')['token']
+
+    status, body = request('POST', '/batch', {'token': token, 'operations': [
+        {'method': 'POST', 'path': '/channels/create', 'params': {'name': 'Channel', 'is_public': True}},
+        {'method': 'GET', 'path': '/user/profile', 'params': {'u_id': 0}},
+    ]})
+    assert status == 200
+    assert [result['status'] for result in body['results']] == [200, 200]
+    assert body['results'][1]['result']['user']['profile_img_url'].startswith('http://localhost:5000/profile_pictures/')
+
+def test_metrics():
+    asgi.METRICS.clear()
+    request('GET', '/echo', {'data': 'hello'})
+    request('GET', '/not/a/route')
+
+    status, headers, body = raw_request('GET', '/metrics')
+    assert status == 200
+    assert headers[b'content-type'].startswith(b'text/plain')
+    text = body.decode()
+    assert 'flockr_requests_total{method="GET",route="/echo",status="200"} 1' in text
+    assert 'flockr_requests_total{method="GET",route="<unmatched>",status="404"} 1' in text
+
+def test_events_stream(monkeypatch):
+    monkeypatch.setattr(asgi, 'EVENTS_KEEPALIVE', 0.1)
+    request('DELETE', '/clear')
+    token = register('owner@email.com')['token']
+    c_id = request('POST', '/channels/create', {'token': token, 'name': 'Channel', 'is_public': True})[1]['channel_id']
+
+    chunks = []
+    received = []
+    disconnected = asyncio.Event()
+
+    # The (empty) body is received first, then the client stays connected
+    # until its message has been streamed
+    async def receive():
+        if received:
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+        received.append(True)
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        chunks.append(message.get('body', b''))
+        if b'event: message' in chunks[-1]:
+            disconnected.set()
+
+    async def stream():
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/events/stream',
+            'query_string': urlencode({'token': token}).encode(),
+            'headers': [],
+        }
+        streaming = asyncio.ensure_future(app(scope, receive, send))
+        while b': connected\n\n' not in chunks:
+            await asyncio.sleep(0.01)
+        await asyncio.get_running_loop().run_in_executor(None, lambda: request('POST', '/message/send', {
+            'token': token, 'channel_id': c_id, 'message': 'Hello',
+        }))
+        await asyncio.wait_for(streaming, 5)
+
+    asyncio.run(stream())
+    event = next(chunk for chunk in chunks if b'event: message' in chunk).decode()
+    data = [line for line in event.splitlines() if line.startswith('data: ')][0]
+    assert json.loads(data[len('data: '):])['message']['message'] == 'Hello'
+
+def test_messages_since_without_thread(monkeypatch):
+    # With one thread, a poll holding it would keep the message from being sent
+    monkeypatch.setattr(asgi, 'EXECUTOR', ThreadPoolExecutor(max_workers=1))
+    request('DELETE', '/clear')
+    token = register('owner@email.com')['token']
+    c_id = request('POST', '/channels/create', {'token': token, 'name': 'Channel', 'is_public': True})[1]['channel_id']
+
+    async def poll_and_send():
+        polling = asyncio.ensure_future(call_app('GET', '/channel/messages/since', {
+            'token': token, 'channel_id': c_id, 'message_id': -1, 'timeout': 10,
+        }))
+        await asyncio.sleep(0.1)
+        await asyncio.wait_for(call_app('POST', '/message/send', {
+            'token': token, 'channel_id': c_id, 'message': 'Hello',
+        }), 2)
+        return await asyncio.wait_for(polling, 2)
+
+    status, _, body = asyncio.run(poll_and_send())
+    assert status == 200
+    assert [message['message'] for message in json.loads(body)['messages']] == ['Hello']
+    assert not asgi.WAITERS
+
+def test_messages_since_timeout():
+    request('DELETE', '/clear')
+    token = register('owner@email.com')['token']
+    c_id = request('POST', '/channels/create', {'token': token, 'name': 'Channel', 'is_public': True})[1]['channel_id']
+
+    status, body = request('GET', '/channel/messages/since', {
+        'token': token, 'channel_id': c_id, 'message_id': -1, 'timeout': 0.2,
+    })
+    assert status == 200
+    assert body == {'messages': [], 'last_message_id': -1}
+    assert not asgi.WAITERS
@@ -0,0 +1,81 @@
+"""
+batch_http_test.py
+
+Fixtures:
+    url: starts the server
+
+Test Modules:
+    test_invalid_token: fail case for invalid token
+    test_screen: success case for loading a channel's details and messages in one request
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import pytest
+import re
+import signal
+import requests
+from subprocess     import Popen, PIPE
+from time           import sleep
+from helper         import token_hash
+
+@pytest.fixture
+def url():
+    url_re = re.compile(r' \* Running on ([^ ]*)')
+    server = Popen(["python3", "src/server.py"], stderr=PIPE, stdout=PIPE)
+    line = server.stderr.readline()
+    local_url = url_re.match(line.decode())
+    if local_url:
+        yield local_url.group(1)
+        # Terminate the server
+        server.send_signal(signal.SIGINT)
+        waited = 0
+        while server.poll() is None and waited < 5:
+            sleep(0.1)
+            waited += 0.1
+        if server.poll() is None:
+            server.kill()
+    else:
+        server.kill()
+        raise Exception("Couldn't get URL from local server")
+
+def register(url):
+    requests.delete(f"{url}/clear")
+    user = requests.post(f"{url}/auth/register", json={
+        'email': 'owner@email.com',
+        'password': 'password',
+        'name_first': 'Firstname',
+        'name_last': 'Lastname',
+    }).json()
+    c_id = requests.post(f"{url}/channels/create", json={
+        'token': user['token'],
+        'name': 'Channel',
+        'is_public': True,
+    }).json()['channel_id']
+    return user['token'], c_id
+
+def test_invalid_token(url):
+    register(url)
+    result = requests.post(f"{url}/batch", json={
+        'token': token_hash(1),
+        'operations': [{'method': 'GET', 'path': '/channels/list'}],
+    })
+    assert result.status_code == 400
+
+def test_screen(url):
+    token, c_id = register(url)
+    requests.post(f"{url}/message/send", json={'token': token, 'channel_id': c_id, 'message': 'hello'})
+
+    results = requests.post(f"{url}/batch", json={
+        'token': token,
+        'operations': [
+            {'method': 'GET', 'path': '/channel/details', 'params': {'channel_id': c_id}},
+            {'method': 'GET', 'path': '/channel/messages', 'params': {'channel_id': c_id, 'start': 0}},
+            {'method': 'GET', 'path': '/standup/active', 'params': {'channel_id': c_id}},
+        ],
+    }).json()['results']
+
+    assert [result['status'] for result in results] == [200, 200, 200]
+    assert results[0]['result']['name'] == 'Channel'
+    assert results[1]['result']['messages'][0]['message'] == 'hello'
+    assert results[2]['result']['is_active'] is False
@@ -0,0 +1,83 @@
+"""
+batch_test.py
+
+Test Modules:
+    test_invalid_token: fail case for invalid token
+    test_too_many_operations: fail case for more than MAX_OPERATIONS operations
+    test_in_order: success case for operations running in order with their own results
+    test_failed_operation: success case for a failing operation not stopping the rest
+    test_no_token_routes: fail case for routes which don't run as the batch's user
+    test_validated_once: success case for the token only being decoded once per batch
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import pytest
+import helper
+from error                      import AccessError, InputError
+from implement.channels         import channels_create
+from batch                      import batch, MAX_OPERATIONS
+from helper                     import token_hash, token_validator, trusted_token
+
+def test_invalid_token(owner):
+    with pytest.raises(AccessError):
+        batch(token_hash(1), [], 'localhost')
+
+def test_too_many_operations(owner):
+    operations = [{'path': '/channels/list'}] * (MAX_OPERATIONS + 1)
+    with pytest.raises(InputError):
+        batch(owner['token'], operations, 'localhost')
+
+def test_in_order(owner):
+    c_id = owner['c_id']
+    results = batch(owner['token'], [
+        {'method': 'POST', 'path': '/message/send', 'params': {'channel_id': c_id, 'message': 'hello'}},
+        {'method': 'GET', 'path': '/channel/messages', 'params': {'channel_id': c_id, 'start': 0}},
+        {'method': 'GET', 'path': '/user/profile', 'params': {'u_id': owner['u_id']}},
+    ], 'localhost')['results']
+
+    assert [result['status'] for result in results] == [200, 200, 200]
+    message_id = results[0]['result']['message_id']
+    assert [message['message_id'] for message in results[1]['result']['messages']] == [message_id]
+    assert results[2]['result']['user']['profile_img_url'].startswith('http://localhost/profile_pictures/')
+
+def test_failed_operation(owner):
+    results = batch(owner['token'], [
+        {'method': 'GET', 'path': '/channel/details', 'params': {'channel_id': 100}},
+        {'method': 'GET', 'path': '/channel/messages', 'params': {'channel_id': owner['c_id']}},
+        {'method': 'GET', 'path': '/channels/list'},
+    ], 'localhost')['results']
+
+    assert results[0]['status'] == 400
+    assert results[1] == {
+        'status': 400,
+        'name': 'System Error',
+        'message': 'Missing parameter start',
+    }
+    assert results[2]['status'] == 200
+
+def test_no_token_routes(owner):
+    results = batch(owner['token'], [
+        {'method': 'DELETE', 'path': '/clear'},
+        {'method': 'POST', 'path': '/auth/login', 'params': {'email': 'owner@email.com', 'password': 'password'}},
+        {'method': 'GET', 'path': '/not/a/route'},
+        {'method': 'POST', 'path': '/batch', 'params': {'operations': []}},
+        'not an operation',
+    ], 'localhost')['results']
+
+    assert [result['status'] for result in results] == [400, 400, 400, 400, 400]
+    assert channels_create(owner['token'], "Still here", True)
+
+def test_validated_once(owner, monkeypatch):
+    decoded = []
+    verify = helper.session_tokens.verify
+    monkeypatch.setattr(helper.session_tokens, 'verify', lambda token: decoded.append(token) or verify(token))
+
+    batch(owner['token'], [{'path': '/channels/list'}] * 5, 'localhost')
+    assert len(decoded) == 1
+
+    # Outside of a batch every call validates the token again
+    with trusted_token(owner['token']):
+        pass
+    token_validator(owner['token'])
+    assert len(decoded) == 3
@@ -0,0 +1,97 @@
+"""
+compression_test.py
+
+Fixtures:
+    client: conftest.py's client, with enough users for a large users/all response
+
+Test Modules:
+    test_negotiate: success case for picking the encoding from Accept-Encoding
+    test_gzip: success case for a large response being gzipped
+    test_deflate: success case for a large response being deflated
+    test_small_response: success case for a response under the threshold being sent as is
+    test_not_accepted: success case for clients which don't accept compression
+    test_not_modified: success case for a compressed response's ETag getting a 304
+    test_not_modified_small: success case for a response sent uncompressed keeping its ETag in the 304
+    test_compress_chunks: success case for a body being compressed in slices
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import pytest
+import gzip
+import json
+import zlib
+from compression    import negotiate, compress_chunks, SLICE_SIZE
+
+@pytest.fixture
+def client(client):
+    for i in range(19):
+        client.post('/auth/register', json={
+            'email': f"user{i}@email.com",
+            'password': 'password',
+            'name_first': 'Firstname',
+            'name_last': f"Lastname{i}",
+        })
+    return client
+
+def users_all(client, **headers):
+    return client.get('/users/all', query_string={'token': client.token}, headers=headers)
+
+def test_negotiate():
+    assert negotiate('gzip, deflate') == 'gzip'
+    assert negotiate('deflate') == 'deflate'
+    assert negotiate('gzip;q=0, deflate') == 'deflate'
+    assert negotiate('identity') is None
+    assert negotiate('') is None
+    assert negotiate('*') in ('br', 'gzip')
+
+def test_gzip(client):
+    plain = users_all(client).data
+    assert len(plain) >= 1024
+
+    result = users_all(client, **{'Accept-Encoding': 'gzip'})
+    assert result.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in result.headers['Vary']
+    assert 'Content-Length' not in result.headers
+    assert len(result.data) < len(plain)
+    assert json.loads(gzip.decompress(result.data)) == json.loads(plain)
+
+def test_deflate(client):
+    plain = users_all(client).data
+    result = users_all(client, **{'Accept-Encoding': 'deflate'})
+    assert result.headers['Content-Encoding'] == 'deflate'
+    assert zlib.decompress(result.data) == plain
+
+def test_small_response(client):
+    result = client.get('/echo', query_string={'data': 'hello'}, headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in result.headers
+    assert result.get_json() == {'data': 'hello'}
+
+def test_not_accepted(client):
+    result = users_all(client)
+    assert 'Content-Encoding' not in result.headers
+
+def test_not_modified(client):
+    etag = users_all(client, **{'Accept-Encoding': 'gzip'}).headers['ETag']
+    assert etag.endswith('-gzip"')
+
+    result = users_all(client, **{'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert result.status_code == 304
+    assert result.headers['ETag'] == etag
+
+def test_not_modified_small(client):
+    query = {'token': client.token, 'u_id': 0}
+    headers = {'Accept-Encoding': 'gzip'}
+    result = client.get('/user/profile', query_string=query, headers=headers)
+    assert 'Content-Encoding' not in result.headers
+    etag = result.headers['ETag']
+    assert not etag.endswith('-gzip"')
+
+    result = client.get('/user/profile', query_string=query, headers=dict(headers, **{'If-None-Match': etag}))
+    assert result.status_code == 304
+    assert result.headers['ETag'] == etag
+
+def test_compress_chunks():
+    body = [b'a' * (SLICE_SIZE * 3 + 10), b'b' * 10]
+    chunks = list(compress_chunks(body, 'gzip', 6))
+    assert gzip.decompress(b''.join(chunks)) == b''.join(body)
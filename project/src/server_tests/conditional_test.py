@@ -0,0 +1,85 @@
+"""
+conditional_test.py
+
+Test Modules:
+    test_etag: success case for read routes returning an ETag
+    test_not_modified: success case for a matching If-None-Match returning an empty 304
+    test_users_changed: success case for a profile change invalidating users/all and user/profile
+    test_channels_changed: success case for channel and message changes invalidating the channel routes
+    test_invalid_token: fail case for an invalid token with a matching If-None-Match
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+from helper     import token_hash
+
+def get(client, path, etag=None, **params):
+    headers = {'If-None-Match': etag} if etag else {}
+    return client.get(path, query_string=dict(params, token=client.token), headers=headers)
+
+def test_etag(client):
+    for path, params in [
+        ('/users/all', {}),
+        ('/channels/listall', {}),
+        ('/channel/details', {'channel_id': client.c_id}),
+        ('/user/profile', {'u_id': 0}),
+    ]:
+        result = get(client, path, **params)
+        assert result.status_code == 200
+        assert result.headers['ETag']
+        assert result.headers['Cache-Control'] == 'no-cache'
+
+def test_not_modified(client):
+    etag = get(client, '/users/all').headers['ETag']
+
+    result = get(client, '/users/all', etag)
+    assert result.status_code == 304
+    assert result.data == b''
+    assert result.headers['ETag'] == etag
+
+def test_users_changed(client):
+    users_etag = get(client, '/users/all').headers['ETag']
+    profile_etag = get(client, '/user/profile', u_id=0).headers['ETag']
+
+    client.put('/user/profile/setname', json={
+        'token': client.token,
+        'name_first': 'New',
+        'name_last': 'Name',
+    })
+
+    result = get(client, '/users/all', users_etag)
+    assert result.status_code == 200
+    assert result.get_json()['users'][0]['name_first'] == 'New'
+    assert get(client, '/user/profile', profile_etag, u_id=0).status_code == 200
+
+def test_channels_changed(client):
+    listall_etag = get(client, '/channels/listall').headers['ETag']
+    details_etag = get(client, '/channel/details', channel_id=client.c_id).headers['ETag']
+
+    client.post('/message/send', json={
+        'token': client.token,
+        'channel_id': client.c_id,
+        'message': 'Hello',
+    })
+
+    # A message changes listall, which includes the messages, but not details
+    assert get(client, '/channels/listall', listall_etag).status_code == 200
+    assert get(client, '/channel/details', details_etag, channel_id=client.c_id).status_code == 304
+
+    client.post('/auth/register', json={
+        'email': 'other@email.com',
+        'password': 'password',
+        'name_first': 'Other',
+        'name_last': 'User',
+    })
+    client.post('/channel/invite', json={
+        'token': client.token,
+        'channel_id': client.c_id,
+        'u_id': 1,
+    })
+    assert get(client, '/channel/details', details_etag, channel_id=client.c_id).status_code == 200
+
+def test_invalid_token(client):
+    etag = get(client, '/users/all').headers['ETag']
+    result = client.get('/users/all', query_string={'token': token_hash(1)}, headers={'If-None-Match': etag})
+    assert result.status_code == 400
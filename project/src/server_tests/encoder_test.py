@@ -0,0 +1,67 @@
+"""
+encoder_test.py
+
+Test Modules:
+    test_encoders_agree: success case for every available encoder producing the same JSON
+    test_unicode: success case for non-ascii messages being encoded as UTF-8
+    test_content_type: success case for routes returning application/json bytes
+    test_error_content_type: success case for errors returning application/json
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import json
+from encoder    import ENCODERS, encode
+from server     import APP
+
+PAYLOAD = {
+    'messages': [
+        {
+            'message_id': 0,
+            'u_id': 0,
+            'message': 'Example Message',
+            'time_created': 12345,
+            'reacts': [{'react_id': 1, 'u_ids': [0, 1], 'is_this_user_reacted': False}],
+            'is_pinned': False,
+        },
+    ],
+    'start': 0,
+    'end': -1,
+}
+
+def test_encoders_agree():
+    for encode_with in ENCODERS.values():
+        encoded = encode_with(PAYLOAD)
+        assert isinstance(encoded, bytes)
+        assert json.loads(encoded) == PAYLOAD
+
+def test_unicode():
+    for encode_with in ENCODERS.values():
+        encoded = encode_with({'message': 'héllo 👋'})
+        assert json.loads(encoded.decode('utf-8')) == {'message': 'héllo 👋'}
+
+def test_content_type():
+    client = APP.test_client()
+    client.delete('/clear')
+    result = client.post('/auth/register', json={
+        'email': 'owner@email.com',
+        'password': 'password',
+        'name_first': 'Firstname',
+        'name_last': 'Lastname',
+    })
+
+    assert result.status_code == 200
+    assert result.content_type == 'application/json'
+    assert result.data == encode(json.loads(result.data))
+
+def test_error_content_type():
+    client = APP.test_client()
+    client.delete('/clear')
+    result = client.post('/auth/login', json={
+        'email': 'owner@email.com',
+        'password': 'password',
+    })
+
+    assert result.status_code == 400
+    assert result.content_type == 'application/json'
+    assert json.loads(result.data)['code'] == 400
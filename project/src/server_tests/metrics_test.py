@@ -0,0 +1,125 @@
+"""
+metrics_test.py
+
+Fixtures:
+    client: conftest.py's client, with the metrics cleared
+
+Test Modules:
+    test_histogram: success case for values counted in the right bucket
+    test_render: success case for the text format of counters and histograms
+    test_escape: success case for label values with quotes and newlines
+    test_sampling_off: success case for requests going straight through when sampling is off
+    test_sampled: success case for only a fraction of requests being recorded
+    test_requests: success case for routes, statuses and sizes being recorded by server.py
+    test_phases: success case for implement and serialization time being told apart
+    test_unmatched: success case for unknown paths sharing one label
+    test_metrics_route: success case for /metrics in Prometheus' text format
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import re
+import pytest
+from werkzeug.test      import Client
+from werkzeug.wrappers  import BaseResponse
+from metrics            import Metrics, Instrumentation, Histogram, escape, RECORD
+from server             import METRICS
+
+def app(environ, start_response):
+    app.environ = environ
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'hello', b' world']
+
+@pytest.fixture
+def client(client, monkeypatch):
+    monkeypatch.setattr(METRICS, 'sample_rate', 1)
+    METRICS.clear()
+    return client
+
+def sample(text, name, **labels):
+    label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    if labels:
+        name += '{' + label_text + '}'
+    match = re.search(rf'^{re.escape(name)} (\S+)$', text, re.M)
+    return float(match.group(1)) if match else None
+
+def test_histogram():
+    histogram = Histogram((1, 10))
+    for value in (0.5, 1, 2, 10, 11):
+        histogram.observe(value)
+    # Bounds are inclusive, like Prometheus' le
+    assert histogram.counts == [2, 2, 1]
+    assert histogram.sum == 24.5
+
+def test_render():
+    metrics = Metrics()
+    limited = Client(Instrumentation(app, metrics), BaseResponse)
+    assert limited.get('/a').data == b'hello world'
+
+    text = metrics.render({'flockr_things': ('gauge', "Things", 3)})
+    assert '# TYPE flockr_requests_total counter' in text
+    assert sample(text, 'flockr_requests_total', method='GET', route='<unmatched>', status='200') == 1
+    assert sample(text, 'flockr_request_duration_seconds_bucket', route='<unmatched>', le='+Inf') == 1
+    assert sample(text, 'flockr_response_size_bytes_sum', route='<unmatched>') == 11
+    assert sample(text, 'flockr_response_size_bytes_bucket', route='<unmatched>', le='100') == 1
+    assert sample(text, 'flockr_things') == 3
+    assert text.endswith('\n')
+
+def test_escape():
+    assert escape('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+
+def test_sampling_off():
+    metrics = Metrics(sample_rate=0)
+    body = Instrumentation(app, metrics)({'REQUEST_METHOD': 'GET'}, lambda *args: None)
+    assert body == [b'hello', b' world']
+    assert RECORD not in app.environ
+    assert not metrics.requests
+
+def test_sampled(monkeypatch):
+    metrics = Metrics(sample_rate=0.5)
+    randoms = iter([0.1, 0.9, 0.4, 0.6])
+    monkeypatch.setattr('metrics.random.random', lambda: next(randoms))
+
+    limited = Client(Instrumentation(app, metrics), BaseResponse)
+    for _ in range(4):
+        limited.get('/a').data
+    assert sum(metrics.requests.values()) == 2
+
+def test_requests(client):
+    client.get('/users/all', query_string={'token': client.token}).data
+    client.get('/users/all', query_string={'token': 'invalid'}).data
+    client.post('/channels/create', json={'token': client.token, 'name': 'Channel', 'is_public': True}).data
+
+    text = METRICS.render()
+    assert sample(text, 'flockr_requests_total', method='GET', route='/users/all', status='200') == 1
+    assert sample(text, 'flockr_requests_total', method='GET', route='/users/all', status='400') == 1
+    assert sample(text, 'flockr_requests_total', method='POST', route='/channels/create', status='200') == 1
+    assert sample(text, 'flockr_request_size_bytes_sum', route='/channels/create') > 0
+    assert sample(text, 'flockr_response_size_bytes_sum', route='/users/all') > 0
+
+def test_phases(client):
+    client.get('/users/all', query_string={'token': client.token}).data
+
+    text = METRICS.render()
+    total = sample(text, 'flockr_request_duration_seconds_sum', route='/users/all')
+    phases = [sample(text, 'flockr_request_phase_seconds_sum', route='/users/all', phase=phase)
+              for phase in ('implement', 'serialize', 'other')]
+    assert all(seconds >= 0 for seconds in phases)
+    assert phases[1] > 0
+    assert sum(phases) == pytest.approx(total, rel=0.01)
+
+def test_unmatched(client):
+    client.get('/not/a/route').data
+    client.get('/another/one').data
+    assert sample(METRICS.render(), 'flockr_requests_total', method='GET', route='<unmatched>', status='404') == 2
+
+def test_metrics_route(client):
+    client.get('/channels/list', query_string={'token': client.token}).data
+
+    result = client.get('/metrics')
+    assert result.status_code == 200
+    assert result.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    text = result.data.decode()
+    assert sample(text, 'flockr_requests_total', method='GET', route='/channels/list', status='200') == 1
+    assert sample(text, 'flockr_metrics_sample_rate') == 1
+    assert sample(text, 'flockr_rate_limited_total') == 0
@@ -0,0 +1,207 @@
+"""
+pictures_test.py
+
+Fixtures:
+    picture: a 300x200 profile picture with its thumbnails saved
+
+Test Modules:
+    test_thumbnails: success case for every size and format being saved to fit within its size
+    test_full_picture: success case for no size serving the full picture with cache headers
+    test_size: success case for a size serving a progressive JPEG thumbnail
+    test_webp: success case for clients accepting WebP getting WebP
+    test_no_thumbnails: success case for a picture without thumbnails serving the full picture
+    test_invalid_size: fail case for a size with no thumbnails
+    test_avatar_cache: success case for small thumbnails being read once and evicted least recently used first
+    test_store_picture: success case for a picture being stored once under the hash of its contents
+    test_stored_picture: success case for serving a content addressed picture and its thumbnails
+    test_collect_garbage: success case for removing unreferenced pictures and temporary files after the grace period
+    test_etag: success case for pictures having a strong ETag, immutable when content addressed
+    test_not_modified: success case for a matching If-None-Match getting a 304 without the file being read
+    test_not_modified_no_thumbnails: success case for a 304 when a size is served by a picture without thumbnails
+    test_range: success case for a Range request getting part of a picture
+    test_invalid_path: fail case for paths which aren't a picture's name
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import io
+import uuid
+import pytest
+import pictures
+from PIL            import Image
+from server         import APP
+from pictures       import save_thumbnails, thumbnail_name, AvatarCache, THUMBNAIL_SIZES, THUMBNAIL_FORMATS, \
+                           store_picture, picture_path, collect_garbage
+
+@pytest.fixture
+def picture():
+    directory = APP.config["CLIENT_IMAGES"]
+    image_url = f"{uuid.uuid4()}.jpg"
+    image = Image.new('RGB', (300, 200), (10, 120, 200))
+    image.save(os.path.join(directory, image_url))
+    save_thumbnails(image, directory, image_url)
+
+    yield image_url
+
+    for name in os.listdir(directory):
+        if name.startswith(image_url[:-len('.jpg')]):
+            os.remove(os.path.join(directory, name))
+
+def test_thumbnails(picture):
+    for size in THUMBNAIL_SIZES:
+        for extension in THUMBNAIL_FORMATS:
+            path = os.path.join(APP.config["CLIENT_IMAGES"], thumbnail_name(picture, size, extension))
+            with Image.open(path) as thumbnail:
+                assert max(thumbnail.size) == size
+
+def test_full_picture(client, picture):
+    result = client.get(f"/profile_pictures/{picture}")
+    assert result.status_code == 200
+    assert Image.open(io.BytesIO(result.data)).size == (300, 200)
+    assert 'max-age' in result.headers['Cache-Control']
+
+def test_size(client, picture):
+    result = client.get(f"/profile_pictures/{picture}?size=64")
+    assert result.status_code == 200
+    assert result.mimetype == 'image/jpeg'
+    assert result.headers['Vary'] == 'Accept'
+
+    image = Image.open(io.BytesIO(result.data))
+    assert image.size == (64, 43)
+    assert image.info.get('progressive')
+
+def test_webp(client, picture):
+    result = client.get(f"/profile_pictures/{picture}?size=256", headers={'Accept': 'image/webp,*/*'})
+    assert result.mimetype == 'image/webp'
+    assert Image.open(io.BytesIO(result.data)).format == 'WEBP'
+
+def test_no_thumbnails(client, picture):
+    for name in os.listdir(APP.config["CLIENT_IMAGES"]):
+        if name.startswith(picture[:-len('.jpg')]) and name != picture:
+            os.remove(os.path.join(APP.config["CLIENT_IMAGES"], name))
+
+    result = client.get(f"/profile_pictures/{picture}?size=32")
+    assert result.status_code == 200
+    assert Image.open(io.BytesIO(result.data)).size == (300, 200)
+
+def test_invalid_size(client, picture):
+    assert client.get(f"/profile_pictures/{picture}?size=100").status_code == 400
+
+def test_avatar_cache(picture, monkeypatch):
+    cache = AvatarCache(max_items=2)
+    paths = [os.path.join(APP.config["CLIENT_IMAGES"], thumbnail_name(picture, size, 'jpg')) for size in THUMBNAIL_SIZES]
+
+    content = cache.get(paths[0])
+    os.remove(paths[0])
+    assert cache.get(paths[0]) == content
+
+    cache.get(paths[1])
+    cache.get(paths[2])
+    assert list(cache.items) == paths[1:]
+    with pytest.raises(FileNotFoundError):
+        cache.get(paths[0])
+
+def test_store_picture(tmp_path):
+    image = Image.new('RGB', (50, 50), (1, 2, 3))
+    name = store_picture(image, str(tmp_path))
+
+    assert name == store_picture(image.copy(), str(tmp_path))
+    assert name != store_picture(Image.new('RGB', (50, 50)), str(tmp_path))
+
+    path = picture_path(str(tmp_path), name)
+    assert path == os.path.join(str(tmp_path), name[:2], name[2:4], name)
+    assert len(os.listdir(os.path.dirname(path))) == 7
+
+def test_stored_picture(client):
+    directory = APP.config["CLIENT_IMAGES"]
+    name = store_picture(Image.new('RGB', (100, 80), (200, 0, 0)), directory)
+    try:
+        assert Image.open(io.BytesIO(client.get(f"/profile_pictures/{name}").data)).size == (100, 80)
+        assert Image.open(io.BytesIO(client.get(f"/profile_pictures/{name}?size=64").data)).size == (64, 51)
+    finally:
+        shard = os.path.dirname(picture_path(directory, name))
+        for stored in os.listdir(shard):
+            if stored.startswith(name.split('.')[0]):
+                os.remove(os.path.join(shard, stored))
+    assert client.get(f"/profile_pictures/{name}").status_code == 404
+
+def test_collect_garbage(tmp_path):
+    directory = str(tmp_path)
+    kept = store_picture(Image.new('RGB', (10, 10), (1, 1, 1)), directory)
+    removed = store_picture(Image.new('RGB', (10, 10), (2, 2, 2)), directory)
+    for other in ['default.jpg', f"{uuid.uuid4()}.jpg", 'left.part']:
+        open(os.path.join(directory, other), 'wb').close()
+
+    # Nothing has been unreferenced for long enough yet
+    assert collect_garbage(directory, {kept}) == 0
+
+    assert collect_garbage(directory, {kept}, grace=-1) == 8
+    assert os.path.exists(picture_path(directory, kept))
+    assert os.path.exists(picture_path(directory, thumbnail_name(kept, 32, 'webp')))
+    assert not os.path.exists(picture_path(directory, removed))
+    assert os.path.exists(os.path.join(directory, 'default.jpg'))
+    assert not os.path.exists(os.path.join(directory, 'left.part'))
+
+def test_etag(client, picture):
+    result = client.get(f"/profile_pictures/{picture}?size=256")
+    assert result.headers['ETag'] == f'"{thumbnail_name(picture, 256, "jpg")}"'
+    assert 'immutable' not in result.headers['Cache-Control']
+
+    directory = APP.config["CLIENT_IMAGES"]
+    name = store_picture(Image.new('RGB', (20, 20), (0, 0, 200)), directory)
+    try:
+        result = client.get(f"/profile_pictures/{name}")
+        assert result.headers['ETag'] == f'"{name}"'
+        assert 'immutable' in result.headers['Cache-Control']
+    finally:
+        shard = os.path.dirname(picture_path(directory, name))
+        for stored in os.listdir(shard):
+            if stored.startswith(name.split('.')[0]):
+                os.remove(os.path.join(shard, stored))
+
+def test_not_modified(client, picture):
+    # The picture doesn't exist, the name alone is enough
+    name = 'a' * 64 + '.jpg'
+    result = client.get(f"/profile_pictures/{name}", headers={'If-None-Match': f'"{name}"'})
+    assert result.status_code == 304
+    assert result.data == b''
+    assert 'immutable' in result.headers['Cache-Control']
+
+    thumbnail = thumbnail_name(picture, 32, 'webp')
+    result = client.get(f"/profile_pictures/{picture}?size=32", headers={
+        'If-None-Match': f'"{thumbnail}"',
+        'Accept': 'image/webp',
+    })
+    assert result.status_code == 304
+    assert result.headers['ETag'] == f'"{thumbnail}"'
+
+    # The size is checked before the ETag
+    result = client.get(f"/profile_pictures/{picture}?size=100", headers={'If-None-Match': f'"{picture}"'})
+    assert result.status_code == 400
+
+def test_not_modified_no_thumbnails(client, picture):
+    for name in os.listdir(APP.config["CLIENT_IMAGES"]):
+        if name.startswith(picture[:-len('.jpg')]) and name != picture:
+            os.remove(os.path.join(APP.config["CLIENT_IMAGES"], name))
+
+    # The full picture is served for every size, so its name is the ETag
+    result = client.get(f"/profile_pictures/{picture}?size=32")
+    assert result.headers['ETag'] == f'"{picture}"'
+    result = client.get(f"/profile_pictures/{picture}?size=32", headers={'If-None-Match': result.headers['ETag']})
+    assert result.status_code == 304
+
+def test_range(client, picture):
+    full = client.get(f"/profile_pictures/{picture}").data
+    result = client.get(f"/profile_pictures/{picture}", headers={'Range': 'bytes=10-19'})
+    assert result.status_code == 206
+    assert result.data == full[10:20]
+    assert result.headers['Content-Range'] == f"bytes 10-19/{len(full)}"
+
+    result = client.get(f"/profile_pictures/{picture}?size=32", headers={'Range': 'bytes=0-3'})
+    assert result.status_code == 206
+    assert len(result.data) == 4
+
+def test_invalid_path(client, picture):
+    assert client.get(f"/profile_pictures/..").status_code == 404
+    assert client.get(f"/profile_pictures/src/server.py").status_code == 404
+    assert client.get(f"/profile_pictures/missing.jpg").status_code == 404
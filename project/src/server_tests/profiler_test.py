@@ -0,0 +1,143 @@
+"""
+profiler_test.py
+
+Fixtures:
+    client: conftest.py's client, with a member registered after the Flockr owner
+
+Test Modules:
+    test_collapse: success case for a frame's stack, outermost first
+    test_sample_seconds: success case for sampling requests for some seconds
+    test_cprofile_requests: success case for profiling the next requests to a route
+    test_pstats_output: success case for marshalled stats pstats can load
+    test_one_at_a_time: fail case for a second profile while one is running
+    test_invalid: fail case for invalid arguments
+    test_not_owner: fail case for a member asking for a profile
+    test_profile_route: success case for /admin/profile profiling other requests
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import time
+import marshal
+import threading
+import pytest
+from werkzeug.test      import Client
+from werkzeug.wrappers  import BaseResponse
+from error              import InputError
+from profiler           import Profiling, collapse, frame_name
+from server             import APP
+
+def busy(environ, start_response):
+    deadline = time.perf_counter() + 0.02
+    while time.perf_counter() < deadline:
+        pass
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'done']
+
+def send(profiling, path, count, delay=0.05):
+    # Started after the profile, which is waiting for them
+    def run():
+        time.sleep(delay)
+        client = Client(profiling, BaseResponse)
+        for _ in range(count):
+            client.get(path)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+@pytest.fixture
+def client(client):
+    member = client.post('/auth/register', json={
+        'email': "member@email.com",
+        'password': 'password',
+        'name_first': 'Firstname',
+        'name_last': 'Lastname',
+    }).get_json()
+    client.tokens = [client.token, member['token']]
+    return client
+
+def test_collapse():
+    def inner():
+        return collapse(sys._getframe())
+    stack = inner().split(';')
+    assert stack[-1].startswith('inner (profiler_test.py:')
+    assert stack[-2] == frame_name(sys._getframe())
+
+def test_sample_seconds():
+    profiling = Profiling(busy)
+    thread = send(profiling, '/search', 10)
+    stacks = profiling.profile('sample', seconds=0.4).decode()
+    thread.join()
+
+    lines = stacks.splitlines()
+    assert lines
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+    assert any('busy (profiler_test.py:' in line for line in lines)
+    assert profiling.session is None
+
+def test_cprofile_requests():
+    profiling = Profiling(busy)
+    thread = send(profiling, '/other', 3)
+    # Other routes aren't counted
+    send_search = send(profiling, '/search', 5, delay=0.2)
+    text = profiling.profile('cprofile', requests=3, route='/search').decode()
+    thread.join()
+    send_search.join()
+
+    assert text.startswith('3 requests')
+    assert 'busy' in text
+
+def test_pstats_output():
+    profiling = Profiling(busy)
+    thread = send(profiling, '/search', 2)
+    stats = marshal.loads(profiling.profile('cprofile', requests=2, output='pstats'))
+    thread.join()
+    assert any(name == 'busy' for _, _, name in stats)
+
+def test_one_at_a_time():
+    profiling = Profiling(busy)
+    running = threading.Thread(target=profiling.profile, kwargs={'seconds': 0.3})
+    running.start()
+    time.sleep(0.05)
+    with pytest.raises(InputError):
+        profiling.profile(seconds=0.1)
+    running.join()
+
+@pytest.mark.parametrize('kwargs', [
+    {'mode': 'trace', 'seconds': 1},
+    {'mode': 'sample'},
+    {'mode': 'sample', 'seconds': 0},
+    {'mode': 'sample', 'seconds': 10000},
+    {'mode': 'sample', 'requests': 0},
+    {'mode': 'sample', 'seconds': 1, 'output': 'pstats'},
+])
+def test_invalid(kwargs):
+    with pytest.raises(InputError):
+        Profiling(busy).profile(**kwargs)
+
+def test_not_owner(client):
+    result = client.get('/admin/profile', query_string={'token': client.tokens[1], 'seconds': 0.1})
+    assert result.status_code == 400
+    assert 'owner' in result.get_json()['message']
+
+def test_profile_route(client):
+    def run():
+        time.sleep(0.05)
+        other = APP.test_client()
+        for _ in range(3):
+            other.get('/channels/listall', query_string={'token': client.tokens[1]}).data
+    thread = threading.Thread(target=run)
+    thread.start()
+
+    result = client.get('/admin/profile', query_string={
+        'token': client.tokens[0],
+        'mode': 'cprofile',
+        'route': '/channels/listall',
+        'requests': 3,
+    })
+    thread.join()
+
+    assert result.status_code == 200
+    text = result.data.decode()
+    assert text.startswith('3 requests')
+    assert 'channels_listall' in text
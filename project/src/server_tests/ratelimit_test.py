@@ -0,0 +1,187 @@
+"""
+ratelimit_test.py
+
+Fixtures:
+    app: a WSGI app which answers every request with its token, wrapped in RateLimit
+
+Test Modules:
+    test_token_limit: fail case for a token going over its burst, refused with CORS headers
+    test_refill: success case for a bucket refilling at its rate
+    test_ip_limit: fail case for an IP address going over its burst across tokens
+    test_route_costs: fail case for an expensive route using up the bucket sooner
+    test_cost_over_burst: success case for a route costing more than the burst running on a full bucket
+    test_batch_cost: fail case for a batch costing what its operations would cost sent one at a time
+    test_batch_too_large: fail case for a batch body over MAX_BATCH_BODY being refused without being read
+    test_json_token: success case for a token in a JSON body being limited and still read by the route
+    test_request_token: success case for finding the token, or no token, in a request
+    test_concurrency: fail case for requests beyond max_concurrent being shed with a 503
+    test_waiting_routes: success case for event streams not counting towards max_concurrent
+    test_prune: success case for full buckets being forgotten
+    test_server: fail case for server.py refusing a client over its rate, with Flask-CORS' headers
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import io
+import json
+import threading
+import pytest
+from werkzeug.test      import Client
+from werkzeug.wrappers  import BaseResponse
+from ratelimit          import RateLimit, request_token, batch_paths, MAX_BATCH_BODY
+
+def echo(environ, start_response):
+    length = int(environ.get('CONTENT_LENGTH') or 0)
+    body = environ['wsgi.input'].read(length) if length else b''
+    start_response('200 OK', [('Content-Type', 'application/json')])
+    return [body or b'{}']
+
+def client(limit):
+    return Client(limit, BaseResponse)
+
+def test_token_limit():
+    limit = RateLimit(echo, rate=1, burst=3, ip_rate=0, max_concurrent=0)
+    statuses = [client(limit).get('/channels/list', query_string={'token': 'a'}).status_code for _ in range(5)]
+    assert statuses == [200, 200, 200, 429, 429]
+    assert limit.limited == 2
+
+    # Other tokens have their own bucket
+    assert client(limit).get('/channels/list', query_string={'token': 'b'}).status_code == 200
+
+    refused = client(limit).get('/channels/list', query_string={'token': 'a'})
+    assert refused.headers['Retry-After'] == '1'
+    assert json.loads(refused.data)['code'] == 429
+    assert refused.headers['Access-Control-Allow-Origin'] == '*'
+
+def test_refill():
+    limit = RateLimit(echo, rate=2, burst=2, ip_rate=0)
+    assert limit.take([('token', 'a')], 2, now=100) == 0
+    assert limit.take([('token', 'a')], 1, now=100) == pytest.approx(0.5)
+    assert limit.take([('token', 'a')], 1, now=100.5) == 0
+
+def test_ip_limit():
+    limit = RateLimit(echo, rate=100, burst=100, ip_rate=1, ip_burst=2, max_concurrent=0)
+    statuses = [client(limit).get('/channels/list', query_string={'token': token}).status_code
+                for token in 'abc']
+    assert statuses == [200, 200, 429]
+
+def test_route_costs():
+    limit = RateLimit(echo, rate=1, burst=10, ip_rate=0, costs={'/search': 5})
+    statuses = [client(limit).get('/search', query_string={'token': 'a'}).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    assert client(limit).get('/search', query_string={'token': 'a'}).headers['Retry-After'] == '5'
+
+def test_cost_over_burst():
+    limit = RateLimit(echo, rate=1, burst=3, ip_rate=0, costs={'/search': 10})
+    assert limit.take([('token', 'a')], 10, now=0) == 0
+    # The whole cost was taken, 7 below empty, so it is 9 seconds until the bucket is full again
+    assert limit.take([('token', 'a')], 10, now=1) == pytest.approx(9)
+    assert limit.take([('token', 'a')], 10, now=10) == 0
+
+def test_batch_cost():
+    limit = RateLimit(echo, rate=1, burst=20, ip_rate=0, costs={'/search': 5})
+    searches = {'token': 'a', 'operations': [{'path': '/search', 'params': {'query_str': 'hi'}}] * 3}
+    sent = client(limit).post('/batch', json=searches)
+    assert json.loads(sent.data) == searches
+    # 15 of the 20 were taken, one search is 5 and the batch has 3
+    assert limit.buckets['token', 'a'].tokens == pytest.approx(5, abs=0.1)
+
+    many = {'token': 'b', 'operations': [{'path': '/search'}] * 100}
+    assert client(limit).post('/batch', json=many).status_code == 200
+    assert client(limit).post('/batch', json={'token': 'b', 'operations': []}).status_code == 429
+    assert client(limit).post('/channels/list', json={'token': 'b'}).status_code == 429
+
+    assert batch_paths({'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': '2',
+                        'wsgi.input': io.BytesIO(b'[]')}) == []
+
+class UnreadInput:
+    def read(self, *args):
+        raise AssertionError("the body was read")
+
+def test_batch_too_large():
+    limit = RateLimit(echo, rate=1, burst=20, ip_rate=0)
+    started = []
+    body = limit({
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': '/batch',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(MAX_BATCH_BODY + 1),
+        'HTTP_ORIGIN': 'http://frontend',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': UnreadInput(),
+    }, lambda status, headers: started.append((status, dict(headers))))
+
+    status, headers = started[0]
+    assert status.startswith('413')
+    assert json.loads(b''.join(body))['code'] == 413
+    assert 'Retry-After' not in headers
+    assert headers['Access-Control-Allow-Origin'] == 'http://frontend'
+    assert limit.buckets == {}
+
+def test_json_token():
+    limit = RateLimit(echo, rate=1, burst=1, ip_rate=0)
+    body = {'token': 'a', 'message': 'hello'}
+
+    sent = client(limit).post('/message/send', json=body)
+    assert json.loads(sent.data) == body
+    assert client(limit).post('/message/send', json=body).status_code == 429
+    assert client(limit).post('/message/send', json={'token': 'b'}).status_code == 200
+
+def test_request_token():
+    assert request_token({'QUERY_STRING': 'token=abc&x=1'}) == 'abc'
+    assert request_token({'QUERY_STRING': ''}) is None
+    assert request_token({'QUERY_STRING': '', 'CONTENT_TYPE': 'text/plain', 'CONTENT_LENGTH': '5'}) is None
+
+def test_concurrency():
+    entered = threading.Event()
+    finish = threading.Event()
+
+    def slow(environ, start_response):
+        entered.set()
+        finish.wait(5)
+        return echo(environ, start_response)
+
+    limit = RateLimit(slow, rate=0, ip_rate=0, max_concurrent=1)
+    first = threading.Thread(target=lambda: client(limit).get('/search').data)
+    first.start()
+    entered.wait(5)
+
+    shed = client(limit).get('/search', headers={'Origin': 'http://frontend'})
+    assert shed.status_code == 503
+    assert limit.shed == 1
+    assert shed.headers['Access-Control-Allow-Origin'] == 'http://frontend'
+    assert shed.headers['Access-Control-Expose-Headers'] == 'Retry-After'
+
+    finish.set()
+    first.join()
+    assert limit.active == 0
+    assert client(limit).get('/search').status_code == 200
+
+def test_waiting_routes():
+    limit = RateLimit(echo, rate=0, ip_rate=0, max_concurrent=1)
+    limit.active = 1
+    assert client(limit).get('/events/stream').status_code == 200
+    assert client(limit).get('/channels/list').status_code == 503
+
+def test_prune():
+    limit = RateLimit(echo, rate=1, burst=2, ip_rate=0, max_buckets=2)
+    limit.take([('token', 'a')], 1, now=0)
+    limit.take([('token', 'b')], 1, now=0)
+    # a and b are full again by the time c is added, c has just been used
+    limit.take([('token', 'c')], 1, now=10)
+    assert list(limit.buckets) == [('token', 'c')]
+
+def test_server(monkeypatch):
+    from server import APP
+    limit = APP.wsgi_app
+    assert isinstance(limit, RateLimit)
+    monkeypatch.setattr(limit, 'limits', {'token': (1, 2), 'ip': (0, 0)})
+    monkeypatch.setattr(limit, 'buckets', {})
+
+    test_client = APP.test_client()
+    responses = [test_client.get('/channels/list', query_string={'token': 'x'}, headers={'Origin': 'http://frontend'})
+                 for _ in range(3)]
+    assert [response.status_code for response in responses] == [400, 400, 429]
+    # Refused the same way Flask-CORS would have answered
+    for header in ('Access-Control-Allow-Origin', 'Vary'):
+        assert responses[2].headers[header] == responses[0].headers[header]
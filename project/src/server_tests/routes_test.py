@@ -0,0 +1,29 @@
+"""
+routes_test.py
+
+Test Modules:
+    test_missing_routes: success case for the routes an entry point doesn't serve
+    test_server_serves_every_route: success case for server.py serving every route in routes.py
+    test_asgi_serves_every_route: success case for asgi.py serving every route with server.py's app
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+from routes import ROUTES, SERVED_ROUTES, missing_routes
+
+def test_missing_routes():
+    assert missing_routes(set(ROUTES) | set(SERVED_ROUTES)) == set()
+    assert missing_routes(set(ROUTES)) == set(SERVED_ROUTES)
+    assert ('POST', '/batch') in missing_routes(set(SERVED_ROUTES))
+
+def test_server_serves_every_route():
+    from server import APP
+    served = {(method, rule.rule) for rule in APP.url_map.iter_rules() for method in rule.methods}
+    assert missing_routes(served) == set()
+
+def test_asgi_serves_every_route():
+    # Every request asgi.py doesn't wait for on the loop is served by server.py's app
+    from asgi import APP, WAITING_ROUTES
+    from server import APP as server_app
+    assert APP is server_app
+    assert set(WAITING_ROUTES) <= set(ROUTES) | set(SERVED_ROUTES)
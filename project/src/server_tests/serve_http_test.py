@@ -0,0 +1,78 @@
+"""
+serve_http_test.py
+
+Fixtures:
+    url: starts serve.py with two workers and a state process
+
+Test Modules:
+    test_workers_share_state: success case for requests handled by different workers seeing the same data
+    test_error_response: fail case for errors from the state process returning a 400
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import pytest
+import re
+import signal
+import requests
+from subprocess     import Popen, PIPE
+from time           import sleep
+
+@pytest.fixture
+def url():
+    url_re = re.compile(r' \* Running on ([^ ]*)')
+    server = Popen(["python3", "src/serve.py", "0", "2"], stderr=PIPE, stdout=PIPE)
+    line = server.stderr.readline()
+    local_url = url_re.match(line.decode())
+    if local_url:
+        yield local_url.group(1).rstrip('/')
+        # Terminate the server
+        server.send_signal(signal.SIGINT)
+        waited = 0
+        while server.poll() is None and waited < 5:
+            sleep(0.1)
+            waited += 0.1
+        if server.poll() is None:
+            server.kill()
+    else:
+        server.kill()
+        raise Exception("Couldn't get URL from local server")
+
+def test_workers_share_state(url):
+    requests.delete(f"{url}/clear")
+    user = requests.post(f"{url}/auth/register", json={
+        'email': 'owner@email.com',
+        'password': 'password',
+        'name_first': 'Firstname',
+        'name_last': 'Lastname',
+    }).json()
+
+    c_id = requests.post(f"{url}/channels/create", json={
+        'token': user['token'],
+        'name': 'Channel',
+        'is_public': True,
+    }).json()['channel_id']
+
+    # Enough requests that both workers will have handled some of them
+    for i in range(20):
+        requests.post(f"{url}/message/send", json={
+            'token': user['token'],
+            'channel_id': c_id,
+            'message': f"Message {i}",
+        })
+
+    messages = requests.get(f"{url}/channel/messages", params={
+        'token': user['token'],
+        'channel_id': c_id,
+        'start': 0,
+    }).json()['messages']
+
+    assert [message['message_id'] for message in messages] == list(range(20))
+
+def test_error_response(url):
+    requests.delete(f"{url}/clear")
+    result = requests.post(f"{url}/auth/login", json={
+        'email': 'owner@email.com',
+        'password': 'password',
+    })
+    assert result.status_code == 400
@@ -0,0 +1,74 @@
+"""
+state_server_test.py
+
+Fixtures:
+    state: starts a state process on a temporary unix socket and connects to it
+
+Test Modules:
+    test_remote_call: success case for an implement/ call running in the state process
+    test_shared_between_connections: success case for two workers seeing the same data
+    test_remote_error: fail case for errors being raised in the worker
+    test_batch: success case for a /batch running its operations in the state process
+    test_module_not_allowed: fail case for calling a module which isn't in implement/
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import pytest
+import tempfile
+from error          import AccessError, InputError
+from helper         import token_hash
+from serve          import start_state_process
+from state_server   import connect
+
+@pytest.fixture
+def state():
+    address = os.path.join(tempfile.mkdtemp(), 'state.sock')
+    authkey = os.urandom(16)
+    state_process = start_state_process(address, authkey)
+    connection = connect(address, authkey)
+    connection.call('implement.other', 'clear')
+    yield {'address': address, 'authkey': authkey, 'connection': connection}
+    state_process.terminate()
+    state_process.join()
+    os.remove(address)
+
+def test_remote_call(state):
+    auth = state['connection'].module('implement.auth')
+    user = auth.auth_register("test@gmail.com", "pass123", "Wilson", "Doe")
+    assert user == {'u_id': 0, 'token': token_hash(0)}
+
+def test_shared_between_connections(state):
+    first = state['connection']
+    second = connect(state['address'], state['authkey'])
+
+    user = first.module('implement.auth').auth_register("test@gmail.com", "pass123", "Wilson", "Doe")
+    c_id = first.module('implement.channels').channels_create(user['token'], "Channel", True)['channel_id']
+    second.module('implement.message').message_send(user['token'], c_id, "Hello")
+
+    messages = first.module('implement.channel').channel_messages(user['token'], c_id, 0)['messages']
+    assert [message['message'] for message in messages] == ["Hello"]
+
+def test_remote_error(state):
+    auth = state['connection'].module('implement.auth')
+    with pytest.raises(InputError):
+        auth.auth_login("test@gmail.com", "pass123")
+
+    with pytest.raises(AccessError):
+        state['connection'].module('implement.channels').channels_list(token_hash(0))
+
+def test_batch(state):
+    user = state['connection'].module('implement.auth').auth_register("test@gmail.com", "pass123", "Wilson", "Doe")
+    results = state['connection'].module('batch').batch(user['token'], [
+        {'method': 'POST', 'path': '/channels/create', 'params': {'name': "Channel", 'is_public': True}},
+        {'path': '/channels/list'},
+        {'path': '/channel/details', 'params': {'channel_id': 99}},
+    ], 'localhost')['results']
+
+    assert results[0] == {'status': 200, 'result': {'channel_id': 0}}
+    assert [channel['name'] for channel in results[1]['result']['channels']] == ["Channel"]
+    assert results[2]['status'] == 400
+
+def test_module_not_allowed(state):
+    with pytest.raises(ValueError):
+        state['connection'].call('os', 'getcwd')
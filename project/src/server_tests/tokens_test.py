@@ -0,0 +1,91 @@
+"""
+tokens_test.py
+
+Test Modules:
+    test_same_as_pyjwt: success case for tokens matching PyJWT's byte for byte
+    test_verify_pyjwt: success case for tokens from PyJWT being verified
+    test_round_trip: success case for a signed payload being verified
+    test_wrong_secret: fail case for a token signed with another secret
+    test_tampered: fail case for a token with a changed payload or signature
+    test_malformed: fail case for strings which aren't tokens
+    test_time_claims: fail case for an expired token, checked by PyJWT
+    test_verified_copy: success case for a remembered payload not being changed by a caller
+    test_token_validator: fail case for a forged session token being an AccessError
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import time
+import jwt
+import pytest
+from tokens             import TokenSigner, InvalidToken
+from error              import AccessError
+from helper             import token_validator, SECRET
+from implement.auth     import auth_register
+from implement.other    import clear
+
+PAYLOADS = [
+    {'u_id': 0},
+    {'u_id': 123456},
+    {'email': 'validemail@gmail.com'},
+    {'email': 'üñíçødé@example.com', 'nested': [1, {'a': None}]},
+]
+
+@pytest.mark.parametrize('payload', PAYLOADS)
+def test_same_as_pyjwt(payload):
+    signer = TokenSigner('secret')
+    assert signer.sign(payload) == jwt.encode(payload, 'secret', algorithm='HS256').decode()
+
+@pytest.mark.parametrize('payload', PAYLOADS)
+def test_verify_pyjwt(payload):
+    token = jwt.encode(payload, 'secret', algorithm='HS256').decode()
+    assert TokenSigner('secret').verify(token) == payload
+
+def test_round_trip():
+    signer = TokenSigner('secret')
+    token = signer.sign({'u_id': 5})
+    assert signer.verify(token) == {'u_id': 5}
+    # Remembered the second time
+    assert signer.verify(token) == {'u_id': 5}
+    assert token in signer.verified
+
+def test_wrong_secret():
+    token = TokenSigner('secret').sign({'u_id': 5})
+    with pytest.raises(InvalidToken):
+        TokenSigner('another secret').verify(token)
+
+def test_tampered():
+    signer = TokenSigner('secret')
+    header, payload, signature = signer.sign({'u_id': 5}).split('.')
+    forged = jwt.utils.base64url_encode(b'{"u_id":1}').decode()
+
+    with pytest.raises(InvalidToken):
+        signer.verify('.'.join([header, forged, signature]))
+    with pytest.raises(InvalidToken):
+        signer.verify('.'.join([header, payload, signature[:-2] + 'AA']))
+    assert not signer.verified
+
+@pytest.mark.parametrize('token', ['', 'not a token', 'a.b.c', 'eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9.!!!.abc', None])
+def test_malformed(token):
+    with pytest.raises(InvalidToken):
+        TokenSigner('secret').verify(token)
+
+def test_time_claims():
+    expired = jwt.encode({'u_id': 5, 'exp': int(time.time()) - 10}, 'secret', algorithm='HS256').decode()
+    with pytest.raises(InvalidToken):
+        TokenSigner('secret').verify(expired)
+
+def test_verified_copy():
+    signer = TokenSigner('secret')
+    token = signer.sign({'u_id': 5})
+    signer.verify(token)['u_id'] = 6
+    assert signer.verify(token) == {'u_id': 5}
+
+def test_token_validator():
+    clear()
+    user = auth_register('validemail@gmail.com', 'password123', 'Jayden', 'Leung')
+    assert token_validator(user['token'])['u_id'] == user['u_id']
+
+    forged = TokenSigner(SECRET + 'x').sign({'u_id': user['u_id']})
+    with pytest.raises(AccessError):
+        token_validator(forged)
@@ -0,0 +1,45 @@
+"""
+users_all_cache_test.py
+
+Test Modules:
+    test_cached: success case for a second users/all being served without calling users_all
+    test_profile_change: success case for a profile change rebuilding the response
+    test_hosts: success case for each host getting its own profile_img_urls
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import server
+
+def users_all(client, base_url='http://localhost'):
+    return client.get('/users/all', query_string={'token': client.token}, base_url=base_url)
+
+def test_cached(client, monkeypatch):
+    first = users_all(client)
+
+    def users_all_called(token):
+        raise AssertionError("users_all should not be called")
+
+    monkeypatch.setattr(server.o, 'users_all', users_all_called)
+    second = users_all(client)
+
+    assert second.status_code == 200
+    assert second.data == first.data
+    assert second.content_type == 'application/json'
+
+def test_profile_change(client):
+    users_all(client)
+    client.put('/user/profile/setname', json={
+        'token': client.token,
+        'name_first': 'New',
+        'name_last': 'Name',
+    })
+
+    assert users_all(client).get_json()['users'][0]['name_first'] == 'New'
+
+def test_hosts(client):
+    first = users_all(client, 'http://first.com')
+    second = users_all(client, 'http://second.com')
+
+    assert first.get_json()['users'][0]['profile_img_url'] == 'http://first.com/profile_pictures/default.jpg'
+    assert second.get_json()['users'][0]['profile_img_url'] == 'http://second.com/profile_pictures/default.jpg'
@@ -0,0 +1,124 @@
+"""
+state_server.py
+    - keeps the flockr data in a single process and runs implement/ calls for the
+      worker processes started by serve.py, so every worker sees the same data
+
+Main Modules:
+    State: runs implement/ calls against the shared data
+    serve: runs the state process, listening on a unix socket
+    connect: connects a worker to the state process
+    StateConnection: a worker's connection, which sends calls to the state process
+    RemoteModule: stands in for an implement/ module by forwarding calls to the state process
+    implement_modules: the implement/ modules, or their remote stand-ins under serve.py
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import importlib
+import pickle
+from multiprocessing.managers import BaseManager
+
+# Only these modules can be called through the state process
+MODULES = (
+    'batch',
+    'events',
+    'implement.auth',
+    'implement.channel',
+    'implement.channels',
+    'implement.message',
+    'implement.other',
+    'implement.standup',
+    'implement.user',
+    'versions',
+)
+
+class State:
+    def dispatch(self, module, function, args):
+        '''
+        dispatch
+
+        Args:
+            module, function: the implement/ function to run
+            args: its arguments
+
+        Returns:
+            ('ok', result) or ('error', exception)
+        '''
+        if module not in MODULES:
+            return ('error', ValueError(f"{module} cannot be called remotely"))
+
+        try:
+            return ('ok', getattr(importlib.import_module(module), function)(*args))
+        except Exception as err:
+            return ('error', picklable(err))
+
+# Exceptions are sent back to the worker, some (e.g. from third party
+# libraries) cannot be pickled so they are replaced with a RuntimeError
+def picklable(err):
+    try:
+        pickle.dumps(err)
+        return err
+    except Exception:
+        return RuntimeError(repr(err))
+
+STATE = State()
+
+def get_state():
+    return STATE
+
+class StateManager(BaseManager):
+    pass
+
+StateManager.register('state', callable=get_state)
+
+def serve(address, authkey):
+    '''
+    Runs the state process until it is killed, each worker connection is
+    handled in its own thread like the threaded Flask server
+    '''
+    manager = StateManager(address=address, authkey=authkey)
+    manager.get_server().serve_forever()
+
+class StateConnection:
+    def __init__(self, address, authkey):
+        self.manager = StateManager(address=address, authkey=authkey)
+        self.manager.connect()
+        self.state = self.manager.state()
+
+    # A /batch request is one call to batch.batch, so its operations already
+    # run in the state process in a single round trip
+    def call(self, module, function, *args):
+        status, result = self.state.dispatch(module, function, args)
+        if status == 'error':
+            raise result
+        return result
+
+    def module(self, name):
+        return RemoteModule(self, name)
+
+class RemoteModule:
+    def __init__(self, connection, name):
+        self.connection = connection
+        self.name = name
+
+    def __getattr__(self, function):
+        def remote_call(*args):
+            return self.connection.call(self.name, function, *args)
+        return remote_call
+
+def connect(address, authkey):
+    return StateConnection(address, authkey)
+
+def implement_modules():
+    '''
+    implement_modules
+
+    Returns:
+        a dictionary of the implement/ modules by name, when started by serve.py
+        the data lives in the state process so these forward calls to it
+    '''
+    if os.environ.get('FLOCKR_STATE_ADDRESS'):
+        connection = connect(os.environ['FLOCKR_STATE_ADDRESS'], bytes.fromhex(os.environ['FLOCKR_STATE_AUTHKEY']))
+        return {name: connection.module(name) for name in MODULES}
+
+    return {name: importlib.import_module(name) for name in MODULES}
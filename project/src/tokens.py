@@ -0,0 +1,120 @@
+"""
+tokens.py
+    - signs and verifies the HS256 JWTs used for session tokens and password
+      reset codes. Tokens are the same as PyJWT's, byte for byte, but the
+      header is encoded and the key is set up once rather than for each token
+
+Helper Modules:
+    b64encode: base64url without padding, as JWTs use
+    b64decode: the reverse of b64encode
+
+Main Modules:
+    InvalidToken: raised when a token is malformed or its signature doesn't match
+    TokenSigner: signs and verifies tokens for one secret
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import jwt
+
+# The header PyJWT writes for HS256, in the same key order
+HEADER = {'typ': 'JWT', 'alg': 'HS256'}
+
+# Claims PyJWT checks the time of, tokens with them are left to PyJWT
+TIME_CLAIMS = ('exp', 'nbf', 'iat')
+
+class InvalidToken(ValueError):
+    pass
+
+def b64encode(content):
+    return base64.urlsafe_b64encode(content).rstrip(b'=')
+
+def b64decode(content):
+    return base64.urlsafe_b64decode(content + b'=' * (-len(content) % 4))
+
+class TokenSigner:
+    '''
+    TokenSigner
+
+    Tokens have no expiry, so the token for a payload is always the same and a
+    token which has been verified once is remembered rather than verified again.
+
+    Args:
+        secret: the HS256 key
+        max_verified: how many verified tokens to remember
+    '''
+    def __init__(self, secret, max_verified=65536):
+        self.secret = secret
+        self.header = b64encode(json.dumps(HEADER, separators=(',', ':')).encode()) + b'.'
+        # Copied for each token, which skips hashing the padded key again
+        self.mac = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+        self.max_verified = max_verified
+        self.verified = {}
+
+    def signature(self, signing_input):
+        mac = self.mac.copy()
+        mac.update(signing_input)
+        return b64encode(mac.digest())
+
+    def sign(self, payload):
+        '''
+        sign
+
+        Args:
+            payload: a dict of the token's claims
+
+        Returns:
+            the token as a string
+        '''
+        signing_input = self.header + b64encode(json.dumps(payload, separators=(',', ':')).encode())
+        return (signing_input + b'.' + self.signature(signing_input)).decode()
+
+    def verify(self, token):
+        '''
+        verify
+
+        Args:
+            token: a token from sign, or from PyJWT with the same secret
+
+        Returns:
+            the token's payload
+
+        Raises:
+            InvalidToken when the token is malformed or its signature doesn't match
+        '''
+        payload = self.verified.get(token)
+        if payload is not None:
+            return dict(payload)
+
+        try:
+            encoded = token.encode()
+            signing_input, _, signature = encoded.rpartition(b'.')
+            if not signing_input.startswith(self.header):
+                # Some other header (e.g. keys in another order) is left to PyJWT
+                return self.verify_with_pyjwt(token)
+            if not hmac.compare_digest(self.signature(signing_input), signature):
+                raise InvalidToken("Signature doesn't match")
+
+            payload = json.loads(b64decode(signing_input[len(self.header):]))
+        except (AttributeError, ValueError, binascii.Error) as err:
+            raise InvalidToken(str(err)) from err
+        if not isinstance(payload, dict):
+            raise InvalidToken("Payload is not an object")
+        if any(claim in payload for claim in TIME_CLAIMS):
+            return self.verify_with_pyjwt(token)
+
+        if len(self.verified) >= self.max_verified:
+            self.verified.clear()
+        self.verified[token] = payload
+        return dict(payload)
+
+    def verify_with_pyjwt(self, token):
+        try:
+            return jwt.decode(token.encode(), self.secret, algorithms=['HS256'])
+        except jwt.InvalidTokenError as err:
+            raise InvalidToken(str(err)) from err
@@ -0,0 +1,39 @@
+"""
+jpeg_test.py
+
+Test Modules:
+    test_size: success case for reading the dimensions of baseline and progressive JPEGs
+    test_partial: success case for asking for more bytes until the dimensions are found
+    test_not_jpeg: fail case for a PNG and other files
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import io
+import pytest
+from PIL    import Image
+from jpeg   import jpeg_size
+
+def image_bytes(image_format, size, **options):
+    image = io.BytesIO()
+    Image.new('RGB', size).save(image, format=image_format, **options)
+    return image.getvalue()
+
+def test_size():
+    assert jpeg_size(image_bytes('JPEG', (123, 45))) == (123, 45)
+    assert jpeg_size(image_bytes('JPEG', (45, 123), progressive=True)) == (45, 123)
+
+def test_partial():
+    # A large EXIF segment comes before the frame
+    jpeg = image_bytes('JPEG', (640, 480), exif=b'Exif\x00\x00' + b'\x00' * 20000)
+
+    sizes = [jpeg_size(jpeg[:length]) for length in range(0, len(jpeg), 97)]
+    found = sizes.index((640, 480))
+    assert found > 0
+    assert set(sizes[:found]) == {None}
+    assert set(sizes[found:]) == {(640, 480)}
+
+def test_not_jpeg():
+    for not_jpeg in [image_bytes('PNG', (10, 10)), b'GIF89a', b'\xff\xd9', b'\xff\xd8\xff\xda\x00\x02']:
+        with pytest.raises(ValueError):
+            jpeg_size(not_jpeg)
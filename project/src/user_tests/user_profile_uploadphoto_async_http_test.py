@@ -0,0 +1,119 @@
+"""
+user_profile_uploadphoto_async_http_test.py
+
+Fixtures:
+    url: starts the server
+    image_server: Serves a JPG from a local HTTP server.
+
+Test Modules:
+    test_invalid_token: AccessError - Invalid Token.
+    test_img_upload: the upload is queued and the profile picture changes when it is done.
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import io
+import re
+import signal
+import threading
+import pytest
+import requests
+from http.server    import ThreadingHTTPServer, BaseHTTPRequestHandler
+from subprocess     import Popen, PIPE
+from time           import sleep
+from PIL            import Image
+from helper         import token_hash
+
+JPG = io.BytesIO()
+Image.new('RGB', (40, 30)).save(JPG, format='JPEG')
+
+class ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(JPG.getvalue())))
+        self.end_headers()
+        self.wfile.write(JPG.getvalue())
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def image_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def url():
+    url_re = re.compile(r' \* Running on ([^ ]*)')
+    server = Popen(["python3", "src/server.py"], stderr=PIPE, stdout=PIPE)
+    line = server.stderr.readline()
+    local_url = url_re.match(line.decode())
+    if local_url:
+        yield local_url.group(1)
+        # Terminate the server
+        server.send_signal(signal.SIGINT)
+        waited = 0
+        while server.poll() is None and waited < 5:
+            sleep(0.1)
+            waited += 0.1
+        if server.poll() is None:
+            server.kill()
+    else:
+        server.kill()
+        raise Exception("Couldn't get URL from local server")
+
+def register(url):
+    requests.delete(f"{url}/clear")
+    return requests.post(f"{url}/auth/register", json={
+        'email': 'owner@email.com',
+        'password': 'password',
+        'name_first': 'Firstname',
+        'name_last': 'Lastname',
+    }).json()
+
+def test_invalid_token(url, image_server):
+    register(url)
+    result = requests.post(f"{url}/user/profile/uploadphoto/async", json={
+        'token': token_hash(1),
+        'img_url': f"{image_server}/cat.jpg",
+        'x_start': 0,
+        'y_start': 0,
+        'x_end': 10,
+        'y_end': 10,
+    })
+    assert result.status_code == 400
+
+def test_img_upload(url, image_server):
+    user = register(url)
+    job_id = requests.post(f"{url}/user/profile/uploadphoto/async", json={
+        'token': user['token'],
+        'img_url': f"{image_server}/cat.jpg",
+        'x_start': 0,
+        'y_start': 0,
+        'x_end': 10,
+        'y_end': 10,
+    }).json()['job_id']
+
+    for _ in range(100):
+        status = requests.get(f"{url}/user/profile/uploadphoto/status", params={
+            'token': user['token'],
+            'job_id': job_id,
+        }).json()
+        if status['status'] == 'done':
+            break
+        sleep(0.05)
+    assert status == {'job_id': job_id, 'status': 'done', 'error': None}
+
+    profile = requests.get(f"{url}/user/profile", params={'token': user['token'], 'u_id': user['u_id']}).json()
+    picture = requests.get(profile['user']['profile_img_url'])
+    assert picture.status_code == 200
+    assert Image.open(io.BytesIO(picture.content)).size == (10, 10)
+
+    stem = os.path.basename(profile['user']['profile_img_url']).split('.')[0]
+    for root, _, names in os.walk('src/profile_pictures'):
+        for name in names:
+            if name.startswith(stem):
+                os.remove(os.path.join(root, name))
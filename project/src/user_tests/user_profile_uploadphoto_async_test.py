@@ -0,0 +1,212 @@
+"""
+user_profile_uploadphoto_async_test.py
+
+Fixtures:
+    register_login: Registers and logs two users in.
+    image_server: Serves a JPG and a PNG from a local HTTP server.
+
+Test Modules:
+- Invalid Cases
+    test_invalid_token: AccessError - Invalid Token.
+    test_invalid_job_id: InputError - job_id is not one of the user's uploads.
+    test_invalid_img_type: the job fails when the image uploaded is not a JPG.
+    test_invalid_dimensions: the job fails when the crop is not within the image.
+    test_invalid_url: the job fails when the url returns a status other than 200.
+    test_too_large: the job fails when the image is bigger than MAX_IMAGE_SIZE.
+    test_early_abort: the download stops once the dimensions show the crop is invalid.
+    test_too_many_pending: InputError - the user, or the server, has too many uploads waiting.
+
+- Success Cases
+    test_img_upload: the job crops the image and the user's profile picture changes when it is done.
+    test_same_picture: the same picture uploaded by two users is stored once.
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import io
+import time
+import types
+import threading
+import pytest
+import implement.user
+from http.server        import ThreadingHTTPServer, BaseHTTPRequestHandler
+from PIL                import Image
+from implement.other    import clear
+from helper             import token_hash
+from error              import AccessError, InputError
+from implement.auth     import auth_register
+from pictures           import picture_path
+from implement.user     import user_profile, user_profile_uploadphoto_async, \
+                               user_profile_uploadphoto_status, IMG_LOCATION, picture_refs
+
+def image_bytes(image_format, size=(40, 30)):
+    image = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(image, format=image_format)
+    return image.getvalue()
+
+IMAGES = {
+    '/cat.jpg': image_bytes('JPEG'),
+    '/cat.png': image_bytes('PNG'),
+}
+
+# How much of /huge.jpg has been sent
+sent = {'bytes': 0}
+
+class ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/huge.jpg':
+            # A small JPEG's header, and then far more data than it needs
+            self.send_response(200)
+            self.end_headers()
+            try:
+                self.wfile.write(IMAGES['/cat.jpg'][:1024])
+                for _ in range(1000):
+                    self.wfile.write(b'\x00' * 64 * 1024)
+                    sent['bytes'] += 64 * 1024
+            except ConnectionError:
+                pass
+            return
+        if self.path not in IMAGES:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(IMAGES[self.path])))
+        self.end_headers()
+        self.wfile.write(IMAGES[self.path])
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def image_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def stored_files():
+    return {os.path.join(root, name) for root, _, names in os.walk(IMG_LOCATION) for name in names}
+
+@pytest.fixture
+def register_login():
+    clear()
+    existing = stored_files()
+    owner = auth_register("owner@email.com", "password", "Anto", "Lepejian")
+    other = auth_register("other@email.com", "password", "Other", "User")
+    yield owner, other
+
+    # Remove the pictures the uploads saved
+    for path in stored_files() - existing:
+        os.remove(path)
+
+def wait_for(token, job_id):
+    for _ in range(100):
+        status = user_profile_uploadphoto_status(token, job_id)
+        if status['status'] in ('done', 'failed'):
+            return status
+        time.sleep(0.05)
+    raise Exception("Upload did not finish")
+
+'''Invalid Cases'''
+def test_invalid_token(register_login, image_server):
+    with pytest.raises(AccessError):
+        user_profile_uploadphoto_async(token_hash(-1), f"{image_server}/cat.jpg", 0, 0, 10, 10)
+
+def test_invalid_job_id(register_login, image_server):
+    owner, other = register_login
+    job_id = user_profile_uploadphoto_async(owner['token'], f"{image_server}/cat.jpg", 0, 0, 10, 10)['job_id']
+
+    with pytest.raises(InputError):
+        user_profile_uploadphoto_status(owner['token'], job_id + 1)
+    with pytest.raises(InputError):
+        user_profile_uploadphoto_status(other['token'], job_id)
+    wait_for(owner['token'], job_id)
+
+def test_invalid_img_type(register_login, image_server):
+    owner, _ = register_login
+    job_id = user_profile_uploadphoto_async(owner['token'], f"{image_server}/cat.png", 0, 0, 10, 10)['job_id']
+
+    assert wait_for(owner['token'], job_id) == {
+        'job_id': job_id,
+        'status': 'failed',
+        'error': "Image uploaded is not a JPG.",
+    }
+    assert user_profile(owner['token'], owner['u_id'])['user']['profile_img_url'] == 'default.jpg'
+
+def test_invalid_dimensions(register_login, image_server):
+    owner, _ = register_login
+    job_id = user_profile_uploadphoto_async(owner['token'], f"{image_server}/cat.jpg", 0, 0, 41, 30)['job_id']
+    assert wait_for(owner['token'], job_id)['status'] == 'failed'
+
+def test_invalid_url(register_login, image_server):
+    owner, _ = register_login
+    job_id = user_profile_uploadphoto_async(owner['token'], f"{image_server}/missing.jpg", 0, 0, 10, 10)['job_id']
+    assert wait_for(owner['token'], job_id)['status'] == 'failed'
+
+def test_too_large(register_login, image_server, monkeypatch):
+    owner, _ = register_login
+    monkeypatch.setattr(implement.user, 'MAX_IMAGE_SIZE', 100)
+    job_id = user_profile_uploadphoto_async(owner['token'], f"{image_server}/cat.jpg", 0, 0, 10, 10)['job_id']
+
+    assert wait_for(owner['token'], job_id)['error'] == "Image uploaded is too large."
+
+def test_early_abort(register_login, image_server):
+    owner, _ = register_login
+    job_id = user_profile_uploadphoto_async(owner['token'], f"{image_server}/huge.jpg", 0, 0, 400, 300)['job_id']
+
+    assert wait_for(owner['token'], job_id)['status'] == 'failed'
+    assert sent['bytes'] < 64 * 1024 * 1000
+
+def test_too_many_pending(register_login, image_server, monkeypatch):
+    owner, other = register_login
+    # The jobs are never run, so they stay queued
+    monkeypatch.setattr(implement.user, 'photo_executor', types.SimpleNamespace(submit=lambda *args: None))
+    monkeypatch.setattr(implement.user, 'photo_jobs', {})
+    monkeypatch.setattr(implement.user, 'MAX_PENDING_PHOTO_JOBS', 3)
+    monkeypatch.setattr(implement.user, 'MAX_PENDING_PHOTO_JOBS_PER_USER', 2)
+    url = f"{image_server}/cat.jpg"
+
+    user_profile_uploadphoto_async(owner['token'], url, 0, 0, 10, 10)
+    job_id = user_profile_uploadphoto_async(owner['token'], url, 0, 0, 10, 10)['job_id']
+    with pytest.raises(InputError):
+        user_profile_uploadphoto_async(owner['token'], url, 0, 0, 10, 10)
+
+    user_profile_uploadphoto_async(other['token'], url, 0, 0, 10, 10)
+    with pytest.raises(InputError):
+        user_profile_uploadphoto_async(other['token'], url, 0, 0, 10, 10)
+
+    # A finished job no longer counts
+    implement.user.photo_jobs[job_id]['status'] = 'done'
+    user_profile_uploadphoto_async(other['token'], url, 0, 0, 10, 10)
+
+'''Success Cases'''
+def test_img_upload(register_login, image_server):
+    owner, _ = register_login
+    job_id = user_profile_uploadphoto_async(owner['token'], f"{image_server}/cat.jpg", 5, 0, 25, 30)['job_id']
+
+    assert wait_for(owner['token'], job_id) == {
+        'job_id': job_id,
+        'status': 'done',
+        'error': None,
+    }
+    profile_img_url = user_profile(owner['token'], owner['u_id'])['user']['profile_img_url']
+    assert profile_img_url != 'default.jpg'
+
+    with Image.open(picture_path(IMG_LOCATION, profile_img_url)) as image:
+        assert image.format == 'JPEG'
+        assert image.size == (20, 30)
+
+def test_same_picture(register_login, image_server):
+    owner, other = register_login
+    existing = stored_files()
+    for user in register_login:
+        job_id = user_profile_uploadphoto_async(user['token'], f"{image_server}/cat.jpg", 0, 0, 40, 30)['job_id']
+        assert wait_for(user['token'], job_id)['status'] == 'done'
+
+    owner_img_url = user_profile(owner['token'], owner['u_id'])['user']['profile_img_url']
+    assert owner_img_url == user_profile(other['token'], other['u_id'])['user']['profile_img_url']
+    assert picture_refs[owner_img_url] == 2
+
+    # The picture and its six thumbnails
+    assert len(stored_files() - existing) == 7
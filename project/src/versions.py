@@ -0,0 +1,55 @@
+"""
+versions.py
+    - version counters for the data behind the read routes, bumped by the
+      implement/ functions which change it, so an unchanged response can be
+      answered with 304 Not Modified without building it again
+
+Helper Modules:
+    bump: increments the version of one or more resources
+
+Main Modules:
+    resource_versions: checks a token and returns the current version of resources
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)))
+
+import threading
+from helper     import token_validator
+
+# The counters start from 0 each time the server starts, so the epoch keeps
+# versions from a previous run from matching
+EPOCH = os.urandom(8).hex()
+
+# users: anything in users_all or user_profile
+# channels: channel names, members, owners and standups
+# messages: anything about the messages in a channel
+versions = {
+    'users': 0,
+    'channels': 0,
+    'messages': 0,
+}
+versions_lock = threading.Lock()
+
+def bump(*resources):
+    with versions_lock:
+        for resource in resources:
+            versions[resource] += 1
+
+def resource_versions(token, resources):
+    '''
+    resource_versions
+
+    Args:
+        token: authorises user
+        resources: the names of the resources a response is built from
+
+    Returns:
+        a list with the epoch and then the version of each resource
+
+    Raises:
+        AccessError when token is not valid
+    '''
+    token_validator(token)
+
+    with versions_lock:
+        return [EPOCH] + [versions[resource] for resource in resources]